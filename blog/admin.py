@@ -2,13 +2,14 @@ from django.contrib import admin
 from django.contrib.auth.models import Permission
 
 from blog.models import Blog
+from config.search import SearchAdminMixin
 
 
 @admin.register(Blog)
-class BlogAdmin(admin.ModelAdmin):
+class BlogAdmin(SearchAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'title', 'content', 'image', 'is_published', 'owner')
     list_filter = ('title', 'is_published',)
-    search_fields = ('title',)
+    search_fields = ('title', 'content')
 
 
 admin.site.register(Permission)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from blog.models import Blog
+        from config import thumbnails
+        thumbnails.register(Blog, 'image', sizes=('card', 'large'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from blog.services import flush_views
+
+
+class Command(BaseCommand):
+    help = ('Сохраняет накопленные в Redis просмотры статей в БД. Просмотры, учтённые в памяти процесса сайта '
+            '(кэш не на Redis или Redis был недоступен), сохраняет только планировщик этого процесса')
+
+    def handle(self, *args, **kwargs):
+        flushed = flush_views()
+        self.stdout.write(self.style.SUCCESS(f'Сохранено просмотров: {flushed}'))
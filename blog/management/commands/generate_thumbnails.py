@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from config.thumbnails import generate_thumbnails, is_stale, registered_fields, thumbnails_field_name
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для уже загруженных изображений статей и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Перестроить миниатюры, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        force = options['force']
+        for model, field_name, sizes in registered_fields():
+            generated = skipped = 0
+            queryset = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for instance in queryset.only('pk', field_name, thumbnails_field_name(field_name)).iterator():
+                if not force and not is_stale(instance, field_name):
+                    skipped += 1
+                elif generate_thumbnails(instance, field_name, force=force) is not None:
+                    generated += 1
+                else:
+                    self.stderr.write(f'{model._meta.label} #{instance.pk}: файл {getattr(instance, field_name)} '
+                                      f'недоступен или не является изображением')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: построено {generated}, актуальны {skipped}'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_blog_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['is_published', '-views_count'], name='blog_published_views_idx'),
+        ),
+    ]
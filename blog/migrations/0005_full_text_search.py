@@ -0,0 +1,51 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# Поисковый вектор поддерживается триггером, поэтому он актуален и при массовых INSERT ... SELECT и UPDATE.
+# Обновление views_count не затрагивает столбцы триггера и не пересчитывает вектор.
+BLOG_TRIGGER_SQL = """
+CREATE FUNCTION blog_blog_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_blog_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, content, search_vector ON blog_blog
+FOR EACH ROW EXECUTE FUNCTION blog_blog_search_vector_update();
+
+UPDATE blog_blog SET search_vector = NULL;
+"""
+
+BLOG_TRIGGER_REVERSE_SQL = """
+DROP TRIGGER blog_blog_search_vector_trigger ON blog_blog;
+DROP FUNCTION blog_blog_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(BLOG_TRIGGER_SQL, BLOG_TRIGGER_REVERSE_SQL),
+        migrations.AddIndex(
+            model_name='blog',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blog_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_full_text_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='image_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='миниатюры изображения'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from users.models import User
 
@@ -9,10 +11,13 @@ class Blog(models.Model):
     slug = models.CharField(max_length=100, verbose_name="slug", null=True, blank=True)
     content = models.TextField(verbose_name='содержимое')
     image = models.ImageField(verbose_name='изображение', blank=True, null=True, upload_to="blog/image")
+    image_thumbnails = models.JSONField(verbose_name='миниатюры изображения', default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата и время создания')
     is_published = models.BooleanField(default=True, verbose_name='опубликовано')
     views_count = models.PositiveIntegerField(verbose_name='просмотры', default=0)
     owner = models.ForeignKey(User, verbose_name='Владелец', on_delete=models.SET_NULL, **NULLABLE)
+    # Заполняется триггером БД из заголовка и содержимого
+    search_vector = SearchVectorField(editable=False, **NULLABLE)
 
     def __str__(self):
         return self.title
@@ -20,3 +25,8 @@ class Blog(models.Model):
     class Meta:
         verbose_name = 'блог'
         verbose_name_plural = 'блоги'
+        indexes = [
+            models.Index(fields=['is_published', '-views_count'], name='blog_published_views_idx'),
+            models.Index(fields=['is_published', '-created_at', '-id'], name='blog_published_created_idx'),
+            GinIndex(fields=['search_vector'], name='blog_search_idx'),
+        ]
@@ -1,8 +1,39 @@
-from django.core.cache import cache
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models import F
+from redis.exceptions import RedisError
 
 from blog.models import Blog
 from config.settings import CACHE_ENABLED
 
+VIEWS_PENDING_KEY = 'blog:views:pending'
+VIEWS_TOP_KEY = 'blog:views:top'
+VIEWS_FLUSH_LOCK_KEY = 'blog:views:flush_lock'
+VIEWS_TOP_TIMEOUT = 60 * 60 * 24
+VIEWS_FLUSH_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+# Запасной счётчик в памяти процесса: используется, если кэш не на Redis или Redis не ответил.
+# Его сохраняет в БД только flush_views в этом же процессе (задача планировщика сайта);
+# команда flush_blog_views работает в отдельном процессе и этих просмотров не видит
+_local_views = Counter()
+_local_views_lock = threading.Lock()
+
+# Увеличивает счётчик в ожидающих, а в рейтинге - только если рейтинг уже построен
+_REGISTER_VIEW_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('ZINCRBY', KEYS[2], 1, ARGV[1])
+end
+return redis.call('ZINCRBY', KEYS[1], 1, ARGV[1])
+"""
+
 
 def get_articles_from_cache():
     """
@@ -18,4 +49,193 @@ def get_articles_from_cache():
         else:
             articles = Blog.objects.all()
             cache.set(key, articles)
-            return articles
\ No newline at end of file
+            return articles
+
+
+async def aget_articles_from_cache():
+    """
+    Асинхронная версия get_articles_from_cache
+    """
+    if not CACHE_ENABLED:
+        return Blog.objects.all()
+    key = 'categories_list'
+    articles = await cache.aget(key)
+    if articles is None:
+        articles = Blog.objects.all()
+        await cache.aset(key, articles)
+    return articles
+
+
+def _get_redis():
+    """
+    Возвращает клиент Redis и функцию построения ключей, если кэш работает на Redis, иначе None
+    """
+    if not CACHE_ENABLED:
+        return None
+    backend = caches['default']
+    if not isinstance(backend, RedisCache):
+        return None
+    return backend._cache.get_client(write=True), backend.make_and_validate_key
+
+
+def register_view(blog_id):
+    """
+    Учитывает просмотр статьи в счётчике кэша без записи в БД. Если Redis не ответил,
+    просмотр учитывается в запасном счётчике процесса
+    """
+    redis = _get_redis()
+    if redis is not None:
+        client, make_key = redis
+        try:
+            client.eval(_REGISTER_VIEW_SCRIPT, 2, make_key(VIEWS_PENDING_KEY), make_key(VIEWS_TOP_KEY), blog_id)
+            return
+        except RedisError as e:
+            logger.warning(f"Blog view {blog_id} counted in process memory, Redis error: {e}")
+    with _local_views_lock:
+        _local_views[blog_id] += 1
+
+
+def get_pending_views(blog_id):
+    """
+    Возвращает количество просмотров статьи, ещё не сохранённых в БД
+    """
+    with _local_views_lock:
+        pending = _local_views.get(blog_id, 0)
+    redis = _get_redis()
+    if redis is None:
+        return pending
+    client, make_key = redis
+    try:
+        return pending + int(client.zscore(make_key(VIEWS_PENDING_KEY), blog_id) or 0)
+    except RedisError:
+        return pending
+
+
+def _take_pending_views():
+    """
+    Атомарно забирает накопленные просмотры (из Redis и запасного счётчика процесса) и очищает счётчики
+    """
+    with _local_views_lock:
+        pending = Counter(_local_views)
+        _local_views.clear()
+    redis = _get_redis()
+    if redis is None:
+        return dict(pending)
+    client, make_key = redis
+    pipe = client.pipeline(transaction=True)
+    pipe.zrange(make_key(VIEWS_PENDING_KEY), 0, -1, withscores=True)
+    pipe.delete(make_key(VIEWS_PENDING_KEY))
+    try:
+        items, _ = pipe.execute()
+    except RedisError:
+        _return_local_views(pending)
+        raise
+    pending.update({int(blog_id): int(count) for blog_id, count in items})
+    return dict(pending)
+
+
+def _return_local_views(pending):
+    with _local_views_lock:
+        _local_views.update(pending)
+
+
+def _return_pending_views(pending):
+    """
+    Возвращает забранные просмотры обратно в счётчики, если сохранить их в БД не удалось
+    """
+    redis = _get_redis()
+    if redis is None:
+        _return_local_views(pending)
+        return
+    client, make_key = redis
+    pipe = client.pipeline(transaction=True)
+    for blog_id, count in pending.items():
+        pipe.zincrby(make_key(VIEWS_PENDING_KEY), count, blog_id)
+    try:
+        pipe.execute()
+    except RedisError:
+        _return_local_views(pending)
+
+
+def _seed_top_views():
+    """
+    Строит рейтинг статей в Redis: значения из БД плюс ещё не сохранённые просмотры
+    """
+    redis = _get_redis()
+    if redis is None:
+        return
+    client, make_key = redis
+    top_key = make_key(VIEWS_TOP_KEY)
+    if client.exists(top_key):
+        return
+    scores = dict(Blog.objects.filter(is_published=True).values_list('pk', 'views_count').iterator())
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(top_key)
+    if scores:
+        pipe.zadd(top_key, scores)
+    pipe.zunionstore(top_key, [top_key, make_key(VIEWS_PENDING_KEY)])
+    pipe.expire(top_key, VIEWS_TOP_TIMEOUT)
+    pipe.execute()
+
+
+def flush_views():
+    """
+    Переносит накопленные просмотры в Blog.views_count пакетными UPDATE с F()
+    """
+    if CACHE_ENABLED and not cache.add(VIEWS_FLUSH_LOCK_KEY, True, timeout=60):
+        return 0
+
+    try:
+        pending = _take_pending_views()
+        # Группируем статьи по приросту, чтобы обновить их одним запросом на группу
+        by_delta = defaultdict(list)
+        for blog_id, delta in pending.items():
+            by_delta[delta].append(blog_id)
+
+        try:
+            with transaction.atomic():
+                for delta, ids in by_delta.items():
+                    for i in range(0, len(ids), VIEWS_FLUSH_BATCH_SIZE):
+                        Blog.objects.filter(pk__in=ids[i:i + VIEWS_FLUSH_BATCH_SIZE]).update(
+                            views_count=F('views_count') + delta)
+        except Exception:
+            _return_pending_views(pending)
+            raise
+
+        _seed_top_views()
+        return sum(pending.values())
+    finally:
+        if CACHE_ENABLED:
+            cache.delete(VIEWS_FLUSH_LOCK_KEY)
+
+
+def get_top_articles(limit=5):
+    """
+    Возвращает самые просматриваемые опубликованные статьи с учётом ещё не сохранённых просмотров
+    """
+    redis = _get_redis()
+    if redis is not None:
+        client, make_key = redis
+        top = client.zrevrange(make_key(VIEWS_TOP_KEY), 0, limit * 2 - 1, withscores=True)
+        if top:
+            scores = {int(blog_id): int(score) for blog_id, score in top}
+            articles = Blog.objects.filter(is_published=True).in_bulk(list(scores))
+            result = []
+            for blog_id, score in scores.items():
+                if blog_id in articles:
+                    articles[blog_id].views_count = score
+                    result.append(articles[blog_id])
+            return result[:limit]
+
+    # Без рейтинга в Redis несохранённые просмотры могут поднять статью выше, поэтому кандидатов берётся с запасом
+    articles = list(Blog.objects.filter(is_published=True).order_by('-views_count', '-pk')[:limit * 2])
+    for article in articles:
+        article.views_count += get_pending_views(article.pk)
+    articles.sort(key=lambda article: article.views_count, reverse=True)
+    return articles[:limit]
+
+
+# Для асинхронных представлений: клиент Redis синхронный, поэтому вызовы выполняются в потоке
+aregister_view = sync_to_async(register_view)
+aget_pending_views = sync_to_async(get_pending_views)
+aget_top_articles = sync_to_async(get_top_articles)
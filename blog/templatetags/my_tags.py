@@ -1,5 +1,7 @@
 from django import template
 
+from config.thumbnails import thumbnail_url
+
 register = template.Library()
 
 
@@ -11,3 +13,12 @@ def media_filter(path):
     if path:
         return f"/media/{path}"
     return "#"
+
+
+@register.filter()
+def thumbnail(file, size):
+    """
+    Шаблонный фильтр, который возвращает адрес миниатюры изображения нужного размера
+    (small, medium, card, large). Пока миниатюра не построена, возвращается адрес оригинала.
+    """
+    return thumbnail_url(file, size)
@@ -1,3 +1,248 @@
-from django.test import TestCase
+import hashlib
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.views.generic import ListView
+from PIL import Image
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from blog import services
+from blog.models import Blog
+from blog.views import AsyncBlogDetailView, AsyncBlogListView
+from config import thumbnails
+from config.pagination import KeysetPaginationMixin
+from config.testing import QueryBudgetMixin, walk_keyset_pages
+from users.models import User
+
+
+class BlogQueryBudgetTest(QueryBudgetMixin, TestCase):
+    namespace = 'blog'
+    query_budgets = {
+        'blog_list': 6,
+        'blog_detail': 5,
+        'blog_create': 4,
+        'blog_update': 5,
+        'blog_delete': 5,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(email='author@test.ru')
+
+    def create_data(self, size):
+        for i in range(size):
+            Blog.objects.create(title=f'Статья {i}', content='Текст', owner=self.user)
+        self.blog = Blog.objects.first()
+
+    def get_url_args(self, url_name):
+        if url_name in ('blog_detail', 'blog_update', 'blog_delete'):
+            return [self.blog.pk]
+        return []
+
+
+class BlogViewsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        services._local_views.clear()
+        self.user = User.objects.create(email='author@test.ru')
+        self.first = Blog.objects.create(title='Первая', content='Текст', owner=self.user, is_published=True,
+                                         views_count=10)
+        self.second = Blog.objects.create(title='Вторая', content='Текст', owner=self.user, is_published=True,
+                                          views_count=8)
+        self.draft = Blog.objects.create(title='Черновик', content='Текст', owner=self.user, is_published=False,
+                                         views_count=100)
+
+    def test_views_are_flushed(self):
+        for _ in range(3):
+            services.register_view(self.second.pk)
+        services.register_view(self.first.pk)
+        self.assertEqual(services.get_pending_views(self.second.pk), 3)
+        self.assertEqual(Blog.objects.get(pk=self.second.pk).views_count, 8)
+
+        self.assertEqual(services.flush_views(), 4)
+        self.assertEqual(services.get_pending_views(self.second.pk), 0)
+        self.assertEqual(Blog.objects.get(pk=self.first.pk).views_count, 11)
+        self.assertEqual(Blog.objects.get(pk=self.second.pk).views_count, 11)
+        self.assertEqual(services.flush_views(), 0)
+
+    def test_top_articles_include_pending_views(self):
+        for _ in range(5):
+            services.register_view(self.second.pk)
+        top = services.get_top_articles(limit=2)
+        self.assertEqual([(article.pk, article.views_count) for article in top],
+                         [(self.second.pk, 13), (self.first.pk, 10)])
+
+    def test_redis_error_falls_back_to_process_counter(self):
+        client = mock.Mock()
+        client.eval.side_effect = RedisConnectionError('Redis недоступен')
+        client.zscore.side_effect = RedisConnectionError('Redis недоступен')
+        with mock.patch.object(services, '_get_redis', return_value=(client, str)), \
+                self.assertLogs('blog.services', 'WARNING'):
+            services.register_view(self.first.pk)
+            self.assertEqual(services.get_pending_views(self.first.pk), 1)
+        self.assertEqual(services.flush_views(), 1)
+        self.assertEqual(Blog.objects.get(pk=self.first.pk).views_count, 11)
+
+    async def test_async_views(self):
+        detail = AsyncBlogDetailView.as_view()
+        for _ in range(3):
+            response = await detail(AsyncRequestFactory().get('/'), pk=self.second.pk)
+        self.assertEqual(response.context_data['object'].views_count, 11)
+        with self.assertRaises(Http404):
+            await detail(AsyncRequestFactory().get('/'), pk=0)
+
+        response = await AsyncBlogListView.as_view()(AsyncRequestFactory().get('/'))
+        self.assertEqual([blog.pk for blog in response.context_data['object_list']], [self.second.pk, self.first.pk])
+        self.assertEqual([(blog.pk, blog.views_count) for blog in response.context_data['top_articles']][:2],
+                         [(self.second.pk, 11), (self.first.pk, 10)])
+
+
+class BlogPages(KeysetPaginationMixin, ListView):
+    model = Blog
+    keyset_ordering = ('-created_at', '-pk')
+    paginate_by = 2
+
+
+class BlogPaginationTest(TestCase):
+
+    def test_pages_follow_ordering_with_ties(self):
+        user = User.objects.create(email='author@test.ru')
+        for i in range(5):
+            Blog.objects.create(title=f'Статья {i}', content='Текст', owner=user)
+        # Три статьи с одним временем создания (с микросекундами) и две раньше
+        moment = timezone.now().replace(microsecond=123456)
+        pks = list(Blog.objects.order_by('pk').values_list('pk', flat=True))
+        Blog.objects.filter(pk__in=pks[:3]).update(created_at=moment)
+        Blog.objects.filter(pk__in=pks[3:]).update(created_at=moment - timedelta(seconds=1))
+
+        forward, backward = walk_keyset_pages(BlogPages)
+        self.assertEqual([pk for page in forward for pk in page], [pks[2], pks[1], pks[0], pks[4], pks[3]])
+        self.assertEqual(backward, forward)
+
+
+def make_image(color, size=(800, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class TemporaryMediaMixin:
+    """
+    Загруженные в тесте файлы пишутся во временный MEDIA_ROOT
+    """
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+@override_settings(THUMBNAIL_ASYNC=False)
+class ThumbnailTest(TemporaryMediaMixin, TestCase):
+
+    def create_blog(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Blog.objects.create(title='Статья', content='Текст',
+                                       image=SimpleUploadedFile('photo.png', content))
+
+    def test_content_hash_naming(self):
+        content = make_image('red')
+        blog = self.create_blog(content)
+        digest = hashlib.sha256(content).hexdigest()[:thumbnails.HASH_LENGTH]
+        expected = {size: thumbnails.thumbnail_name(blog.image.name, digest, size, 'png') for size in ('card', 'large')}
+        self.assertEqual(Blog.objects.get(pk=blog.pk).image_thumbnails, {'source': blog.image.name, 'sizes': expected})
+        self.assertTrue(expected['card'].endswith(f'.{digest}.card.png'))
+        with default_storage.open(expected['card']) as file:
+            self.assertEqual(Image.open(file).size, (600, 400))
+        with default_storage.open(expected['large']) as file:
+            self.assertEqual(Image.open(file).size, (800, 600))
+        self.assertEqual(thumbnails.thumbnail_url(blog.image, 'card'), default_storage.url(expected['card']))
+
+    def test_same_content_is_not_rebuilt(self):
+        content = make_image('red')
+        first = self.create_blog(content)
+        with mock.patch.object(thumbnails, '_render', wraps=thumbnails._render) as render:
+            second = self.create_blog(content)
+        # Другое имя оригинала, но то же содержимое: миниатюры только получают новое имя рядом с ним
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertEqual(render.call_count, 2)
+        with mock.patch.object(thumbnails, '_render', wraps=thumbnails._render) as render:
+            thumbnails.build_thumbnails(second.image, ('card', 'large'))
+        render.assert_not_called()
+
+    def test_regenerated_when_source_changes(self):
+        blog = self.create_blog(make_image('red'))
+        old = blog.image_thumbnails
+        blog.image = SimpleUploadedFile('photo.png', make_image('blue'))
+        with self.captureOnCommitCallbacks(execute=True):
+            blog.save()
+        blog.refresh_from_db()
+        self.assertEqual(blog.image_thumbnails['source'], blog.image.name)
+        self.assertNotEqual(blog.image_thumbnails['sizes']['card'], old['sizes']['card'])
+        with default_storage.open(blog.image_thumbnails['sizes']['card']) as file:
+            self.assertEqual(Image.open(file).convert('RGB').getpixel((0, 0)), (0, 0, 255))
+        # Пока миниатюры нового файла не построены, отдаётся оригинал
+        Blog.objects.filter(pk=blog.pk).update(image_thumbnails=old)
+        blog.refresh_from_db()
+        self.assertEqual(thumbnails.thumbnail_url(blog.image, 'card'), blog.image.url)
+
+    def test_command(self):
+        blog = self.create_blog(make_image('red'))
+        Blog.objects.filter(pk=blog.pk).update(image_thumbnails={})
+        stdout = StringIO()
+        call_command('generate_thumbnails', stdout=stdout)
+        self.assertIn('построено 1, актуальны 0', stdout.getvalue())
+        blog.refresh_from_db()
+        self.assertEqual(blog.image_thumbnails['source'], blog.image.name)
+        stdout = StringIO()
+        call_command('generate_thumbnails', stdout=stdout)
+        self.assertIn('построено 0, актуальны 1', stdout.getvalue())
+        with mock.patch.object(thumbnails, '_render', wraps=thumbnails._render) as render:
+            call_command('generate_thumbnails', '--force', stdout=StringIO())
+        self.assertEqual(render.call_count, 2)
+
+
+@override_settings(THUMBNAIL_ASYNC=True, THUMBNAIL_WORKERS=1)
+class ThumbnailPoolTest(TemporaryMediaMixin, TransactionTestCase):
+    # Фоновый поток читает объект из БД, поэтому данные должны быть зафиксированы
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(thumbnails, '_executor', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def wait_for_pool(self):
+        # С одним рабочим потоком задачи выполняются по очереди: пустая задача завершится после всех прежних
+        executor = thumbnails._get_executor()
+        executor.submit(lambda: None).result(10)
+        executor.shutdown()
+
+    def test_built_in_background(self):
+        with mock.patch.object(thumbnails, '_render', wraps=thumbnails._render) as render:
+            with transaction.atomic():
+                blog = Blog.objects.create(title='Статья', content='Текст',
+                                           image=SimpleUploadedFile('photo.png', make_image('red')))
+                blog.save()
+                self.assertEqual(blog.image_thumbnails, {})
+            self.wait_for_pool()
+        # Второе сохранение не строит миниатюры заново, даже если его задача успела попасть в очередь
+        self.assertEqual(render.call_count, 2)
+        blog.refresh_from_db()
+        self.assertEqual(blog.image_thumbnails['source'], blog.image.name)
+        for name in blog.image_thumbnails['sizes'].values():
+            self.assertTrue(default_storage.exists(name))
+        self.assertFalse(thumbnails._pending)
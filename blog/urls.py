@@ -1,12 +1,14 @@
 from django.urls import path
 from blog.apps import BlogConfig
-from blog.views import BlogListView, BlogDetailView, BlogCreateView, BlogUpdateView, BlogDeleteView
+from blog.views import (BlogListView, BlogDetailView, BlogCreateView, BlogUpdateView, BlogDeleteView, AsyncBlogListView,
+                        AsyncBlogDetailView)
+from config.async_views import select_view
 
 app_name = BlogConfig.name
 
 urlpatterns = [
-    path('blog/', BlogListView.as_view(), name='blog_list'),
-    path('blog/<int:pk>/', BlogDetailView.as_view(), name='blog_detail'),
+    path('blog/', select_view(BlogListView, AsyncBlogListView).as_view(), name='blog_list'),
+    path('blog/<int:pk>/', select_view(BlogDetailView, AsyncBlogDetailView).as_view(), name='blog_detail'),
     path('blog/create/', BlogCreateView.as_view(), name='blog_create'),
     path('blog/<int:pk>/update/', BlogUpdateView.as_view(), name='blog_update'),
     path('blog/<int:pk>/delete/', BlogDeleteView.as_view(), name='blog_delete'),
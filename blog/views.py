@@ -2,25 +2,57 @@ from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from pytils.translit import slugify
 
+from config.async_views import AsyncDetailMixin, AsyncListMixin
+from config.db.routers import ReadReplicaMixin
+from config.pagination import KeysetPaginationMixin
+from config.search import SearchMixin
 from .forms import BlogForm
 from blog.models import Blog
+from blog.services import (register_view, get_pending_views, get_top_articles, aregister_view, aget_pending_views,
+                           aget_top_articles)
 
 
-class BlogListView(ListView):
+class BlogListView(ReadReplicaMixin, SearchMixin, KeysetPaginationMixin, ListView):
     model = Blog
+    paginate_by = 12
+    keyset_ordering = ('-created_at', '-pk')
 
     def get_queryset(self):
         queryset = super().get_queryset()
         return queryset.filter(is_published=True)
 
+    def get_context_data(self, **kwargs):
+        if 'top_articles' not in kwargs:
+            kwargs['top_articles'] = get_top_articles()
+        return super().get_context_data(**kwargs)
+
+
+class AsyncBlogListView(AsyncListMixin, BlogListView):
+
+    async def aget_context_kwargs(self):
+        return {'top_articles': await aget_top_articles()}
+
 
 class BlogDetailView(DetailView):
     model = Blog
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('owner')
+
     def get_object(self, queryset=None):
         self.object = super().get_object(queryset)
-        self.object.views_count += 1
-        self.object.save()
+        # Просмотр копится в счётчике кэша и периодически сохраняется в БД через flush_views
+        register_view(self.object.pk)
+        self.object.views_count += get_pending_views(self.object.pk)
+        return self.object
+
+
+class AsyncBlogDetailView(AsyncDetailMixin, BlogDetailView):
+
+    async def aget_object(self, queryset=None):
+        self.object = await super().aget_object(queryset)
+        await aregister_view(self.object.pk)
+        self.object.views_count += await aget_pending_views(self.object.pk)
         return self.object
 
 
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.http import Http404
+
+
+def select_view(sync_view, async_view):
+    """
+    Выбирает синхронную или асинхронную версию представления по настройке ASYNC_VIEWS
+    """
+    return async_view if settings.ASYNC_VIEWS else sync_view
+
+
+class AsyncListMixin:
+    """
+    Асинхронный get для ListView с курсорной пагинацией.
+
+    Страница выбирается асинхронным ORM до вызова get_context_data, поэтому синхронная часть
+    представления (контекст, шаблон) к БД уже не обращается. Данные контекста, которые нужно
+    загрузить из БД или кэша, наследник возвращает из aget_context_kwargs().
+    """
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def aget_context_kwargs(self):
+        return {}
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = await self.aget_queryset()
+        await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        context = self.get_context_data(**await self.aget_context_kwargs())
+        return self.render_to_response(context)
+
+
+class AsyncDetailMixin:
+    """
+    Асинхронный get для DetailView: объект выбирается асинхронным ORM
+    """
+
+    async def aget_object(self, queryset=None):
+        if queryset is None:
+            queryset = self.get_queryset()
+        try:
+            return await queryset.aget(pk=self.kwargs.get(self.pk_url_kwarg))
+        except queryset.model.DoesNotExist:
+            raise Http404(f'{queryset.model._meta.verbose_name} не найден')
+
+    async def aget_context_kwargs(self):
+        return {}
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        context = self.get_context_data(object=self.object, **await self.aget_context_kwargs())
+        return self.render_to_response(context)
@@ -0,0 +1,54 @@
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from config.db.pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула к тестовой базе не дадут её удалить
+        close_pools(dbname=test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений (config.db.pool), общим для всех потоков процесса:
+    запросов веб-сервера, планировщика рассылок и фоновых задач.
+
+    Django по-прежнему закрывает соединение в конце запроса (CONN_MAX_AGE=0), но закрытие
+    возвращает его в пул вместо разрыва. Настройки пула - ключ POOL в описании базы,
+    пул отключается значением POOL['ENABLED'] = False.
+    """
+    creation_class = DatabaseCreation
+
+    @property
+    def pool_enabled(self):
+        options = self.settings_dict.get('POOL') or {}
+        # Служебное соединение без базы (создание и удаление тестовой БД) в пул не берётся
+        return options.get('ENABLED', True) and self.alias != NO_DB_ALIAS
+
+    def get_pool(self, conn_params):
+        options = {k: v for k, v in (self.settings_dict.get('POOL') or {}).items() if k != 'ENABLED'}
+        return get_pool(self.alias, conn_params, options)
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_enabled:
+            return super().get_new_connection(conn_params)
+        pool = self.get_pool(conn_params)
+
+        def connect():
+            return super(DatabaseWrapper, self).get_new_connection(conn_params)
+
+        pool.fill(connect)
+        connection = pool.getconn(connect)
+        self.pool = pool
+        return connection
+
+    def _close(self):
+        pool = getattr(self, 'pool', None)
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
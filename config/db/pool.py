@@ -0,0 +1,309 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+POOL_DEFAULTS = {
+    'MIN_SIZE': 2,
+    'MAX_SIZE': 20,
+    # Время жизни соединения: старые соединения закрываются, чтобы не копить память в процессах Postgres
+    'MAX_LIFETIME': 1800,
+    # Соединения сверх MIN_SIZE, простоявшие дольше этого времени, закрываются
+    'MAX_IDLE': 300,
+    # Сколько ждать свободного соединения, прежде чем вернуть ошибку
+    'TIMEOUT': 10,
+    # Соединение, простоявшее дольше этого времени, перед выдачей проверяется запросом SELECT 1
+    'CHECK_INTERVAL': 30,
+}
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class _Slot:
+    __slots__ = ('connection', 'created', 'returned')
+
+    def __init__(self, connection, created, returned):
+        self.connection = connection
+        self.created = created
+        self.returned = returned
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2, общий для всех потоков процесса.
+
+    Соединения выдаются в порядке LIFO, чтобы часто используемые оставались «тёплыми»,
+    а лишние успевали простоять MAX_IDLE и закрыться. Перед выдачей соединение проверяется,
+    при возврате незавершённая транзакция откатывается.
+    """
+
+    def __init__(self, name, min_size, max_size, max_lifetime, max_idle, timeout, check_interval):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.check_interval = check_interval
+
+        self._idle = deque()
+        self._created = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'requests': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'opened': 0,
+            'closed': 0,
+            'health_check_failures': 0,
+        }
+
+    def getconn(self, connect):
+        """
+        Выдаёт соединение из пула. Если свободных нет и размер пула меньше MAX_SIZE, открывает
+        новое функцией connect, иначе ждёт возврата соединения не дольше TIMEOUT
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self._condition:
+            self._stats['requests'] += 1
+        while True:
+            slot = None
+            with self._condition:
+                while True:
+                    slot = self._pop_idle()
+                    if slot is not None or self._size < self.max_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f'Пул соединений {self.name}: нет свободного соединения '
+                                          f'за {self.timeout} с (занято {self._size})')
+                    waited = True
+                    self._condition.wait(remaining)
+                if slot is None:
+                    # Место под новое соединение резервируется сразу, само соединение открывается вне блокировки
+                    self._size += 1
+
+            if slot is None:
+                connection = self._open(connect)
+            elif self._check(slot):
+                connection = slot.connection
+            else:
+                continue
+            self._record_wait(time.monotonic() - started if waited else None)
+            return connection
+
+    def putconn(self, connection):
+        """
+        Возвращает соединение в пул. Незавершённая транзакция откатывается,
+        сломанные и отслужившие своё соединения закрываются
+        """
+        with self._condition:
+            created = self._created.get(connection)
+        if created is None:
+            # Соединение открыто не этим пулом или уже закрыто им: место в пуле оно не занимает
+            _close_quietly(connection)
+            return
+        now = time.monotonic()
+        if not self._reset(connection) or now - created > self.max_lifetime:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append(_Slot(connection, created, now))
+            expired = self._pop_expired_idle(now)
+            self._condition.notify()
+        for slot in expired:
+            self._discard(slot.connection)
+
+    def fill(self, connect):
+        """
+        Открывает соединения до MIN_SIZE, чтобы первые запросы не платили за подключение
+        """
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            self.putconn(self._open(connect))
+
+    def close(self):
+        """
+        Закрывает все свободные соединения. Выданные закроются при возврате
+        """
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for slot in idle:
+            self._discard(slot.connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                **self._stats,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+            }
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._created[connection] = time.monotonic()
+            self._stats['opened'] += 1
+        return connection
+
+    def _pop_idle(self):
+        now = time.monotonic()
+        while self._idle:
+            slot = self._idle.pop()
+            if now - slot.created <= self.max_lifetime:
+                return slot
+            self._forget(slot.connection)
+            _close_quietly(slot.connection)
+        return None
+
+    def _pop_expired_idle(self, now):
+        expired = []
+        # Самые давно вернувшиеся соединения лежат в начале очереди
+        while (len(self._idle) > self.min_size
+               and now - self._idle[0].returned > self.max_idle):
+            expired.append(self._idle.popleft())
+        return expired
+
+    def _check(self, slot):
+        connection = slot.connection
+        if connection.closed:
+            healthy = False
+        elif time.monotonic() - slot.returned < self.check_interval:
+            return True
+        else:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                healthy = True
+            except psycopg2.Error:
+                healthy = False
+        if healthy:
+            return True
+        with self._condition:
+            self._stats['health_check_failures'] += 1
+        logger.warning('Пул соединений %s: соединение не прошло проверку и закрыто', self.name)
+        self._discard(connection)
+        return False
+
+    @staticmethod
+    def _reset(connection):
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, connection):
+        with self._condition:
+            self._forget(connection)
+            self._condition.notify()
+        _close_quietly(connection)
+
+    def _forget(self, connection):
+        # Вызывается под блокировкой
+        if self._created.pop(connection, None) is not None:
+            self._size -= 1
+            self._stats['closed'] += 1
+
+    def _record_wait(self, wait_time):
+        if wait_time is None:
+            return
+        with self._condition:
+            self._stats['waits'] += 1
+            self._stats['wait_time'] += wait_time
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """
+    Пул для базы alias с данными параметрами подключения. После fork дочерний процесс
+    получает свой пул: соединения родителя использовать нельзя
+    """
+    key = (os.getpid(), alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = {**POOL_DEFAULTS, **(options or {})}
+            pool = _pools[key] = ConnectionPool(
+                name=f"{alias}:{conn_params.get('dbname') or conn_params.get('database')}",
+                min_size=options['MIN_SIZE'],
+                max_size=options['MAX_SIZE'],
+                max_lifetime=options['MAX_LIFETIME'],
+                max_idle=options['MAX_IDLE'],
+                timeout=options['TIMEOUT'],
+                check_interval=options['CHECK_INTERVAL'],
+            )
+        return pool
+
+
+def close_pools(dbname=None):
+    """
+    Закрывает свободные соединения пулов (всех или только к базе dbname)
+    """
+    with _pools_lock:
+        pools = [pool for (pid, _, params), pool in _pools.items()
+                 if pid == os.getpid() and (dbname is None or ('dbname', dbname) in params)]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """
+    Метрики всех пулов процесса: {имя пула: {показатель: значение}}
+    """
+    with _pools_lock:
+        pools = [pool for (pid, _, _), pool in _pools.items() if pid == os.getpid()]
+    return {pool.name: pool.stats() for pool in pools}
+
+
+def log_pool_stats():
+    for name, stats in pool_stats().items():
+        average_wait = stats['wait_time'] / stats['waits'] * 1000 if stats['waits'] else 0
+        logger.info(
+            f"DB pool {name}: size={stats['size']} idle={stats['idle']} in_use={stats['in_use']} "
+            f"requests={stats['requests']} waits={stats['waits']} avg_wait={average_wait:.1f}ms "
+            f"max_wait={stats['wait_time_max'] * 1000:.1f}ms timeouts={stats['timeouts']} "
+            f"opened={stats['opened']} closed={stats['closed']} "
+            f"health_check_failures={stats['health_check_failures']}")
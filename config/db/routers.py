@@ -0,0 +1,103 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """
+    Состояние маршрутизации текущего запроса или задачи.
+
+    replica - чтения можно отправлять в реплику; primary - чтения идут в основную базу
+    (после записи или по требованию); written - в этом запросе была запись
+    """
+
+    def __init__(self, replica=False, primary=False):
+        self.replica = replica
+        self.primary = primary
+        self.written = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def get_state():
+    return _state.get()
+
+
+@contextmanager
+def routing_state(state):
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_replica():
+    """
+    Чтения внутри блока идут в реплику (отчёты, выгрузки, команды управления).
+    Первая же запись возвращает чтения в основную базу
+    """
+    state = get_state()
+    if state is None:
+        with routing_state(RoutingState(replica=True)) as state:
+            yield state
+        return
+    previous, state.replica = state.replica, True
+    try:
+        yield state
+    finally:
+        state.replica = previous
+
+
+@contextmanager
+def use_primary():
+    """
+    Все запросы внутри блока идут в основную базу
+    """
+    with routing_state(RoutingState(primary=True)) as state:
+        yield state
+
+
+class ReadReplicaMixin:
+    """
+    Отмечает представление как только читающее: ReplicaRoutingMiddleware отправляет его
+    чтения (включая отрисовку шаблона) в реплику
+    """
+    read_replica = True
+
+
+class ReplicaRouter:
+    """
+    Записи и чтения по умолчанию идут в основную базу, чтения в режиме use_replica() -
+    в одну из реплик из DATABASE_REPLICAS. После записи чтения до конца запроса
+    возвращаются в основную базу, чтобы не прочитать устаревшие из-за задержки репликации данные.
+    Внутри открытой транзакции основной базы чтения тоже идут в неё: реплика не видит её изменений
+    """
+
+    def db_for_read(self, model, **hints):
+        state = get_state()
+        if state is None or not state.replica or state.primary or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = get_state()
+        if state is not None:
+            state.primary = True
+            state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик обновляется репликацией
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,129 @@
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.constants import OnConflict
+
+DEFAULT_FIXTURES = ['groups_permissions.json', 'users.json', 'mailing.json', 'blog.json']
+
+
+def resolve_fixture(name):
+    """
+    Путь к фикстуре: как есть, если файл существует, иначе относительно FIXTURES_ROOT
+    """
+    if os.path.exists(name):
+        return name
+    return os.path.join(settings.FIXTURES_ROOT, name)
+
+
+def read_fixtures(paths):
+    """
+    Читает фикстуры и возвращает {модель: {pk: объект фикстуры}}.
+    Одинаковые объекты из разных файлов (например, права доступа) берутся один раз, побеждает последний файл
+    """
+    objects = defaultdict(dict)
+    for path in paths:
+        fixture_format = os.path.splitext(path)[1][1:]
+        with open(path, encoding='utf-8') as stream:
+            # Поля, которых уже нет в моделях, пропускаются, как в loaddata --ignorenonexistent
+            for deserialized in serializers.deserialize(fixture_format, stream, ignorenonexistent=True):
+                objects[type(deserialized.object)][deserialized.object.pk] = deserialized
+    return objects
+
+
+def sort_models(models):
+    """
+    Порядок загрузки: модель идёт после моделей, на которые ссылается внешними ключами
+    """
+    models = list(models)
+    dependencies = {
+        model: {field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model in models and field.related_model is not model}
+        for model in models
+    }
+    ordered = []
+    while dependencies:
+        ready = [model for model, depends_on in dependencies.items() if not depends_on - set(ordered)]
+        if not ready:
+            # Циклические ссылки: ограничения внешних ключей проверяются в конце транзакции
+            ready = list(dependencies)
+        for model in ready:
+            ordered.append(model)
+            del dependencies[model]
+    return ordered
+
+
+def _upsert(model, objs, batch_size, using):
+    """
+    INSERT ... ON CONFLICT (pk) DO UPDATE пачками. raw=True сохраняет значения из фикстуры как есть:
+    bulk_create подставил бы текущее время в поля auto_now_add, как не делает и loaddata
+    """
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields if not field.generated]
+    update_fields = [field for field in fields if not field.primary_key]
+    manager = model._base_manager.using(using)
+    for start in range(0, len(objs), batch_size):
+        manager._insert(
+            objs[start:start + batch_size],
+            fields=fields,
+            using=using,
+            raw=True,
+            on_conflict=OnConflict.UPDATE if update_fields else OnConflict.IGNORE,
+            update_fields=update_fields or None,
+            unique_fields=[opts.pk] if update_fields else None,
+        )
+
+
+def _replace_m2m(model, deserialized_objects, batch_size, using):
+    """
+    Связи многие-ко-многим загруженных объектов заменяются на связи из фикстуры,
+    как при m2m.set() в loaddata, но одним DELETE и bulk_create на поле
+    """
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if not through._meta.auto_created:
+            continue
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        rows = [
+            through(**{f'{source}_id': item.object.pk, f'{target}_id': related_pk})
+            for item in deserialized_objects if field.name in item.m2m_data
+            for related_pk in item.m2m_data[field.name]
+        ]
+        owners = [item.object.pk for item in deserialized_objects if field.name in item.m2m_data]
+        if not owners:
+            continue
+        through._base_manager.using(using).filter(**{f'{source}__in': owners}).delete()
+        through._base_manager.using(using).bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+
+
+def load_fixtures(paths, using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """
+    Загружает фикстуры пачками вместо поштучного save() в loaddata.
+
+    Модели загружаются в порядке зависимостей одной транзакцией, существующие строки обновляются
+    по первичному ключу. Сигналы моделей (post_save, m2m_changed) не отправляются: кэши, которые
+    они сбрасывают, производные данные (счётчики, миниатюры изображений) вызывающий код обновляет сам.
+    Возвращает {модель: список pk загруженных объектов}
+    """
+    objects = read_fixtures(paths)
+    models = sort_models(objects)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        with connection.constraint_checks_disabled():
+            for model in models:
+                _upsert(model, [item.object for item in objects[model].values()], batch_size, using)
+            for model in models:
+                _replace_m2m(model, list(objects[model].values()), batch_size, using)
+        table_names = [model._meta.db_table for model in models]
+        table_names += [field.remote_field.through._meta.db_table
+                        for model in models for field in model._meta.many_to_many]
+        connection.check_constraints(table_names=table_names)
+        # Первичные ключи пришли из фикстур, последовательности нужно сдвинуть за них
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+    return {model: list(objects[model]) for model in models}
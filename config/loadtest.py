@@ -0,0 +1,202 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+# Сценарий: имя, URL, вес в смеси запросов, нужен ли вход и из каких объектов пользователя берётся pk
+Scenario = namedtuple('Scenario', ['name', 'url_name', 'weight', 'authenticated', 'sample'])
+
+SCENARIOS = [
+    Scenario('home_anonymous', 'mailing:index', 10, False, None),
+    Scenario('home', 'mailing:index', 10, True, None),
+    Scenario('clients_list', 'mailing:clients_list', 8, True, None),
+    Scenario('messages_list', 'mailing:messages_list', 6, True, None),
+    Scenario('mailings_list', 'mailing:mailings_list', 8, True, None),
+    Scenario('logs_list', 'mailing:logs_list', 4, True, None),
+    # Страницы клиента и сообщения закэшированы cache_page
+    Scenario('client_view', 'mailing:view', 6, True, 'clients'),
+    Scenario('message_view', 'mailing:view_message', 4, True, 'messages'),
+    Scenario('mailing_view', 'mailing:view_mailing', 4, True, 'mailings'),
+    Scenario('client_create_form', 'mailing:create', 2, True, None),
+    Scenario('message_create_form', 'mailing:create_message', 2, True, None),
+    Scenario('mailing_create_form', 'mailing:create_mailing', 2, True, None),
+    Scenario('blog_list', 'blog:blog_list', 8, False, None),
+    Scenario('blog_detail', 'blog:blog_detail', 6, False, 'posts'),
+    Scenario('login_form', 'users:login', 2, False, None),
+    Scenario('register_form', 'users:register', 1, False, None),
+]
+
+# Заголовок QueryProfilingMiddleware с числом SQL-запросов (сервер запускается с QUERY_PROFILING=True)
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+# Показатели, которые сравниваются с базовым замером: имя -> рост значения плох (True) или хорош (False)
+COMPARED_METRICS = {
+    'rps': False,
+    'p50': True,
+    'p95': True,
+    'p99': True,
+    'error_rate': True,
+    'queries': True,
+}
+
+PlannedRequest = namedtuple('PlannedRequest', ['scenario', 'path', 'session'])
+Result = namedtuple('Result', ['scenario', 'latency', 'error', 'queries'])
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def create_session(user):
+    """
+    Сессия с выполненным входом, как у Client.force_login: сценарии не тратят запросы на вход
+    """
+    engine = import_string(f'{settings.SESSION_ENGINE}.SessionStore')
+    session = engine()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session
+
+
+def plan_requests(scenarios, count, sessions, samples, seed=0):
+    """
+    Список запросов прогона: сценарии выбираются по весам, пользователи и объекты - случайно
+    с заданным seed, поэтому повторный прогон выполняет те же запросы.
+    sessions - [(ключ сессии, {вид объектов: [pk]})], samples - общие объекты ({'posts': [pk]})
+    """
+    rng = random.Random(seed)
+    available = [scenario for scenario in scenarios if _can_plan(scenario, sessions, samples)]
+    if not available:
+        return []
+    weights = [scenario.weight for scenario in available]
+    planned = []
+    for scenario in rng.choices(available, weights=weights, k=count):
+        session, args = None, []
+        if scenario.authenticated:
+            candidates = [item for item in sessions if not scenario.sample or item[1].get(scenario.sample)]
+            session, user_samples = rng.choice(candidates)
+            if scenario.sample:
+                args = [rng.choice(user_samples[scenario.sample])]
+        elif scenario.sample:
+            args = [rng.choice(samples[scenario.sample])]
+        planned.append(PlannedRequest(scenario.name, reverse(scenario.url_name, args=args), session))
+    return planned
+
+
+def _can_plan(scenario, sessions, samples):
+    if scenario.authenticated:
+        return any(not scenario.sample or user_samples.get(scenario.sample) for _, user_samples in sessions)
+    return not scenario.sample or bool(samples.get(scenario.sample))
+
+
+def run_requests(base_url, planned, concurrency, timeout=30):
+    """
+    Выполняет запросы в concurrency потоках, у каждого потока своё keep-alive соединение.
+    Возвращает (результаты, время прогона в секундах)
+    """
+    parts = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    prefix = parts.path.rstrip('/')
+    local = threading.local()
+
+    def request(item):
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = connection_class(parts.netloc, timeout=timeout)
+        headers = {'Host': parts.netloc}
+        if item.session:
+            headers['Cookie'] = f'{settings.SESSION_COOKIE_NAME}={item.session}'
+        started = time.perf_counter()
+        try:
+            connection.request('GET', prefix + item.path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            local.connection = None
+            return Result(item.scenario, time.perf_counter() - started, True, None)
+        latency = time.perf_counter() - started
+        if response.will_close:
+            connection.close()
+            local.connection = None
+        queries = response.getheader(QUERY_COUNT_HEADER)
+        return Result(item.scenario, latency, response.status != 200, int(queries) if queries else None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, planned))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """
+    Показатели по сценариям и в целом: RPS, перцентили задержки в мс, доля ошибок, SQL-запросов на запрос
+    """
+    by_scenario = {}
+    for result in results:
+        by_scenario.setdefault(result.scenario, []).append(result)
+    report = {name: _summary(items, elapsed) for name, items in sorted(by_scenario.items())}
+    report['total'] = _summary(results, elapsed)
+    return report
+
+
+def _summary(results, elapsed):
+    latencies = [result.latency * 1000 for result in results]
+    errors = sum(result.error for result in results)
+    queries = [result.queries for result in results if result.queries is not None]
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': errors / len(results),
+        'rps': len(results) / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'queries': statistics.mean(queries) if queries else None,
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+    Сравнивает замер с базовым. Возвращает [(сценарий, показатель, было, стало, изменение в %, регрессия)].
+    Регрессия - ухудшение показателя больше чем на threshold процентов, для доли ошибок - любой её рост
+    """
+    rows = []
+    for name, metrics in report.items():
+        base_metrics = baseline.get(name)
+        if base_metrics is None:
+            continue
+        for metric, growth_is_bad in COMPARED_METRICS.items():
+            old, new = base_metrics.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+            if metric == 'error_rate':
+                regression = new > old + 1e-9
+            else:
+                regression = (change if growth_is_bad else -change) > threshold
+            rows.append((name, metric, old, new, change, regression))
+    return rows
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['report']
+
+
+def save_baseline(path, report, options):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'options': options, 'report': report}, f, ensure_ascii=False, indent=2)
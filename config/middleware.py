@@ -0,0 +1,230 @@
+import json
+import logging
+import mimetypes
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotModified
+
+from config.db.routers import RoutingState, get_state, routing_state
+from config.queries import QueryRecorder
+from config.storage import ENCODINGS
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilingMiddleware:
+    """
+    Считает SQL-запросы и их время для каждого запроса к сайту и предупреждает о повторяющихся
+    формах запросов (N+1). Включается настройкой QUERY_PROFILING.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        view_name = request.resolver_match.view_name if request.resolver_match else request.path
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time'] = f'{recorder.duration * 1000:.1f}ms'
+        logger.info(f'{view_name}: {recorder.count} SQL queries, {recorder.duration * 1000:.1f} ms')
+
+        for shape, count in recorder.repeated_shapes(settings.QUERY_PROFILING_N1_THRESHOLD).items():
+            logger.warning(f'{view_name}: possible N+1, query repeated {count} times: {shape}')
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Маршрутизация запросов к БД между основной базой и репликами на время запроса к сайту.
+
+    GET-запросы к представлениям с read_replica = True читают из реплики. Запросы, изменяющие
+    данные, работают с основной базой, а после записи клиент ещё REPLICA_PIN_SECONDS секунд
+    читает из основной базы (cookie), пока реплика не догонит её. Включается, если заданы реплики.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_state(self.get_state(request)) as state:
+            response = self.get_response(request)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        with routing_state(self.get_state(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(response, state)
+
+    @staticmethod
+    def get_state(request):
+        primary = (request.method not in ('GET', 'HEAD', 'OPTIONS')
+                   or settings.REPLICA_PIN_COOKIE in request.COOKIES)
+        return RoutingState(primary=primary)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if getattr(view_class, 'read_replica', False):
+            state = get_state()
+            if state is not None:
+                state.replica = True
+
+    @staticmethod
+    def pin(response, state):
+        if state.written:
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт собранную collectstatic статику из STATIC_ROOT без обращения к представлениям.
+
+    Выбирает заранее сжатый вариант файла (brotli, gzip) по заголовку Accept-Encoding,
+    а файлам с хэшем содержимого в имени разрешает кэширование на год. Список файлов
+    читается один раз при запуске. Включается настройкой STATIC_SERVE, если в STATIC_ROOT есть манифест.
+    """
+    sync_capable = True
+    async_capable = True
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    # Файлы без хэша в имени могут измениться, поэтому браузер проверяет их по ETag
+    REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        manifest_path = os.path.join(settings.STATIC_ROOT, getattr(staticfiles_storage, 'manifest_name', ''))
+        if not os.path.isfile(manifest_path):
+            raise MiddlewareNotUsed
+        with open(manifest_path, encoding='utf-8') as f:
+            self.immutable = set(json.load(f).get('paths', {}).values())
+        self.files = self._scan(settings.STATIC_ROOT)
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else f'/{settings.STATIC_URL}'
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _scan(root):
+        """
+        Возвращает {имя: (путь, размер, ETag, {кодировка: (путь, размер)})} для всех файлов STATIC_ROOT
+        """
+        compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(compressed_suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                variants = {}
+                for encoding, suffix in ENCODINGS:
+                    if os.path.isfile(path + suffix):
+                        variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+                files[name] = (path, stat.st_size, etag, variants)
+        return files
+
+    @staticmethod
+    def _accepted_encodings(request):
+        accepted = set()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            encoding, _, params = part.partition(';')
+            name, _, value = params.strip().partition('=')
+            try:
+                quality = float(value) if name.strip() == 'q' else 1
+            except ValueError:
+                quality = 0
+            if quality > 0:
+                accepted.add(encoding.strip().lower())
+        return accepted
+
+    def match(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            name = request.path_info[len(self.prefix):]
+            entry = self.files.get(name)
+            if entry is not None:
+                return name, entry
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        matched = self.match(request)
+        if matched is not None:
+            return self.serve(request, *matched)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        matched = self.match(request)
+        if matched is not None:
+            # Файл читается с диска в потоке, чтобы не останавливать цикл событий
+            return await sync_to_async(self.serve, thread_sensitive=False)(request, *matched)
+        return await self.get_response(request)
+
+    def serve(self, request, name, entry):
+        path, size, etag, variants = entry
+        encoding = None
+        accepted = self._accepted_encodings(request)
+        for candidate, _ in ENCODINGS:
+            if candidate in variants and candidate in accepted:
+                encoding = candidate
+                path, size = variants[candidate]
+                etag = f'{etag[:-1]}-{candidate}"'
+                break
+
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse()
+            response['Content-Length'] = str(size)
+        else:
+            # Статика небольшая и уже сжата, поэтому файл читается целиком: так ответ одинаково
+            # отдаётся и под WSGI, и под ASGI без синхронного итератора
+            with open(path, 'rb') as f:
+                response = HttpResponse(f.read())
+            response['Content-Length'] = str(size)
+
+        if response.status_code != 304:
+            content_type, _ = mimetypes.guess_type(name)
+            response['Content-Type'] = content_type or 'application/octet-stream'
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = self.IMMUTABLE_CACHE_CONTROL if name in self.immutable \
+            else self.REVALIDATE_CACHE_CONTROL
+        if variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,184 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder обрезает время до миллисекунд, а для курсора нужна полная точность
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPage:
+    """
+    Страница курсорной пагинации. Повторяет нужную шаблонам часть интерфейса django.core.paginator.Page
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor, query_params, cursor_param):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._query_params = query_params
+        self._cursor_param = cursor_param
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _query_with_cursor(self, cursor):
+        params = self._query_params.copy()
+        params.pop(self._cursor_param, None)
+        if cursor is not None:
+            params[self._cursor_param] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query_with_cursor(self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query_with_cursor(self.previous_cursor)
+
+    @property
+    def first_query(self):
+        return self._query_with_cursor(None)
+
+
+class KeysetPaginationMixin:
+    """
+    Курсорная (keyset) пагинация для ListView.
+
+    Вместо OFFSET следующая страница выбирается условием по значениям полей последней записи,
+    поэтому стоимость запроса не зависит от номера страницы. Последнее поле в keyset_ordering
+    должно быть уникальным, а для всего набора полей вместе с фильтром владельца нужен индекс.
+    Сортировать можно и по аннотациям queryset (например, по релевантности поиска).
+    """
+    paginate_by = 20
+    keyset_ordering = ('-pk',)
+    cursor_param = 'cursor'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def _keyset_fields(self, queryset):
+        """
+        Возвращает для каждого поля сортировки (имя, поле, по убыванию, атрибут объекта)
+        """
+        model = queryset.model
+        fields = []
+        for name in self.get_keyset_ordering():
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name in queryset.query.annotations:
+                field, attr = queryset.query.annotations[name].output_field, name
+            elif name == 'pk':
+                field, attr = model._meta.pk, 'pk'
+            else:
+                field = model._meta.get_field(name)
+                attr = field.attname
+            fields.append((name, field, descending, attr))
+        return fields
+
+    @staticmethod
+    def _encode_cursor(direction, values):
+        raw = json.dumps([direction, values], cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def _decode_cursor(self, cursor, fields):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+            if direction not in (NEXT, PREVIOUS) or len(values) != len(fields):
+                raise ValueError
+            return direction, [field.to_python(value) for (_, field, _, _), value in zip(fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            raise Http404('Некорректный курсор страницы')
+
+    @staticmethod
+    def _keyset_filter(fields, values, backward):
+        """
+        Строит условие (a > x) OR (a = x AND b > y) OR ... с учётом направления сортировки
+        """
+        condition = Q()
+        equal = Q()
+        for (name, _, descending, _), value in zip(fields, values):
+            lookup = 'lt' if descending != backward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def _row_values(obj, fields):
+        return [getattr(obj, attr) for _, _, _, attr in fields]
+
+    def _page_queryset(self, queryset, page_size):
+        """
+        Возвращает запрос строк страницы (с одной лишней для проверки продолжения) и данные курсора
+        """
+        fields = self._keyset_fields(queryset)
+        cursor = self.request.GET.get(self.cursor_param)
+        direction, values = self._decode_cursor(cursor, fields) if cursor else (NEXT, None)
+        backward = direction == PREVIOUS
+
+        ordering = [
+            f"{'-' if descending != backward else ''}{name}" for name, _, descending, _ in fields
+        ]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(fields, values, backward))
+        return queryset[:page_size + 1], (fields, values, backward)
+
+    def _build_page(self, object_list, page_size, fields, values, backward):
+        has_more = len(object_list) > page_size
+        object_list = object_list[:page_size]
+        if backward:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = self._encode_cursor(NEXT, self._row_values(object_list[-1], fields))
+        if object_list and has_previous:
+            previous_cursor = self._encode_cursor(PREVIOUS, self._row_values(object_list[0], fields))
+
+        page = KeysetPage(object_list, next_cursor, previous_cursor, self.request.GET, self.cursor_param)
+        return None, page, object_list, page.has_other_pages()
+
+    def paginate_queryset(self, queryset, page_size):
+        # Асинхронное представление выбирает страницу заранее через apaginate_queryset
+        if getattr(self, '_prefetched_page', None) is not None:
+            return self._prefetched_page
+        page_queryset, state = self._page_queryset(queryset, page_size)
+        return self._build_page(list(page_queryset), page_size, *state)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        page_queryset, state = self._page_queryset(queryset, page_size)
+        self._prefetched_page = self._build_page([obj async for obj in page_queryset], page_size, *state)
+        return self._prefetched_page
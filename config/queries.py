@@ -0,0 +1,59 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """
+    Приводит SQL к «форме» запроса: литералы и списки IN заменяются на плейсхолдеры
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """
+    Обёртка execute_wrapper, которая запоминает выполненные запросы и их длительность
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self, threshold):
+        """
+        Формы запросов, выполненные не менее threshold раз, - признак проблемы N+1
+        """
+        shapes = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count >= threshold}
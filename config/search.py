@@ -0,0 +1,79 @@
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'russian'
+SEARCH_PARAM = 'q'
+# Короче трёх символов триграммный индекс не работает, и поиск по фрагменту превратится в полный просмотр
+TRIGRAM_MIN_LENGTH = 3
+
+
+def search_queryset(queryset, query, trigram_fields=()):
+    """
+    Полнотекстовый поиск по предвычисленному столбцу search_vector с ранжированием.
+
+    Столбец заполняется триггером БД, поиск идёт по GIN-индексу. Для полей из trigram_fields
+    дополнительно ищется вхождение фрагмента (например, части адреса почты) по триграммному индексу.
+    """
+    query = query.strip()
+    if not query:
+        return queryset.none()
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    condition = Q(search_vector=search_query)
+    if len(query) >= TRIGRAM_MIN_LENGTH:
+        # Условие записано как UPPER(field) LIKE UPPER(...), чтобы совпасть с выражением индекса
+        for field in trigram_fields:
+            condition |= Q(**{f'{field}__icontains': query})
+    # ts_rank возвращает real: его десятичная запись в курсоре не равна исходному значению, и на следующей
+    # странице сравнение rank < x теряет строки с тем же рангом. В double precision значение точно
+    # переживает Python float и JSON, поэтому курсор по рангу находит свою строку
+    rank = Cast(SearchRank(F('search_vector'), search_query), FloatField())
+    return queryset.annotate(rank=rank).filter(condition)
+
+
+class SearchMixin:
+    """
+    Поиск в ListView с курсорной пагинацией: при заданном параметре q список фильтруется
+    и сортируется по релевантности
+    """
+    search_param = SEARCH_PARAM
+    search_trigram_fields = ()
+
+    def get_search_query(self):
+        return self.request.GET.get(self.search_param, '').strip()
+
+    def get_queryset(self):
+        # Сам вектор в списке не нужен, а для длинных текстов он занимает больше самих данных
+        queryset = super().get_queryset().defer('search_vector')
+        query = self.get_search_query()
+        if query:
+            queryset = search_queryset(queryset, query, self.search_trigram_fields)
+        return queryset
+
+    def get_keyset_ordering(self):
+        if self.get_search_query():
+            return ('-rank', 'pk')
+        return super().get_keyset_ordering()
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['search_query'] = self.get_search_query()
+        context_data['search_param'] = self.search_param
+        return context_data
+
+
+class SearchAdminMixin:
+    """
+    Заменяет поиск icontains в админке на полнотекстовый поиск по search_vector.
+    Если пользователь не выбрал сортировку сам, результаты сортируются по релевантности
+    """
+    search_trigram_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        queryset = search_queryset(queryset, search_term, self.search_trigram_fields)
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('-rank', 'pk')
+        return queryset, False
@@ -28,7 +28,8 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', False) == "True"
 
-ALLOWED_HOSTS = []
+# Имена хостов сайта через запятую (при DEBUG=False без них сайт отвечает 400)
+ALLOWED_HOSTS = [host.strip() for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host.strip()]
 
 # Application definition
 
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'blog',
     'users',
@@ -47,7 +49,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'config.middleware.StaticFilesMiddleware',
+    'config.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,6 +61,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Профилирование SQL-запросов каждого представления и поиск N+1
+QUERY_PROFILING = os.getenv('QUERY_PROFILING', False) == "True"
+QUERY_PROFILING_N1_THRESHOLD = int(os.getenv('QUERY_PROFILING_N1_THRESHOLD', 3))
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -81,15 +90,44 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # PostgreSQL с пулом соединений (config/db): соединение, закрытое в конце запроса, возвращается в пул
+        'ENGINE': 'config.db',
         'NAME': os.getenv('NAME'),
         'USER': "postgres",
         'PASSWORD': os.getenv('PASSWORD'),
         'HOST': os.getenv('HOST'),
-        'PORT': os.getenv('PORT')
+        'PORT': os.getenv('PORT'),
+        'POOL': {
+            'ENABLED': os.getenv('DB_POOL', 'True') == "True",
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
+# Реплика для чтения: списки, статистика и отчёты читают из неё (config/db/routers.py).
+# В тестах реплика указывает на тестовую основную базу
+if os.getenv('REPLICA_NAME') or os.getenv('REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['config.db.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает из основной базы, пока реплика её догоняет
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_COOKIE = 'db_primary'
+
+# Период (в секундах) записи метрик пула соединений в журнал
+DB_POOL_STATS_INTERVAL = int(os.getenv('DB_POOL_STATS_INTERVAL', 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -126,6 +164,20 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # collectstatic добавляет хэш содержимого в имена файлов и пишет рядом .gz и .br варианты
+    'staticfiles': {
+        'BACKEND': 'config.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Отдавать собранную статику из STATIC_ROOT самим приложением (config.middleware.StaticFilesMiddleware)
+STATIC_SERVE = os.getenv('STATIC_SERVE', 'True') == "True"
 
 
 # Default primary key field type
@@ -143,6 +195,7 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/users/login/'
 
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST')
 EMAIL_PORT = os.getenv('EMAIL_PORT')
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
@@ -150,6 +203,38 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', False) == "True"
 EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', False) == "True"
 
+# Очередь служебных писем (users.services): отправка после фиксации транзакции в фоновых потоках
+# и повторы с удваивающейся паузой; при EMAIL_OUTBOX_ASYNC=False - сразу после фиксации
+EMAIL_OUTBOX_ASYNC = os.getenv('EMAIL_OUTBOX_ASYNC', 'True') == "True"
+EMAIL_OUTBOX_WORKERS = int(os.getenv('EMAIL_OUTBOX_WORKERS', 2))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv('EMAIL_OUTBOX_RETRY_DELAY', 30))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_OUTBOX_INTERVAL = int(os.getenv('EMAIL_OUTBOX_INTERVAL', 30))
+
+# Срок действия ссылок из писем (в секундах) и время, на которое запоминается неизвестный токен
+USER_TOKEN_TTL = {
+    'verify': int(os.getenv('USER_TOKEN_VERIFY_TTL', 3 * 24 * 60 * 60)),
+    'reset': int(os.getenv('USER_TOKEN_RESET_TTL', 60 * 60)),
+}
+USER_TOKEN_MISS_CACHE_TIMEOUT = int(os.getenv('USER_TOKEN_MISS_CACHE_TIMEOUT', 10 * 60))
+USER_TOKEN_PURGE_INTERVAL = int(os.getenv('USER_TOKEN_PURGE_INTERVAL', 60 * 60))
+
+# Рассылки отправляются пачками получателей, список которых читается из БД потоком (серверным курсором)
+MAILING_SEND_BATCH_SIZE = int(os.getenv('MAILING_SEND_BATCH_SIZE', 100))
+# Период (в секундах) пересчёта сегментов с хранимым составом
+SEGMENT_REFRESH_INTERVAL = int(os.getenv('SEGMENT_REFRESH_INTERVAL', 15 * 60))
+# Адрес сайта для ссылок в письмах рассылок, которые отправляются вне запроса (ссылка отписки)
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000').rstrip('/')
+# Фильтр Блума по исключённым адресам: начальная ёмкость и допустимая доля ложных срабатываний,
+# которые отсеиваются запросом к БД
+SUPPRESSION_BLOOM_CAPACITY = int(os.getenv('SUPPRESSION_BLOOM_CAPACITY', 100000))
+SUPPRESSION_BLOOM_ERROR_RATE = float(os.getenv('SUPPRESSION_BLOOM_ERROR_RATE', 0.001))
+# Фильтр дочитывает новые записи с окном перекрытия (в секундах) на случай поздней фиксации транзакций
+# и периодически собирается заново, чтобы не пропустить записи ещё более долгих транзакций
+SUPPRESSION_BLOOM_OVERLAP = int(os.getenv('SUPPRESSION_BLOOM_OVERLAP', 10 * 60))
+SUPPRESSION_BLOOM_REBUILD_INTERVAL = int(os.getenv('SUPPRESSION_BLOOM_REBUILD_INTERVAL', 60 * 60))
+
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
@@ -163,6 +248,23 @@ if CACHE_ENABLED:
         }
     }
 
+# Кэшировать роль пользователя в сессии (сбрасывается при изменении его групп)
+ACCESS_ROLE_SESSION_CACHE = os.getenv('ACCESS_ROLE_SESSION_CACHE', 'True') == "True"
+
+# Период (в секундах) сохранения накопленных просмотров статей блога в БД
+BLOG_VIEWS_FLUSH_INTERVAL = int(os.getenv('BLOG_VIEWS_FLUSH_INTERVAL', 60))
+
+# Миниатюры изображений строятся в фоновых потоках; при THUMBNAIL_ASYNC=False - сразу после сохранения
+THUMBNAIL_ASYNC = os.getenv('THUMBNAIL_ASYNC', 'True') == "True"
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Асинхронные версии читающих представлений (главная, списки, блог, поиск для автодополнения).
+# config.asgi включает их, если переменная окружения не задана; под WSGI они выключены
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', False) == "True"
+
+# Периодические задачи (отправка рассылок, очередь писем, очистка) выполняет планировщик в процессе сайта;
+# SCHEDULER_ENABLED=False отключает его, например в дополнительных процессах или при нагрузочном прогоне
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'True') == "True"
 APSCHEDULER_DATETIME_FORMAT = "N j, Y, f:s a"
 APSCHEDULER_RUN_NOW_TIMEOUT = 25
 
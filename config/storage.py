@@ -0,0 +1,79 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен - сжатые .br варианты не создаются
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico')
+# Файлы меньше этого размера сжимать бессмысленно: выигрыш съедают заголовки
+COMPRESS_MIN_SIZE = 512
+
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+
+def _without_source_maps(patterns):
+    """
+    Убирает из шаблонов замены ссылки sourceMappingURL: .map файлы Bootstrap в проект не входят
+    """
+    return tuple(
+        (extension, tuple(p for p in extension_patterns if 'sourceMappingURL' not in str(p)))
+        for extension, extension_patterns in patterns
+    )
+
+
+def compress_file(path):
+    """
+    Записывает рядом с файлом сжатые gzip и brotli варианты, если они меньше оригинала.
+    Возвращает список созданных файлов
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if len(content) < COMPRESS_MIN_SIZE:
+        return []
+
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Хранилище статики для collectstatic: добавляет хэш содержимого в имена файлов
+    и заранее пишет сжатые gzip и brotli варианты, которые отдаёт StaticFilesMiddleware.
+
+    Пока collectstatic не запускался (разработка, тесты), шаблоны получают исходные имена файлов.
+    """
+    manifest_strict = False
+    patterns = _without_source_maps(ManifestStaticFilesStorage.patterns)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                for compressed in compress_file(self.path(name)):
+                    yield name, os.path.relpath(compressed, self.location), True
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.urls import get_resolver, reverse
+
+from config.queries import QueryRecorder
+
+
+class QueryBudgetMixin:
+    """
+    Проверяет, что каждый URL пространства имён укладывается в свой бюджет SQL-запросов,
+    не повторяет одинаковые запросы (N+1) и не делает больше запросов при росте объёма данных.
+
+    Наследник задаёт namespace, query_budgets и create_data(), который при каждом вызове
+    добавляет в БД ещё size объектов каждого вида.
+    """
+    namespace = None
+    query_budgets = {}
+    skip_urls = ()
+    data_sizes = (2, 10)
+    n1_threshold = 3
+
+    def create_data(self, size):
+        raise NotImplementedError
+
+    def get_url_args(self, url_name):
+        return []
+
+    def get_request_user(self, url_name):
+        return getattr(self, 'user', None)
+
+    def _url_names(self):
+        _, resolver = get_resolver().namespace_dict[self.namespace]
+        return {pattern.name for pattern in resolver.url_patterns if pattern.name}
+
+    def measure(self, url_name):
+        # Кэш страниц и ролей сбрасывается, чтобы измерять полную стоимость запроса
+        cache.clear()
+        user = self.get_request_user(url_name)
+        if user is not None:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        url = reverse(f'{self.namespace}:{url_name}', args=self.get_url_args(url_name))
+        with QueryRecorder() as recorder:
+            response = self.client.get(url)
+        self.assertLess(response.status_code, 400, f'{url} вернул {response.status_code}')
+        return recorder
+
+    def test_every_url_has_budget(self):
+        missing = self._url_names() - set(self.query_budgets) - set(self.skip_urls)
+        self.assertFalse(missing, f'Не задан бюджет SQL-запросов для: {sorted(missing)}')
+
+    def test_query_budgets(self):
+        counts = {}
+        for size in self.data_sizes:
+            self.create_data(size)
+            for url_name, budget in self.query_budgets.items():
+                recorder = self.measure(url_name)
+                counts.setdefault(url_name, []).append(recorder.count)
+                with self.subTest(url=url_name, size=size):
+                    self.assertLessEqual(recorder.count, budget,
+                                         f'{url_name}: {recorder.count} запросов при бюджете {budget}')
+                    self.assertFalse(recorder.repeated_shapes(self.n1_threshold),
+                                     f'{url_name}: повторяющиеся запросы (N+1)')
+
+        for url_name, url_counts in counts.items():
+            with self.subTest(url=url_name):
+                self.assertLessEqual(url_counts[-1], url_counts[0],
+                                     f'{url_name}: число запросов растёт с объёмом данных {url_counts}')
+
+
+def get_keyset_page(view_class, cursor=None, params=None):
+    """
+    Страница представления с KeysetPaginationMixin без HTTP-запроса: для проверки порядка и курсоров.
+    params - остальные параметры запроса (например, строка поиска)
+    """
+    params = dict(params or {})
+    if cursor:
+        params[view_class.cursor_param] = cursor
+    request = RequestFactory().get('/', params)
+    view = view_class()
+    view.setup(request)
+    _, page, _, _ = view.paginate_queryset(view.get_queryset(), view.paginate_by)
+    return page
+
+
+def walk_keyset_pages(view_class, params=None):
+    """
+    pk объектов всех страниц вперёд по next_cursor, затем обратно от последней по previous_cursor
+    """
+    forward, backward = [], []
+    page = get_keyset_page(view_class, params=params)
+    forward.append([obj.pk for obj in page])
+    while page.has_next():
+        page = get_keyset_page(view_class, page.next_cursor, params)
+        forward.append([obj.pk for obj in page])
+    backward.append([obj.pk for obj in page])
+    while page.has_previous():
+        page = get_keyset_page(view_class, page.previous_cursor, params)
+        backward.insert(0, [obj.pk for obj in page])
+    return forward, backward
@@ -0,0 +1,252 @@
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+import psycopg2
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from psycopg2 import extensions
+
+from config.db.pool import ConnectionPool, PoolTimeout
+from mailing.models import Client, Log, Mailing, Message
+from users.models import User
+
+
+class FakeConnection:
+    """
+    Соединение psycopg2 в той мере, в какой его использует пул
+    """
+
+    def __init__(self):
+        self.closed = 0
+        self.healthy = True
+        self.info = mock.Mock(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+        self.rollbacks = 0
+
+    def cursor(self):
+        cursor = mock.MagicMock()
+        if not self.healthy:
+            cursor.__enter__.return_value.execute.side_effect = psycopg2.OperationalError('server closed')
+        return cursor
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def make_pool(self, **options):
+        options = {'min_size': 0, 'max_size': 3, 'max_lifetime': 1800, 'max_idle': 300, 'timeout': 1,
+                   'check_interval': 30, **options}
+        return ConnectionPool('test', **options)
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def setUp(self):
+        self.opened = []
+        self.now = 1000.0
+
+    def freeze_time(self):
+        # Подменяется только время пула: ожидание Condition идёт по настоящим часам
+        clock = mock.patch('config.db.pool.time', monotonic=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_lifo_reuse(self):
+        pool = self.make_pool()
+        first, second = pool.getconn(self.connect), pool.getconn(self.connect)
+        pool.putconn(first)
+        pool.putconn(second)
+        self.assertIs(pool.getconn(self.connect), second)
+        self.assertIs(pool.getconn(self.connect), first)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_fill(self):
+        pool = self.make_pool(min_size=2)
+        pool.fill(self.connect)
+        pool.fill(self.connect)
+        self.assertEqual(pool.stats()['idle'], 2)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_timeout(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.getconn(self.connect)
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(self.connect)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_waiter_gets_returned_connection(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.getconn(self.connect)
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(pool.getconn(self.connect)))
+        waiter.start()
+        time.sleep(0.05)
+        pool.putconn(connection)
+        waiter.join(1)
+        self.assertEqual(received, [connection])
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_threads_never_share_connection(self):
+        pool = self.make_pool(max_size=3)
+        lock = threading.Lock()
+        in_use = set()
+        errors = []
+        peak = [0]
+
+        def work():
+            for _ in range(20):
+                connection = pool.getconn(self.connect)
+                with lock:
+                    if connection in in_use:
+                        errors.append(connection)
+                    in_use.add(connection)
+                    peak[0] = max(peak[0], len(in_use))
+                time.sleep(0.001)
+                with lock:
+                    in_use.discard(connection)
+                pool.putconn(connection)
+
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(errors, [])
+        self.assertLessEqual(peak[0], 3)
+        self.assertLessEqual(len(self.opened), 3)
+        stats = pool.stats()
+        self.assertEqual((stats['requests'], stats['in_use'], stats['timeouts']), (200, 0, 0))
+
+    def test_lifetime_eviction(self):
+        self.freeze_time()
+        pool = self.make_pool(max_lifetime=60)
+        old, fresh = pool.getconn(self.connect), pool.getconn(self.connect)
+        pool.putconn(fresh)
+        self.now += 61
+        # Отслужившее соединение закрывается при возврате, а простоявшее в пуле - при выдаче
+        pool.putconn(old)
+        self.assertTrue(old.closed)
+        connection = pool.getconn(self.connect)
+        self.assertTrue(fresh.closed)
+        self.assertIs(connection, self.opened[-1])
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_idle_eviction_keeps_min_size(self):
+        self.freeze_time()
+        pool = self.make_pool(min_size=1, max_idle=60)
+        connections = [pool.getconn(self.connect) for _ in range(3)]
+        for connection in connections[:2]:
+            pool.putconn(connection)
+        self.now += 61
+        pool.putconn(connections[2])
+        self.assertEqual([connection.closed for connection in connections], [1, 1, 0])
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_health_check(self):
+        self.freeze_time()
+        pool = self.make_pool(check_interval=30)
+        broken, closed = pool.getconn(self.connect), pool.getconn(self.connect)
+        pool.putconn(broken)
+        pool.putconn(closed)
+        closed.closed = 1
+        broken.healthy = False
+        self.now += 31
+        with self.assertLogs('config.db.pool', 'WARNING'):
+            connection = pool.getconn(self.connect)
+        self.assertIs(connection, self.opened[-1])
+        self.assertTrue(broken.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['health_check_failures'], stats['size']), (2, 1))
+
+    def test_reset_on_return(self):
+        pool = self.make_pool()
+        in_transaction, lost = pool.getconn(self.connect), pool.getconn(self.connect)
+        in_transaction.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+        lost.info.transaction_status = extensions.TRANSACTION_STATUS_UNKNOWN
+        pool.putconn(in_transaction)
+        pool.putconn(lost)
+        self.assertEqual(in_transaction.rollbacks, 1)
+        self.assertFalse(in_transaction.closed)
+        self.assertTrue(lost.closed)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_foreign_connection(self):
+        pool = self.make_pool()
+        pool.getconn(self.connect)
+        foreign = FakeConnection()
+        pool.putconn(foreign)
+        self.assertTrue(foreign.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn(mock.Mock(side_effect=psycopg2.OperationalError('refused')))
+        self.assertIsInstance(pool.getconn(self.connect), FakeConnection)
+
+
+class PooledDatabaseTest(SimpleTestCase):
+    # Закрытие соединения внутри транзакции TestCase откатило бы её
+    databases = {'default'}
+
+    def test_close_returns_connection_to_pool(self):
+        connection.ensure_connection()
+        raw = connection.connection
+        pool = connection.pool
+        idle = pool.stats()['idle']
+        connection.close()
+        self.assertEqual(pool.stats()['idle'], idle + 1)
+        self.assertFalse(raw.closed)
+        connection.ensure_connection()
+        self.assertIs(connection.connection, raw)
+
+
+class LoadFixturesTest(TestCase):
+
+    def load(self):
+        call_command('load_fixtures', stdout=StringIO())
+
+    def snapshot(self):
+        return {model: list(model.objects.order_by('pk').values()) for model in (User, Client, Message, Mailing, Log)}
+
+    def test_load_twice(self):
+        self.load()
+        loaded = self.snapshot()
+        self.assertTrue(all(loaded.values()))
+        self.load()
+        self.assertEqual(self.snapshot(), loaded)
+
+    def test_counters_and_sequences(self):
+        self.load()
+        for mailing in Mailing.objects.all():
+            logs = Log.objects.filter(mailing=mailing)
+            last_log = logs.order_by('-time', '-id').first()
+            self.assertEqual(
+                (mailing.total_attempts, mailing.success_count, mailing.fail_count,
+                 mailing.last_attempt_time, mailing.last_status),
+                (logs.count(), logs.filter(status=Log.SUCCESS).count(), logs.filter(status=Log.FAIL).count(),
+                 last_log and last_log.time, last_log and last_log.status))
+        # Последовательности сдвинуты за pk из фикстур
+        client = Client.objects.create(name='Новый', email='new@test.ru')
+        self.assertFalse(Client.objects.filter(pk__gt=client.pk).exists())
+
+    def test_m2m_replaced(self):
+        self.load()
+        mailing = Mailing.objects.filter(clients__isnull=False).first()
+        extra = Client.objects.create(name='Лишний', email='extra@test.ru')
+        mailing.clients.add(extra)
+        self.load()
+        self.assertNotIn(extra, mailing.clients.all())
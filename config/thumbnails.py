@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Размеры миниатюр: ширина, высота и нужно ли обрезать изображение точно под размер
+THUMBNAIL_SIZES = {
+    'small': (96, 96, True),
+    'medium': (240, 240, True),
+    'card': (600, 400, True),
+    'large': (1200, 1200, False),
+}
+THUMBNAIL_QUALITY = 85
+HASH_LENGTH = 12
+
+# Поля с изображениями и размеры, которые для них готовятся: (app_label, model_name, field_name) -> размеры
+_registry = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+# Объекты, уже стоящие в очереди, чтобы повторные сохранения не запускали построение заново
+_pending = set()
+
+
+def thumbnails_field_name(field_name):
+    return f'{field_name}_thumbnails'
+
+
+def register(model, field_name, sizes):
+    """
+    Включает подготовку миниатюр для поля изображения модели.
+    У модели должно быть поле JSONField <field_name>_thumbnails
+    """
+    _registry[(model._meta.app_label, model._meta.model_name, field_name)] = tuple(sizes)
+    post_save.connect(_image_saved, sender=model, dispatch_uid=f'thumbnails:{model._meta.label}.{field_name}')
+
+
+def registered_fields():
+    """
+    Возвращает список (модель, поле, размеры) всех зарегистрированных полей
+    """
+    from django.apps import apps
+    return [(apps.get_model(app_label, model_name), field_name, sizes)
+            for (app_label, model_name, field_name), sizes in _registry.items()]
+
+
+def get_sizes(instance, field_name):
+    return _registry.get((instance._meta.app_label, instance._meta.model_name, field_name), ())
+
+
+def is_stale(instance, field_name):
+    """
+    Проверяет, что миниатюры отсутствуют или построены для другого исходного файла
+    """
+    file = getattr(instance, field_name)
+    thumbnails = getattr(instance, thumbnails_field_name(field_name)) or {}
+    return bool(file) and thumbnails.get('source') != file.name
+
+
+def thumbnail_name(source_name, digest, size, extension):
+    """
+    Имя миниатюры рядом с оригиналом: <имя>.<хэш содержимого>.<размер>.<расширение>
+    """
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, f'{stem}.{digest}.{size}.{extension}')
+
+
+def _render(image, size, image_format):
+    width, height, crop = THUMBNAIL_SIZES[size]
+    if crop:
+        thumbnail = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    else:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, height), Image.Resampling.LANCZOS)
+    if image_format == 'JPEG' and thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+    buffer = BytesIO()
+    thumbnail.save(buffer, image_format, quality=THUMBNAIL_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def build_thumbnails(file, sizes, force=False):
+    """
+    Строит миниатюры файла изображения и возвращает словарь {'source': имя, 'sizes': {размер: имя}}.
+    Уже существующие миниатюры с тем же хэшем содержимого повторно не строятся
+    """
+    storage = file.storage
+    with storage.open(file.name, 'rb') as source:
+        content = source.read()
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+
+    image = Image.open(BytesIO(content))
+    image_format = image.format if image.format in ('JPEG', 'PNG', 'WEBP', 'GIF') else 'PNG'
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    image = ImageOps.exif_transpose(image)
+
+    result = {}
+    for size in sizes:
+        name = thumbnail_name(file.name, digest, size, extension)
+        if force or not storage.exists(name):
+            if force and storage.exists(name):
+                storage.delete(name)
+            saved = storage.save(name, ContentFile(_render(image, size, image_format)))
+            if saved != name:
+                # Ту же миниатюру успел записать другой поток: содержимое совпадает, копия не нужна
+                storage.delete(saved)
+        result[size] = name
+    return {'source': file.name, 'sizes': result}
+
+
+def generate_thumbnails(instance, field_name, force=False):
+    """
+    Строит миниатюры поля объекта и сохраняет их имена одним UPDATE.
+    Если за это время загрузили другой файл, результат не сохраняется
+    """
+    file = getattr(instance, field_name)
+    if not file:
+        return None
+    try:
+        thumbnails = build_thumbnails(file, get_sizes(instance, field_name), force=force)
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+        logger.warning('Не удалось построить миниатюры %s: %s', file.name, e)
+        return None
+    type(instance)._default_manager.filter(pk=instance.pk, **{field_name: file.name}).update(
+        **{thumbnails_field_name(field_name): thumbnails})
+    setattr(instance, thumbnails_field_name(field_name), thumbnails)
+    return thumbnails
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS,
+                                           thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _run_in_background(model, pk, field_name):
+    with _executor_lock:
+        _pending.discard((model, pk, field_name))
+    close_old_connections()
+    try:
+        instance = model._default_manager.filter(pk=pk).first()
+        if instance is not None and is_stale(instance, field_name):
+            generate_thumbnails(instance, field_name)
+    except Exception:
+        logger.exception('Ошибка построения миниатюр %s #%s', model._meta.label, pk)
+    finally:
+        close_old_connections()
+
+
+def _submit(model, pk, field_name):
+    with _executor_lock:
+        if (model, pk, field_name) in _pending:
+            return
+        _pending.add((model, pk, field_name))
+    _get_executor().submit(_run_in_background, model, pk, field_name)
+
+
+def enqueue(instance, field_name):
+    """
+    Ставит построение миниатюр в фоновую очередь после фиксации транзакции
+    """
+    model, pk = type(instance), instance.pk
+    if settings.THUMBNAIL_ASYNC:
+        transaction.on_commit(lambda: _submit(model, pk, field_name))
+    else:
+        transaction.on_commit(lambda: generate_thumbnails(instance, field_name))
+
+
+def _image_saved(sender, instance, update_fields=None, **kwargs):
+    for (app_label, model_name, field_name) in _registry:
+        if (app_label, model_name) != (instance._meta.app_label, instance._meta.model_name):
+            continue
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        if is_stale(instance, field_name):
+            enqueue(instance, field_name)
+
+
+def thumbnail_url(file, size):
+    """
+    Возвращает адрес миниатюры нужного размера, а пока её нет - адрес оригинала
+    """
+    if not file:
+        return ''
+    thumbnails = getattr(file.instance, thumbnails_field_name(file.field.name), None) or {}
+    name = thumbnails.get('sizes', {}).get(size) if thumbnails.get('source') == file.name else None
+    return file.storage.url(name) if name else file.url
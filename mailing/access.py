@@ -0,0 +1,162 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+MANAGER_GROUP = 'manager'
+
+ANONYMOUS = 'anonymous'
+USER = 'user'
+MANAGER = 'manager'
+SUPERUSER = 'superuser'
+
+ROLE_SESSION_KEY = '_access_role'
+ROLE_VERSION_KEY = 'access:role_version:{}'
+ROLE_GLOBAL_VERSION_KEY = 'access:role_version'
+
+
+class AccessPolicy:
+    """
+    Права пользователя в рамках одного запроса: роль определяется один раз,
+    а доступ к объектам ограничивается фильтром queryset, а не проверкой после выборки
+    """
+
+    def __init__(self, user, role):
+        self.user = user
+        self.role = role
+
+    @property
+    def is_superuser(self):
+        return self.role == SUPERUSER
+
+    @property
+    def is_manager(self):
+        return self.role == MANAGER
+
+    @property
+    def can_view_all(self):
+        return self.role in (SUPERUSER, MANAGER)
+
+    def has_perm(self, perm):
+        return self.user.has_perm(perm)
+
+    def is_owner(self, obj, owner_field='owner'):
+        return getattr(obj, f'{owner_field}_id') == self.user.pk
+
+    def scope(self, queryset, owner_field='owner', managers_see_all=False):
+        """
+        Оставляет в queryset только объекты, доступные пользователю
+        """
+        if self.is_superuser or (managers_see_all and self.is_manager):
+            return queryset
+        if self.role == ANONYMOUS:
+            return queryset.none()
+        return queryset.filter(**{owner_field: self.user})
+
+
+def resolve_role(user):
+    """
+    Определяет роль пользователя запросом к БД
+    """
+    if not user.is_authenticated:
+        return ANONYMOUS
+    if user.is_superuser:
+        return SUPERUSER
+    if user.groups.filter(name=MANAGER_GROUP).exists():
+        return MANAGER
+    return USER
+
+
+def _get_role_version(user_id):
+    versions = cache.get_many([ROLE_GLOBAL_VERSION_KEY, ROLE_VERSION_KEY.format(user_id)])
+    return [versions.get(ROLE_GLOBAL_VERSION_KEY, 0), versions.get(ROLE_VERSION_KEY.format(user_id), 0)]
+
+
+def _get_role(request):
+    user = request.user
+    if not settings.ACCESS_ROLE_SESSION_CACHE or not user.is_authenticated or user.is_superuser:
+        return resolve_role(user)
+
+    # В сессии роль хранится вместе с версией, которая меняется при изменении групп пользователя
+    version = _get_role_version(user.pk)
+    cached = request.session.get(ROLE_SESSION_KEY)
+    if cached and cached[0] == user.pk and cached[1] == version:
+        return cached[2]
+    role = resolve_role(user)
+    request.session[ROLE_SESSION_KEY] = [user.pk, version, role]
+    return role
+
+
+def get_access_policy(request):
+    """
+    Возвращает политику доступа текущего запроса, вычисляя её не более одного раза
+    """
+    policy = getattr(request, '_access_policy', None)
+    if policy is None or policy.user is not request.user:
+        policy = AccessPolicy(request.user, _get_role(request))
+        request._access_policy = policy
+    return policy
+
+
+def invalidate_roles(user_ids=None):
+    """
+    Сбрасывает закэшированные в сессиях роли указанных пользователей или всех пользователей
+    """
+    keys = [ROLE_GLOBAL_VERSION_KEY] if user_ids is None else [ROLE_VERSION_KEY.format(pk) for pk in user_ids]
+    for key in keys:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_roles([instance.pk])
+    elif pk_set:
+        invalidate_roles(pk_set)
+    else:
+        invalidate_roles()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, **kwargs):
+    invalidate_roles()
+
+
+class OwnerScopedMixin:
+    """
+    Ограничивает queryset представления объектами, доступными пользователю
+    """
+    owner_field = 'owner'
+    managers_see_all = False
+
+    def get_queryset(self):
+        policy = get_access_policy(self.request)
+        return policy.scope(super().get_queryset(), self.owner_field, self.managers_see_all)
+
+
+class AsyncAccessMixin:
+    """
+    Для асинхронных представлений: до проверок доступа загружает пользователя, его роль
+    и (если нужны) права, чтобы LoginRequiredMixin, PermissionRequiredMixin и OwnerScopedMixin
+    работали без синхронных обращений к БД
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if isinstance(self, OwnerScopedMixin):
+            await sync_to_async(get_access_policy)(request)
+        if request.user.is_authenticated and getattr(self, 'permission_required', None):
+            await sync_to_async(request.user.get_all_permissions)()
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
@@ -1,29 +1,112 @@
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Client, Mailing, Message, Log
+
+from config.search import SearchAdminMixin
+from .forms import update_fields
+from .models import Attachment, Client, ForbiddenWord, Mailing, Message, Log, Segment, Suppression
+from .services import (pause_mailings, resume_mailings, complete_mailings, reschedule_mailings,
+                       clone_mailings, refresh_segment)
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(SearchAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'email', 'comment')
-    search_fields = ('name', 'email',)
+    search_fields = ('name', 'email', 'comment')
+    search_trigram_fields = ('email',)
     list_filter = ('name', 'email',)
 
 
 @admin.register(Mailing)
 class MailingAdmin(admin.ModelAdmin):
-    list_display = ('name', 'status', 'periodicity', 'start_date', 'owner', )
+    list_display = ('name', 'status', 'periodicity', 'start_date', 'owner', 'success_count', 'fail_count',
+                    'last_attempt_time', )
+    readonly_fields = Mailing.COUNTER_FIELDS
     search_fields = ('name',)
     list_filter = ('status',)
+    actions = ('pause', 'resume', 'complete', 'postpone_day', 'clone')
+
+    def save_model(self, request, obj, form, change):
+        # Счётчики попыток меняет только диспетчер, при изменении рассылки сохраняются поля формы
+        obj.save(update_fields=update_fields(form) if change else None)
+
+    @admin.action(description='Приостановить')
+    def pause(self, request, queryset):
+        self.message_user(request, f'Приостановлено рассылок: {pause_mailings(queryset)}')
+
+    @admin.action(description='Возобновить')
+    def resume(self, request, queryset):
+        self.message_user(request, f'Возобновлено рассылок: {resume_mailings(queryset)}')
+
+    @admin.action(description='Завершить')
+    def complete(self, request, queryset):
+        self.message_user(request, f'Завершено рассылок: {complete_mailings(queryset)}')
+
+    @admin.action(description='Перенести отправку на сутки')
+    def postpone_day(self, request, queryset):
+        self.message_user(request, f'Перенесено рассылок: {reschedule_mailings(queryset, shift=timedelta(days=1))}')
+
+    @admin.action(description='Скопировать вместе с клиентами')
+    def clone(self, request, queryset):
+        cloned, links = clone_mailings(queryset)
+        self.message_user(request, f'Скопировано рассылок: {cloned}, клиентов в копиях: {links}')
+
+
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'name_contains', 'email_contains', 'comment_contains', 'search',
+                    'is_materialized', 'refreshed_at')
+    list_filter = ('is_materialized',)
+    search_fields = ('name',)
+    readonly_fields = ('refreshed_at',)
+    actions = ('refresh',)
+
+    @admin.action(description='Пересчитать хранимый состав')
+    def refresh(self, request, queryset):
+        added = removed = 0
+        for segment in queryset.filter(is_materialized=True):
+            segment_added, segment_removed = refresh_segment(segment)
+            added += segment_added
+            removed += segment_removed
+        self.message_user(request, f'Добавлено клиентов: {added}, удалено: {removed}')
+
+
+class AttachmentInline(admin.TabularInline):
+    model = Attachment
+    fields = ('file', 'name', 'content_type', 'size')
+    readonly_fields = ('size',)
+    extra = 0
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(SearchAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'message')
-    search_fields = ('title',)
+    search_fields = ('title', 'message')
+    inlines = (AttachmentInline,)
 
 
 @admin.register(Log)
 class LogAdmin(admin.ModelAdmin):
     list_display = ('time', 'status', 'server_response', 'mailing')
-    search_fields = ('client',)
-    list_filter = ('status',)
\ No newline at end of file
+    search_fields = ('mailing__name', 'server_response')
+    list_filter = ('status',)
+    list_select_related = ('mailing',)
+    raw_id_fields = ('mailing',)
+    # Точный подсчёт строк на большой таблице логов слишком дорогой
+    show_full_result_count = False
+
+
+@admin.register(ForbiddenWord)
+class ForbiddenWordAdmin(admin.ModelAdmin):
+    list_display = ('word', 'is_active')
+    list_editable = ('is_active',)
+    list_filter = ('is_active',)
+    search_fields = ('word',)
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ('email', 'owner', 'reason', 'details', 'created_at')
+    list_filter = ('reason',)
+    search_fields = ('email',)
+    readonly_fields = ('created_at',)
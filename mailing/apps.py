@@ -7,6 +7,10 @@ class MailingConfig(AppConfig):
     name = 'mailing'
 
     def ready(self):
+        from mailing import access, attachments, content_filter, suppression  # noqa: F401 - подключение обработчиков сигналов
+        from django.conf import settings
+        if not settings.SCHEDULER_ENABLED:
+            return
         from mailing.services import start_scheduler
         sleep(2)
         start_scheduler()
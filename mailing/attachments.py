@@ -0,0 +1,203 @@
+import base64
+import hashlib
+import mmap
+import os
+import re
+import smtplib
+import tempfile
+from contextlib import ExitStack, suppress
+from email.mime.base import MIMEBase
+from email.policy import compat32
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail.message import SafeMIMEMultipart, sanitize_address
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from mailing.models import Attachment
+
+# 57 байт исходного файла дают ровно одну строку base64 из 76 символов
+LINE_BYTES = 57
+CHUNK_BYTES = LINE_BYTES * 16 * 1024
+CRLF = b'\r\n'
+SMTP_POLICY = compat32.clone(linesep='\r\n')
+
+
+def part_name(attachment):
+    """
+    Имя файла закодированной части рядом с вложением. Зависит от имени и типа в письме,
+    поэтому после их изменения часть кодируется заново
+    """
+    digest = hashlib.sha256(f'{attachment.name}\0{attachment.content_type}'.encode()).hexdigest()[:12]
+    return f'{attachment.file.name}.{digest}.part'
+
+
+def mime_part(attachment, payload=''):
+    """
+    MIME-часть вложения с уже закодированным в base64 содержимым
+    """
+    maintype, _, subtype = attachment.content_type.partition('/')
+    part = MIMEBase(maintype, subtype or 'octet-stream')
+    try:
+        attachment.name.encode('ascii')
+        filename = attachment.name
+    except UnicodeEncodeError:
+        filename = ('utf-8', '', attachment.name)
+    part.add_header('Content-Disposition', 'attachment', filename=filename)
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.set_payload(payload)
+    return part
+
+
+def encode_part(attachment):
+    """
+    Путь к MIME-части вложения, закодированной в base64 (заголовки части и строки по 76 символов).
+    Файл кодируется потоком один раз; часть пишется в свой временный файл (у каждого потока и процесса
+    отдельный) и переименовывается, поэтому параллельные отправки не видят её недописанной
+    """
+    storage = attachment.file.storage
+    path = storage.path(part_name(attachment))
+    if os.path.exists(path):
+        return path
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with open(fd, 'wb') as target, attachment.file.open('rb') as source:
+            target.write(mime_part(attachment).as_bytes(policy=SMTP_POLICY))
+            separator = b''
+            while chunk := source.read(CHUNK_BYTES):
+                encoded = base64.b64encode(chunk)
+                for start in range(0, len(encoded), 76):
+                    target.write(separator)
+                    target.write(encoded[start:start + 76])
+                    separator = CRLF
+        # mkstemp создаёт файл с правами 0600, часть получает права остальных файлов хранилища
+        if storage.file_permissions_mode is not None:
+            os.chmod(temp_path, storage.file_permissions_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+class EncodedAttachments(ExitStack):
+    """
+    Закодированные части вложений сообщения, отображённые в память на время отправки.
+    Все письма ссылаются на одни и те же страницы файла, копии в памяти процесса не создаются
+    """
+
+    def __init__(self, attachments):
+        super().__init__()
+        self.attachments = list(attachments)
+        self.parts = []
+        self._mime_parts = None
+
+    def __enter__(self):
+        super().__enter__()
+        for attachment in self.attachments:
+            part_file = self.enter_context(open(encode_part(attachment), 'rb'))
+            self.parts.append(self.enter_context(mmap.mmap(part_file.fileno(), 0, access=mmap.ACCESS_READ)))
+        return self
+
+    def __bool__(self):
+        return bool(self.parts)
+
+    def mime_parts(self):
+        """
+        Части как объекты MIME для почтовых бэкендов без SMTP-соединения (консоль, файлы, тесты).
+        Собираются один раз на отправку, содержимое уже закодировано и письмами не перекодируется
+        """
+        if self._mime_parts is None:
+            self._mime_parts = [mime_part(attachment, bytes(data).partition(CRLF * 2)[2].decode('ascii'))
+                                for attachment, data in zip(self.attachments, self.parts)]
+        return self._mime_parts
+
+
+class MultipartEmail(EmailMessage):
+    """
+    Письмо, которое всегда собирается как multipart/mixed: части вложений дописываются при отправке
+    """
+
+    def _create_attachments(self, msg):
+        msg = super()._create_attachments(msg)
+        if not msg.is_multipart():
+            body_msg = msg
+            msg = SafeMIMEMultipart(_subtype=self.mixed_subtype, encoding=self.encoding or settings.DEFAULT_CHARSET)
+            msg.attach(body_msg)
+        return msg
+
+
+def _quote_periods(data):
+    return re.sub(rb'(?m)^\.', b'..', data)
+
+
+def stream_email(smtp, email, attachments):
+    """
+    Отправляет письмо по открытому SMTP-соединению, как smtplib.SMTP.sendmail, но без сборки письма
+    целиком: заголовки и текст формируются для каждого получателя, а закодированные вложения передаются
+    в сокет прямо из отображённых в память файлов. Строки base64 не начинаются с точки, поэтому
+    экранировать в них нечего. Возвращает отвергнутых получателей {адрес: (код, ответ)}
+    """
+    encoding = email.encoding or settings.DEFAULT_CHARSET
+    from_email = sanitize_address(email.from_email, encoding)
+    recipients = [sanitize_address(address, encoding) for address in email.recipients()]
+    message = email.message()
+    data = message.as_bytes(linesep='\r\n')
+    # Граница частей выбирается при сериализации письма
+    boundary = message.get_boundary().encode()
+    head = _quote_periods(data[:data.rindex(CRLF + b'--' + boundary + b'--')])
+
+    smtp.ehlo_or_helo_if_needed()
+    code, response = smtp.mail(from_email)
+    if code != 250:
+        if code == 421:
+            smtp.close()
+        else:
+            smtp._rset()
+        raise smtplib.SMTPSenderRefused(code, response, from_email)
+    refused = {}
+    for recipient in recipients:
+        code, response = smtp.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(recipients):
+        smtp._rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, response = smtp.docmd('data')
+    if code != 354:
+        smtp._rset()
+        raise smtplib.SMTPDataError(code, response)
+
+    smtp.send(head)
+    for part in attachments.parts:
+        smtp.send(CRLF + b'--' + boundary + CRLF)
+        smtp.send(part)
+    smtp.send(CRLF + b'--' + boundary + b'--' + CRLF + b'.' + CRLF)
+    code, response = smtp.getreply()
+    if code != 250:
+        smtp._rset()
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+
+def send_email(email, attachments):
+    """
+    Отправляет письмо с вложениями: по SMTP - потоком из закодированных частей, в остальные
+    бэкенды - с готовыми MIME-частями. Возвращает количество отправленных писем
+    """
+    if not attachments:
+        return email.send()
+    smtp = getattr(email.get_connection(), 'connection', None)
+    if isinstance(smtp, smtplib.SMTP):
+        stream_email(smtp, email, attachments)
+        return 1
+    email.attachments = attachments.mime_parts()
+    return email.send()
+
+
+@receiver(post_delete, sender=Attachment)
+def attachment_deleted(sender, instance, **kwargs):
+    # Закодированная часть - производные данные, исходный файл остаётся, как у других файлов в MEDIA_ROOT
+    instance.file.storage.delete(part_name(instance))
@@ -0,0 +1,162 @@
+import threading
+from collections import deque, namedtuple
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mailing.models import ForbiddenWord
+
+FORBIDDEN_WORDS_VERSION_KEY = 'forbidden_words:version'
+
+# Латинские буквы, которые пишут вместо похожих кириллических, чтобы обойти фильтр (после приведения к нижнему регистру)
+HOMOGLYPHS = {
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у', 'ё': 'е',
+}
+
+Hit = namedtuple('Hit', ['word', 'start', 'end'])
+
+
+class _NormalizeTable(dict):
+    """
+    Таблица для str.translate: нижний регистр и замена похожих букв символ в символ,
+    чтобы позиции в нормализованном тексте совпадали с позициями в исходном
+    """
+
+    def __missing__(self, code):
+        char = chr(code).lower()
+        if len(char) != 1:
+            char = chr(code)
+        value = self[code] = HOMOGLYPHS.get(char, char)
+        return value
+
+
+_normalize_table = _NormalizeTable()
+
+
+def normalize(text):
+    return text.translate(_normalize_table)
+
+
+class ContentFilter:
+    """
+    Автомат Ахо-Корасик по списку запрещённых слов: текст просматривается один раз,
+    время проверки зависит от длины текста, а не от количества слов
+    """
+
+    def __init__(self, words):
+        # Нормализованная форма -> слово, как оно записано в списке
+        self.words = {normalize(word.strip()): word.strip() for word in words if word.strip()}
+        # Переходы, ссылки неудач и найденные в узле слова; узел 0 - корень
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for normalized, word in self.words.items():
+            self._add(normalized, word)
+        self._build()
+
+    def _add(self, normalized, word):
+        node = 0
+        for char in normalized:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = next_node
+        self._output[node] = (word,)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] += self._output[self._fail[child]]
+
+    def find_all(self, text):
+        """
+        Возвращает все вхождения запрещённых слов в текст: слово и его позиции [start, end) в исходном тексте
+        """
+        hits = []
+        if not self.words or not text:
+            return hits
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for position, char in enumerate(normalize(text)):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for word in output[node]:
+                hits.append(Hit(word, position + 1 - len(word), position + 1))
+        return hits
+
+
+_lock = threading.Lock()
+_compiled = (None, None)
+
+
+def _get_version():
+    version = cache.get(FORBIDDEN_WORDS_VERSION_KEY)
+    if version is None:
+        cache.add(FORBIDDEN_WORDS_VERSION_KEY, 0, timeout=None)
+        version = 0
+    return version
+
+
+def get_content_filter():
+    """
+    Автомат по активным запрещённым словам из БД. Собирается один раз на процесс
+    и пересобирается, когда список слов меняется (версия в кэше)
+    """
+    global _compiled
+    version = _get_version()
+    compiled_version, content_filter = _compiled
+    if content_filter is not None and compiled_version == version:
+        return content_filter
+    with _lock:
+        compiled_version, content_filter = _compiled
+        if content_filter is None or compiled_version != version:
+            words = ForbiddenWord.objects.filter(is_active=True).values_list('word', flat=True)
+            content_filter = ContentFilter(words)
+            _compiled = (version, content_filter)
+    return content_filter
+
+
+def find_forbidden_words(text):
+    return get_content_filter().find_all(text)
+
+
+def check_message(message):
+    """
+    Проверяет тему и текст сообщения: {'title': [...], 'message': [...]} только для полей с нарушениями.
+    Подходит и для форм, и для массовой загрузки сообщений, и для проверки перед отправкой
+    """
+    content_filter = get_content_filter()
+    result = {}
+    for field in ('title', 'message'):
+        hits = content_filter.find_all(getattr(message, field) or '')
+        if hits:
+            result[field] = hits
+    return result
+
+
+def format_hits(hits):
+    return ', '.join(sorted({hit.word for hit in hits}))
+
+
+def invalidate_forbidden_words():
+    cache.add(FORBIDDEN_WORDS_VERSION_KEY, 0, timeout=None)
+    cache.incr(FORBIDDEN_WORDS_VERSION_KEY)
+
+
+@receiver([post_save, post_delete], sender=ForbiddenWord)
+def forbidden_word_changed(sender, **kwargs):
+    invalidate_forbidden_words()
@@ -0,0 +1,232 @@
+import io
+import json
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from mailing.models import Client, Log, Mailing, Message
+from users.models import User
+
+FIRST_NAMES = [
+    ('Александр', 'aleksandr'), ('Мария', 'maria'), ('Иван', 'ivan'), ('Анна', 'anna'), ('Дмитрий', 'dmitry'),
+    ('Елена', 'elena'), ('Сергей', 'sergey'), ('Ольга', 'olga'), ('Андрей', 'andrey'), ('Наталья', 'natalia'),
+    ('Михаил', 'mikhail'), ('Татьяна', 'tatiana'), ('Артём', 'artem'), ('Ксения', 'ksenia'), ('Павел', 'pavel'),
+]
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков', 'Морозов',
+              'Петров', 'Волков', 'Соловьёв', 'Васильев', 'Зайцев', 'Павлов']
+COUNTRIES = ['Россия', 'Беларусь', 'Казахстан', 'Армения', 'Грузия', 'Узбекистан']
+# Пустая строка - часовой пояс сервиса
+TIMEZONES = ['', '', '', 'Europe/Kaliningrad', 'Asia/Yekaterinburg', 'Asia/Novosibirsk', 'Asia/Vladivostok',
+             'Europe/Minsk', 'Asia/Almaty', 'Asia/Yerevan', 'Asia/Tbilisi', 'Asia/Tashkent']
+DOMAINS = ['example.com', 'example.org', 'example.net', 'mail.test', 'inbox.test']
+WORDS = ['скидка', 'новинка', 'акция', 'каталог', 'доставка', 'заказ', 'подарок', 'сезон', 'коллекция', 'выгода',
+         'предложение', 'неделя', 'клиент', 'бонус', 'магазин', 'распродажа', 'подписка', 'новости', 'обзор', 'курс']
+SERVER_ERRORS = ['SMTPRecipientsRefused', 'SMTPServerDisconnected', 'SMTPDataError: 554 Message rejected',
+                 'SMTPSenderRefused']
+
+STATUS_WEIGHTS = [(Mailing.CREATED, 2), (Mailing.STARTED, 5), (Mailing.PAUSED, 1), (Mailing.COMPLETED, 2)]
+PERIODICITY_DAYS = {Mailing.DAILY: 1, Mailing.WEEKLY: 7, Mailing.MONTHLY: 30}
+SUCCESS_RATE = 0.9
+LOCAL_TIME_RATE = 0.2
+
+USER_COLUMNS = ('id', 'password', 'last_login', 'is_superuser', 'first_name', 'last_name', 'is_staff',
+                'is_active', 'date_joined', 'email', 'phone', 'avatar', 'avatar_thumbnails', 'country',
+                'is_verified')
+CLIENT_COLUMNS = ('id', 'name', 'email', 'comment', 'timezone', 'owner')
+MESSAGE_COLUMNS = ('id', 'title', 'message', 'owner')
+MAILING_COLUMNS = ('id', 'name', 'description', 'status', 'periodicity', 'start_date', 'end_date', 'next_send_time',
+                   'message', 'owner', 'send_in_local_time', 'total_attempts', 'success_count', 'fail_count', 'last_attempt_time',
+                   'last_status')
+LOG_COLUMNS = ('time', 'status', 'server_response', 'mailing')
+
+
+def _copy_value(value):
+    """
+    Значение в текстовом формате COPY
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, dict):
+        value = json.dumps(value, ensure_ascii=False)
+    elif not isinstance(value, str):
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(cursor, model, columns, rows):
+    """
+    Загружает строки в таблицу модели одной командой COPY ... FROM STDIN.
+    columns - имена полей модели в порядке значений в строках
+    """
+    if not rows:
+        return 0
+    quote_name = cursor.db.ops.quote_name
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(map(_copy_value, row)))
+        buffer.write('\n')
+    buffer.seek(0)
+    target_columns = ', '.join(quote_name(model._meta.get_field(name).column) for name in columns)
+    cursor.copy_expert(f'COPY {quote_name(model._meta.db_table)} ({target_columns}) FROM STDIN', buffer)
+    return len(rows)
+
+
+def reserve_ids(cursor, model, count):
+    """
+    Резервирует count значений последовательности первичного ключа модели, чтобы ссылки
+    между генерируемыми строками были известны до вставки
+    """
+    if not count:
+        return []
+    cursor.execute(
+        'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+        [model._meta.db_table, model._meta.pk.column, count],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+class DatasetGenerator:
+    """
+    Генератор согласованного синтетического набора данных: пользователи, их клиенты, сообщения,
+    рассылки со связями с клиентами и журнал попыток.
+
+    Содержимое определяется seed; даты отсчитываются от начала текущих суток, чтобы запланированные
+    рассылки оставались в будущем. Данные пишутся пачками через COPY, каждая пачка - своя транзакция,
+    поэтому память не растёт с объёмом набора. Счётчики рассылок сразу соответствуют журналу попыток
+    """
+
+    def __init__(self, seed=0, clients_per_user=100, messages_per_user=5, mailings_per_user=10,
+                 clients_per_mailing=50, logs_per_mailing=10, password='password', using=DEFAULT_DB_ALIAS):
+        self.rng = random.Random(seed)
+        self.clients_per_user = clients_per_user
+        self.messages_per_user = messages_per_user
+        self.mailings_per_user = mailings_per_user
+        self.clients_per_mailing = min(clients_per_mailing, clients_per_user)
+        self.logs_per_mailing = logs_per_mailing
+        # Хэш пароля дорогой намеренно, поэтому он один на всех пользователей набора
+        self.password = make_password(password)
+        self.using = using
+        self.now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @property
+    def rows_per_user(self):
+        return (1 + self.clients_per_user + self.messages_per_user
+                + self.mailings_per_user * (1 + self.clients_per_mailing + self.logs_per_mailing))
+
+    def generate(self, users, batch_size=50000, progress=None):
+        """
+        Создаёт users пользователей со всеми связанными данными. batch_size - примерное число строк
+        в одной пачке; progress(counts) вызывается после каждой пачки с накопленными количествами строк
+        """
+        users_per_batch = max(1, batch_size // self.rows_per_user)
+        totals = dict.fromkeys(('users', 'clients', 'messages', 'mailings', 'links', 'logs'), 0)
+        connection = connections[self.using]
+        for start in range(0, users, users_per_batch):
+            with transaction.atomic(using=self.using), connection.cursor() as cursor:
+                counts = self._write_batch(cursor, min(users_per_batch, users - start))
+            for name, count in counts.items():
+                totals[name] += count
+            if progress is not None:
+                progress(totals)
+        return totals
+
+    def _write_batch(self, cursor, users):
+        user_ids = reserve_ids(cursor, User, users)
+        client_ids = reserve_ids(cursor, Client, users * self.clients_per_user)
+        message_ids = reserve_ids(cursor, Message, users * self.messages_per_user)
+        mailing_ids = reserve_ids(cursor, Mailing, users * self.mailings_per_user)
+
+        user_rows, client_rows, message_rows, mailing_rows, link_rows, log_rows = [], [], [], [], [], []
+        for index, user_id in enumerate(user_ids):
+            clients = client_ids[index * self.clients_per_user:(index + 1) * self.clients_per_user]
+            messages = message_ids[index * self.messages_per_user:(index + 1) * self.messages_per_user]
+            mailings = mailing_ids[index * self.mailings_per_user:(index + 1) * self.mailings_per_user]
+            user_rows.append(self._user(user_id))
+            client_rows.extend(self._client(client_id, user_id) for client_id in clients)
+            message_rows.extend(self._message(message_id, user_id) for message_id in messages)
+            for mailing_id in mailings:
+                mailing, logs = self._mailing(mailing_id, user_id, messages)
+                mailing_rows.append(mailing)
+                log_rows.extend(logs)
+                link_rows.extend((mailing_id, client_id)
+                                 for client_id in self.rng.sample(clients, self.clients_per_mailing))
+
+        return {
+            'users': copy_rows(cursor, User, USER_COLUMNS, user_rows),
+            'clients': copy_rows(cursor, Client, CLIENT_COLUMNS, client_rows),
+            'messages': copy_rows(cursor, Message, MESSAGE_COLUMNS, message_rows),
+            'mailings': copy_rows(cursor, Mailing, MAILING_COLUMNS, mailing_rows),
+            'links': copy_rows(cursor, Mailing.clients.through, ('mailing', 'client'), link_rows),
+            'logs': copy_rows(cursor, Log, LOG_COLUMNS, log_rows),
+        }
+
+    def _days_ago(self, days):
+        return self.now - timedelta(days=days, seconds=self.rng.randrange(86400))
+
+    def _user(self, user_id):
+        rng = self.rng
+        first_name, _ = rng.choice(FIRST_NAMES)
+        date_joined = self._days_ago(rng.randrange(365))
+        last_login = date_joined + timedelta(days=rng.randrange(30)) if rng.random() < 0.8 else None
+        phone = f'+79{rng.randrange(10 ** 9):09d}' if rng.random() < 0.6 else None
+        return (user_id, self.password, last_login, False, first_name, rng.choice(LAST_NAMES), False,
+                rng.random() < 0.95, date_joined, f'user{user_id}@{rng.choice(DOMAINS)}', phone, '', {},
+                rng.choice(COUNTRIES), rng.random() < 0.8)
+
+    def _client(self, client_id, user_id):
+        rng = self.rng
+        first_name, latin_name = rng.choice(FIRST_NAMES)
+        comment = ' '.join(rng.sample(WORDS, 3)) if rng.random() < 0.2 else None
+        return (client_id, f'{first_name} {rng.choice(LAST_NAMES)}',
+                f'{latin_name}.{client_id}@{rng.choice(DOMAINS)}', comment, rng.choice(TIMEZONES), user_id)
+
+    def _message(self, message_id, user_id):
+        rng = self.rng
+        title = ' '.join(rng.sample(WORDS, 3)).capitalize()
+        body = '\n'.join(' '.join(rng.choices(WORDS, k=12)).capitalize() + '.' for _ in range(rng.randint(1, 4)))
+        return message_id, title, body, user_id
+
+    def _mailing(self, mailing_id, user_id, messages):
+        rng = self.rng
+        status = rng.choices([status for status, _ in STATUS_WEIGHTS],
+                             weights=[weight for _, weight in STATUS_WEIGHTS])[0]
+        periodicity = rng.choice(list(PERIODICITY_DAYS))
+        period = timedelta(days=PERIODICITY_DAYS[periodicity])
+        if status == Mailing.CREATED:
+            start_date = self.now + timedelta(days=rng.randrange(1, 30), seconds=rng.randrange(86400))
+        else:
+            start_date = self._days_ago(rng.randrange(1, 120))
+        end_date = start_date + timedelta(days=rng.randrange(30, 365))
+
+        logs = []
+        success_count = fail_count = 0
+        if status != Mailing.CREATED:
+            attempt_time = start_date
+            for _ in range(rng.randint(0, 2 * self.logs_per_mailing)):
+                if attempt_time >= self.now:
+                    break
+                if rng.random() < SUCCESS_RATE:
+                    success_count += 1
+                    logs.append((attempt_time, Log.SUCCESS, None, mailing_id))
+                else:
+                    fail_count += 1
+                    logs.append((attempt_time, Log.FAIL, rng.choice(SERVER_ERRORS), mailing_id))
+                attempt_time += period
+        last_attempt_time, last_status = (logs[-1][0], logs[-1][1]) if logs else (None, None)
+        next_send_time = (last_attempt_time + period) if last_attempt_time else start_date
+        if status == Mailing.COMPLETED:
+            next_send_time = None
+        elif next_send_time < self.now:
+            # Иначе при первом запуске диспетчер разом отправит все «просроченные» рассылки
+            next_send_time = self.now + timedelta(seconds=rng.randrange(86400))
+
+        return (mailing_id, f'Рассылка {mailing_id}', ' '.join(rng.sample(WORDS, 4)), status, periodicity,
+                start_date, end_date, next_send_time, rng.choice(messages) if messages else None, user_id,
+                rng.random() < LOCAL_TIME_RATE, len(logs), success_count, fail_count, last_attempt_time, last_status), logs
+
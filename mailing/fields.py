@@ -0,0 +1,43 @@
+import functools
+import zoneinfo
+
+from django.core.exceptions import ValidationError
+from django.db import models
+
+
+def normalize_email(value):
+    """
+    Адрес почты в каноническом виде: без пробелов по краям и в нижнем регистре
+    """
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+class NormalizedEmailField(models.EmailField):
+    """
+    Поле почты, которое хранит адрес в каноническом виде. Адрес приводится при проверке формы
+    (до проверки уникальности) и перед сохранением, в том числе в bulk_create
+    """
+
+    def to_python(self, value):
+        return normalize_email(super().to_python(value))
+
+    def pre_save(self, model_instance, add):
+        value = normalize_email(getattr(model_instance, self.attname))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+@functools.cache
+def known_timezones():
+    # Множество для проверки принадлежности, поиск в отсортированном списке перебирал бы ~600 строк
+    return frozenset(zoneinfo.available_timezones())
+
+
+@functools.cache
+def timezone_names():
+    return sorted(known_timezones())
+
+
+def validate_timezone(value):
+    if value and value not in known_timezones():
+        raise ValidationError('Неизвестный часовой пояс: %(value)s', params={'value': value})
@@ -1,5 +1,14 @@
+from datetime import timedelta
+
 from django import forms
-from .models import Client, Mailing, Message
+from django.core.exceptions import FieldDoesNotExist
+from django.urls import reverse_lazy
+
+from .content_filter import find_forbidden_words, format_hits
+from .fields import normalize_email, timezone_names
+from .models import Attachment, Client, Mailing, Message, Log, Segment
+from .widgets import AutocompleteSelect, AutocompleteSelectMultiple, MultipleFileInput
+from users.models import User
 
 
 class StyleFormMixin:
@@ -11,11 +20,44 @@ class StyleFormMixin:
                 field.widget.attrs['class'] = 'form-control'
 
 
+def update_fields(form):
+    """
+    Поля модели, которые редактирует форма, для save(update_fields=...). Остальные поля (например,
+    счётчики рассылки, которые диспетчер меняет через F()) при сохранении из формы не перезаписываются
+    """
+    meta = form.instance._meta
+    names = []
+    for name in form.fields:
+        try:
+            field = meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            names.append(name)
+    return names
+
+
 class ClientForm(StyleFormMixin, forms.ModelForm):
     class Meta:
         model = Client
         exclude = ('owner',)
 
+    def __init__(self, *args, owner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.owner_id = owner.pk if owner is not None else self.instance.owner_id
+        self.fields['timezone'].widget = forms.Select(
+            choices=[('', 'Часовой пояс сервиса')] + [(name, name) for name in timezone_names()],
+            attrs=self.fields['timezone'].widget.attrs,
+        )
+
+    def clean_email(self):
+        # Владелец не входит в поля формы, поэтому уникальность пары (почта, владелец) проверяется здесь
+        email = normalize_email(self.cleaned_data['email'])
+        if self.owner_id is not None and (Client.objects.filter(owner_id=self.owner_id, email=email)
+                                          .exclude(pk=self.instance.pk).exists()):
+            raise forms.ValidationError('Клиент с такой почтой уже есть.')
+        return email
+
 
 class MailingForm(StyleFormMixin, forms.ModelForm):
     class Meta:
@@ -25,8 +67,33 @@ class MailingForm(StyleFormMixin, forms.ModelForm):
             'start_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'end_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'next_send_time': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+            'clients': AutocompleteSelectMultiple(url=reverse_lazy('mailing:lookup_clients')),
+            'message': AutocompleteSelect(url=reverse_lazy('mailing:lookup_messages')),
         }
 
+    def __init__(self, *args, owner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Выбирать можно только своих клиентов и свои сообщения (или владельца редактируемой рассылки)
+        owner_id = owner.pk if owner is not None else self.instance.owner_id
+        self.fields['clients'].queryset = Client.objects.filter(owner_id=owner_id)
+        self.fields['message'].queryset = Message.objects.filter(owner_id=owner_id)
+        if owner_id is not None:
+            for field_name in ('clients', 'message'):
+                self.fields[field_name].widget.attrs['data-owner'] = owner_id
+        self.fields['segment'].queryset = Segment.objects.filter(owner_id=owner_id)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('clients') and not cleaned_data.get('segment'):
+            raise forms.ValidationError('Выберите клиентов или сегмент.')
+        return cleaned_data
+
+
+class SegmentForm(StyleFormMixin, forms.ModelForm):
+    class Meta:
+        model = Segment
+        exclude = ('owner',)
+
 
 class ManagerMailingForm(StyleFormMixin, forms.ModelForm):
     class Meta:
@@ -34,25 +101,136 @@ class ManagerMailingForm(StyleFormMixin, forms.ModelForm):
         fields = ('status',)
 
 
+class IdListField(forms.Field):
+    """
+    Список идентификаторов из отмеченных флажков. Доступ к объектам проверяет представление
+    """
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Некорректный список объектов.')
+
+
+class MailingBulkForm(StyleFormMixin, forms.Form):
+    """
+    Форма массовой операции над рассылками
+    """
+    SCOPE_SELECTED = 'selected'
+    SCOPE_ALL = 'all'
+    ACTION_CHOICES = [
+        ('pause', 'Приостановить'),
+        ('resume', 'Возобновить'),
+        ('complete', 'Завершить'),
+        ('reschedule', 'Перенести'),
+        ('clone', 'Скопировать'),
+    ]
+    SCOPE_CHOICES = [
+        (SCOPE_SELECTED, 'Отмеченные рассылки'),
+        (SCOPE_ALL, 'Все доступные рассылки'),
+    ]
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES, label='Действие')
+    scope = forms.ChoiceField(choices=SCOPE_CHOICES, initial=SCOPE_SELECTED, label='Рассылки')
+    ids = IdListField(required=False)
+    next_send_time = forms.DateTimeField(required=False, label='Новое время отправки',
+                                         widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}))
+    shift_hours = forms.IntegerField(required=False, label='Или сдвинуть на, ч')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('scope') == self.SCOPE_SELECTED and not cleaned_data.get('ids'):
+            raise forms.ValidationError('Не отмечено ни одной рассылки.')
+        shift_hours = cleaned_data.get('shift_hours')
+        cleaned_data['shift'] = timedelta(hours=shift_hours) if shift_hours else None
+        if cleaned_data.get('next_send_time') and cleaned_data['shift']:
+            raise forms.ValidationError('Укажите либо новое время отправки, либо сдвиг, но не оба сразу.')
+        if cleaned_data.get('action') == 'reschedule' and not (cleaned_data.get('next_send_time')
+                                                               or cleaned_data['shift']):
+            raise forms.ValidationError('Укажите новое время отправки или сдвиг.')
+        return cleaned_data
+
+
+class MultipleFileField(forms.FileField):
+    """
+    Поле загрузки нескольких файлов сразу: значение - список файлов
+    """
+    widget = MultipleFileInput
+
+    def clean(self, data, initial=None):
+        clean_file = super().clean
+        if isinstance(data, (list, tuple)):
+            return [clean_file(item, initial) for item in data]
+        return [clean_file(data, initial)] if data else []
+
+
 class MessageForm(StyleFormMixin, forms.ModelForm):
+    attachments = MultipleFileField(required=False, label='Вложения',
+                                    help_text='файлы прикладываются к каждому письму с сообщением')
+
     class Meta:
         model = Message
         exclude = ('owner',)
 
+    def save(self, commit=True):
+        message = super().save(commit)
+        if commit:
+            for file in self.cleaned_data['attachments']:
+                Attachment.objects.create(message=message, file=file)
+        return message
+
     def clean_title(self):
         cleaned_data = self.cleaned_data['title']
-        forbidden_words = ['казино', 'криптовалюта', 'крипта', 'биржа', 'обман']
-        for word in forbidden_words:
-            if word in cleaned_data.lower():
-                raise forms.ValidationError('Недопустимое слово в заголовке сообщения!')
+        hits = find_forbidden_words(cleaned_data)
+        if hits:
+            raise forms.ValidationError(f'Недопустимое слово в заголовке сообщения: {format_hits(hits)}')
 
         return cleaned_data
 
     def clean_message(self):
         cleaned_data = self.cleaned_data['message']
-        forbidden_words = ['казино', 'криптовалюта', 'крипта', 'биржа', 'обман']
-        for word in forbidden_words:
-            if word in cleaned_data.lower():
-                raise forms.ValidationError('Недопустимое слово в сообщении!')
+        hits = find_forbidden_words(cleaned_data)
+        if hits:
+            raise forms.ValidationError(f'Недопустимое слово в сообщении: {format_hits(hits)}')
 
         return cleaned_data
+
+
+class LogFilterForm(StyleFormMixin, forms.Form):
+    """
+    Форма фильтрации журнала попыток рассылок
+    """
+    PERIOD_CHOICES = [
+        ('', 'За всё время'),
+        ('hour', 'За последний час'),
+        ('day', 'За последние сутки'),
+        ('week', 'За последнюю неделю'),
+    ]
+    GROUP_CHOICES = [
+        ('mailing', 'По рассылкам'),
+        ('day', 'По дням'),
+    ]
+
+    mailing = forms.ModelChoiceField(queryset=Mailing.objects.none(), required=False, label='Рассылка',
+                                     widget=AutocompleteSelect(url=reverse_lazy('mailing:lookup_mailings')))
+    status = forms.ChoiceField(choices=[('', 'Любой')] + Log.STATUS_VARIANTS, required=False, label='Статус')
+    period = forms.ChoiceField(choices=PERIOD_CHOICES, required=False, label='Период')
+    date_from = forms.DateTimeField(required=False, label='С',
+                                    widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}))
+    date_to = forms.DateTimeField(required=False, label='По',
+                                  widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}))
+    owner = forms.ModelChoiceField(queryset=User.objects.none(), required=False, label='Владелец',
+                                   widget=AutocompleteSelect(url=reverse_lazy('mailing:lookup_owners')))
+    group_by = forms.ChoiceField(choices=GROUP_CHOICES, required=False, label='Статистика')
+
+    def __init__(self, *args, user=None, can_view_all=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        mailings = Mailing.objects.only('id', 'name', 'status')
+        if can_view_all:
+            self.fields['owner'].queryset = User.objects.filter(mailing__isnull=False).distinct()
+        else:
+            mailings = mailings.filter(owner=user)
+            del self.fields['owner']
+        self.fields['mailing'].queryset = mailings
@@ -0,0 +1,132 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.loadtest import PlannedRequest, create_session, run_requests, summarize
+from mailing.management.commands.load_test import LocalServer
+from users.models import User
+
+DEFAULT_URLS = ['/', '/clients_list/', '/messages_list/', '/blog/blog/']
+# Команды запуска серверов по умолчанию: runserver - многопоточный WSGI-сервер Django,
+# ASGI-сервер в Django не входит, поэтому используется uvicorn (его нужно установить)
+DEFAULT_COMMANDS = {
+    'wsgi': None,
+    'asgi': 'uvicorn config.asgi:application --host {host} --port {port} --no-access-log',
+}
+MODES = {
+    # Режим: значение ASYNC_VIEWS в процессе сервера
+    'wsgi': 'False',
+    'asgi': 'True',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает синхронные представления под WSGI-сервером и асинхронные под ASGI-сервером: '
+            'оба сервера запускаются отдельными процессами и получают одинаковые HTTP-запросы '
+            'с одинаковым числом одновременных соединений')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls', help='Адрес страницы, можно указать несколько раз')
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов в каждом режиме')
+        parser.add_argument('--warmup', type=int, default=50, help='Запросы прогрева, не входят в результат')
+        parser.add_argument('--concurrency', type=int, default=20, help='Количество одновременных запросов')
+        parser.add_argument('--user', help='Почта пользователя, от имени которого выполняются запросы')
+        parser.add_argument('--wsgi-command',
+                            help='Команда запуска WSGI-сервера с подстановками {host} и {port}, например '
+                                 '"gunicorn config.wsgi -b {host}:{port} --threads 20"; по умолчанию runserver')
+        parser.add_argument('--asgi-command', default=DEFAULT_COMMANDS['asgi'],
+                            help='Команда запуска ASGI-сервера с подстановками {host} и {port}')
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or DEFAULT_URLS
+        session = None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+            session = create_session(user)
+        try:
+            session_key = session.session_key if session else None
+            planned = [PlannedRequest(url, url, session_key)
+                       for url in (urls[i % len(urls)] for i in range(options['warmup'] + options['requests']))]
+            results = [self.measure(mode, options[f'{mode}_command'], planned, options) for mode in MODES]
+        finally:
+            if session is not None:
+                session.delete()
+
+        self.stdout.write(f"{'режим':<6}{'запросов':>10}{'ошибок':>8}{'RPS':>10}{'p50, мс':>10}{'p95, мс':>10}"
+                          f"{'p99, мс':>10}{'RSS, МБ':>10}{'потоков':>9}{'RPS/МБ':>9}")
+        for mode, total, rss_mb, threads in results:
+            rps_per_mb = f"{total['rps'] / rss_mb:.2f}" if rss_mb else '-'
+            self.stdout.write(
+                f"{mode:<6}{total['requests']:>10}{total['errors']:>8}{total['rps']:>10.1f}"
+                f"{total['p50']:>10.1f}{total['p95']:>10.1f}{total['p99']:>10.1f}"
+                f"{rss_mb or '-':>10}{threads or '-':>9}{rps_per_mb:>9}")
+
+    def measure(self, mode, command, planned, options):
+        """
+        Прогон запросов через сервер режима mode. Возвращает (режим, итоговые показатели,
+        пиковую память процесса сервера в МБ, число его потоков)
+        """
+        warmup = options['warmup']
+        server = LocalServer(command, env={'ASYNC_VIEWS': MODES[mode]}).start()
+        try:
+            run_requests(server.base_url, planned[:warmup], options['concurrency'])
+            # Память и потоки снимаются с процесса сервера, а не команды: потоки WSGI-сервера
+            # живут только пока обслуживают запросы, поэтому их число замеряется во время прогона
+            sampler = StatusSampler(server.process.pid).start()
+            try:
+                results, elapsed = run_requests(server.base_url, planned[warmup:], options['concurrency'])
+            finally:
+                sampler.stop()
+        finally:
+            server.stop()
+        rss_kb = sampler.peak.get('VmHWM')
+        return mode, summarize(results, elapsed)['total'], rss_kb and round(rss_kb / 1024, 1), sampler.peak.get('Threads')
+
+
+class StatusSampler:
+    """
+    Пиковые значения полей /proc/<pid>/status за время прогона, замеряемые в фоновом потоке
+    """
+    interval = 0.05
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        for name, value in process_status(self.pid).items():
+            self.peak[name] = max(value, self.peak.get(name, 0))
+
+
+def process_status(pid):
+    """
+    Числовые поля /proc/<pid>/status (VmHWM в КБ, Threads). Вне Linux - пустой словарь
+    """
+    status = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                value = value.split()
+                if value and value[0].isdigit():
+                    status[name] = int(value[0])
+    except OSError:
+        pass
+    return status
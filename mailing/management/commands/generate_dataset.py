@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mailing.dataset import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическими данными для нагрузочных стендов: пользователи, клиенты, сообщения, '
+            'рассылки со связями и журнал попыток. Одинаковый --seed даёт одинаковый набор')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Количество пользователей')
+        parser.add_argument('--clients-per-user', type=int, default=100)
+        parser.add_argument('--messages-per-user', type=int, default=5)
+        parser.add_argument('--mailings-per-user', type=int, default=10)
+        parser.add_argument('--clients-per-mailing', type=int, default=50)
+        parser.add_argument('--logs-per-mailing', type=int, default=10, help='Среднее количество попыток рассылки')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='password', help='Пароль всех созданных пользователей')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Примерное количество строк в одной пачке')
+        parser.add_argument('--database', default='default', help='База данных для загрузки')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users и --batch-size должны быть положительными')
+        if options['messages_per_user'] < 1 and options['mailings_per_user']:
+            raise CommandError('Для рассылок нужно хотя бы одно сообщение на пользователя')
+        generator = DatasetGenerator(
+            seed=options['seed'],
+            clients_per_user=options['clients_per_user'],
+            messages_per_user=options['messages_per_user'],
+            mailings_per_user=options['mailings_per_user'],
+            clients_per_mailing=options['clients_per_mailing'],
+            logs_per_mailing=options['logs_per_mailing'],
+            password=options['password'],
+            using=options['database'],
+        )
+        started = time.perf_counter()
+
+        def progress(counts):
+            rows = sum(counts.values())
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"пользователей: {counts['users']}, строк: {rows}, "
+                              f"{rows / elapsed:.0f} строк/с", ending='\r')
+            self.stdout.flush()
+
+        totals = generator.generate(options['users'], batch_size=options['batch_size'],
+                                    progress=progress if options['verbosity'] else None)
+        elapsed = time.perf_counter() - started
+        self.stdout.write('')
+        for name, count in totals.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Создано строк: {sum(totals.values())} за {elapsed:.1f} с'))
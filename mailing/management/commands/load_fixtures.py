@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from config.fixtures import DEFAULT_FIXTURES, load_fixtures, resolve_fixture
+from mailing.access import invalidate_roles
+from mailing.content_filter import invalidate_forbidden_words
+from mailing.models import Log, Mailing
+from mailing.services import rebuild_mailing_stats
+
+
+class Command(BaseCommand):
+    help = ('Загружает фикстуры пачками (INSERT ... ON CONFLICT) в порядке зависимостей моделей, '
+            'без поштучного сохранения и сигналов loaddata')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='*', help='Файлы фикстур, по умолчанию все фикстуры из FIXTURES_ROOT')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество строк в одном INSERT')
+        parser.add_argument('--database', default='default', help='База данных для загрузки')
+
+    def handle(self, *args, **options):
+        paths = [resolve_fixture(name) for name in options['fixtures'] or DEFAULT_FIXTURES]
+        using = options['database']
+        started = time.perf_counter()
+        try:
+            with transaction.atomic(using=using):
+                loaded = load_fixtures(paths, using=using, batch_size=options['batch_size'])
+                # Журнал загружен без record_attempt: счётчики попыток рассылок пересчитываются по нему
+                mailing_ids = set(loaded.get(Mailing, []))
+                mailing_ids.update(Log.objects.using(using).filter(pk__in=loaded.get(Log, []), mailing__isnull=False)
+                                   .values_list('mailing_id', flat=True))
+                rebuild_mailing_stats(Mailing.objects.using(using).filter(pk__in=mailing_ids))
+        except FileNotFoundError as error:
+            raise CommandError(f'Фикстура не найдена: {error.filename}')
+        elapsed = time.perf_counter() - started
+
+        # Сигналы не отправлялись: кэши ролей и списка запрещённых слов сбрасываются явно
+        invalidate_roles()
+        invalidate_forbidden_words()
+
+        for model, pks in loaded.items():
+            self.stdout.write(f'{model._meta.label}: {len(pks)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено объектов: {sum(map(len, loaded.values()))} из {len(paths)} фикстур за {elapsed:.2f} с'))
+        self.stdout.write('Миниатюры изображений строятся отдельно: manage.py generate_thumbnails')
@@ -0,0 +1,169 @@
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import Blog
+from config.loadtest import (SCENARIOS, compare, create_session, load_baseline, plan_requests, run_requests,
+                             save_baseline, summarize)
+from mailing.dataset import DatasetGenerator
+from mailing.models import Client, Mailing, Message
+from users.models import User
+
+SAMPLE_SIZE = 50
+SERVER_START_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон страниц сайта: смесь сценариев с входом и без на локально запущенном '
+            'сервере. Показывает RPS, перцентили задержки, долю ошибок и SQL-запросы на запрос '
+            'и сравнивает их с сохранённым базовым замером. Работает без доступа в интернет')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Количество запросов')
+        parser.add_argument('--concurrency', type=int, default=10, help='Количество одновременных запросов')
+        parser.add_argument('--warmup', type=int, default=100, help='Запросы прогрева, не входят в результат')
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=[s.name for s in SCENARIOS],
+                            help='Выполнять только указанные сценарии, можно указать несколько раз')
+        parser.add_argument('--users', type=int, default=10, help='Количество пользователей в сценариях с входом')
+        parser.add_argument('--seed', type=int, default=0, help='seed выбора запросов и генерируемых данных')
+        parser.add_argument('--generate', type=int, metavar='USERS',
+                            help='Перед прогоном создать синтетический набор данных на USERS пользователей')
+        parser.add_argument('--url', help='Адрес уже запущенного сервера; по умолчанию запускается runserver')
+        parser.add_argument('--server-command',
+                            help='Команда запуска сервера с подстановками {host} и {port}, '
+                                 'например "gunicorn config.wsgi -w 4 -b {host}:{port}"')
+        parser.add_argument('--baseline', help='Файл базового замера для сравнения')
+        parser.add_argument('--save-baseline', help='Сохранить результат как базовый замер в файл')
+        parser.add_argument('--threshold', type=float, default=10,
+                            help='Допустимое ухудшение показателей относительно базового замера, %%')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            totals = DatasetGenerator(seed=options['seed']).generate(options['generate'])
+            self.stdout.write(f'Создан набор данных: {totals}')
+
+        scenarios = [s for s in SCENARIOS if not options['scenarios'] or s.name in options['scenarios']]
+        users = list(User.objects.filter(is_active=True, client__isnull=False).distinct()
+                     .order_by('pk')[:options['users']])
+        if not users and any(scenario.authenticated for scenario in scenarios):
+            self.stderr.write('Нет активных пользователей с клиентами, сценарии с входом пропускаются '
+                              '(создать данные: --generate)')
+        sessions = [create_session(user) for user in users]
+        try:
+            session_samples = [(session.session_key, self.collect_samples(user))
+                               for session, user in zip(sessions, users)]
+            samples = {'posts': list(Blog.objects.filter(is_published=True)
+                                     .values_list('pk', flat=True)[:SAMPLE_SIZE])}
+            planned = plan_requests(scenarios, options['warmup'] + options['requests'], session_samples, samples,
+                                    seed=options['seed'])
+            if not planned:
+                raise CommandError('Нет данных ни для одного сценария')
+
+            server = None if options['url'] else LocalServer(options['server_command']).start()
+            try:
+                base_url = options['url'] or server.base_url
+                run_requests(base_url, planned[:options['warmup']], options['concurrency'])
+                results, elapsed = run_requests(base_url, planned[options['warmup']:], options['concurrency'])
+            finally:
+                if server is not None:
+                    server.stop()
+        finally:
+            for session in sessions:
+                session.delete()
+
+        report = summarize(results, elapsed)
+        self.print_report(report)
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], report, {
+                name: options[name] for name in ('requests', 'concurrency', 'warmup', 'users', 'seed')})
+            self.stdout.write(f"Базовый замер сохранён: {options['save_baseline']}")
+        if options['baseline']:
+            rows = compare(report, load_baseline(options['baseline']), options['threshold'])
+            self.print_diff(rows)
+            regressions = [row for row in rows if row[-1]]
+            if regressions:
+                raise CommandError(f'Регрессия по {len(regressions)} показателям относительно '
+                                   f"{options['baseline']}")
+
+    @staticmethod
+    def collect_samples(user):
+        """
+        pk объектов пользователя для страниц просмотра: свои клиенты, сообщения и рассылки
+        """
+        return {
+            'clients': list(Client.objects.filter(owner=user).values_list('pk', flat=True)[:SAMPLE_SIZE]),
+            'messages': list(Message.objects.filter(owner=user).values_list('pk', flat=True)[:SAMPLE_SIZE]),
+            'mailings': list(Mailing.objects.filter(owner=user).values_list('pk', flat=True)[:SAMPLE_SIZE]),
+        }
+
+    def print_report(self, report):
+        self.stdout.write(f"{'сценарий':<22}{'запросов':>9}{'ошибок, %':>11}{'RPS':>9}{'p50, мс':>9}"
+                          f"{'p95, мс':>9}{'p99, мс':>9}{'SQL':>7}")
+        for name, metrics in report.items():
+            queries = f"{metrics['queries']:.1f}" if metrics['queries'] is not None else '-'
+            self.stdout.write(
+                f"{name:<22}{metrics['requests']:>9}{metrics['error_rate'] * 100:>11.1f}{metrics['rps']:>9.1f}"
+                f"{metrics['p50']:>9.1f}{metrics['p95']:>9.1f}{metrics['p99']:>9.1f}{queries:>7}")
+
+    def print_diff(self, rows):
+        self.stdout.write(f"\n{'сценарий':<22}{'показатель':<12}{'было':>10}{'стало':>10}{'изменение':>11}")
+        for name, metric, old, new, change, regression in rows:
+            line = f'{name:<22}{metric:<12}{old:>10.2f}{new:>10.2f}{change:>+10.1f}%'
+            self.stdout.write(self.style.ERROR(line) if regression else line)
+
+
+class LocalServer:
+    """
+    Сервер для прогона в отдельном процессе на свободном локальном порту.
+    QUERY_PROFILING=True включает заголовок с числом SQL-запросов в ответах; планировщик в процессе
+    сервера отключён, а письма не уходят наружу, чтобы фоновые задачи не искажали замер.
+    env - дополнительные переменные окружения процесса сервера
+    """
+    host = '127.0.0.1'
+
+    def __init__(self, command=None, env=None):
+        with socket.socket() as sock:
+            sock.bind((self.host, 0))
+            self.port = sock.getsockname()[1]
+        if command:
+            self.command = shlex.split(command.format(host=self.host, port=self.port))
+        else:
+            self.command = [sys.executable, sys.argv[0], 'runserver', '--noreload', f'{self.host}:{self.port}']
+        self.base_url = f'http://{self.host}:{self.port}'
+        self.env = env or {}
+        self.process = None
+
+    def start(self):
+        allowed_hosts = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
+        env = dict(os.environ, QUERY_PROFILING='True', SCHEDULER_ENABLED='False',
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   ALLOWED_HOSTS=','.join([*allowed_hosts, self.host]), **self.env)
+        try:
+            self.process = subprocess.Popen(self.command, env=env, stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise CommandError(f'Не удалось запустить сервер {" ".join(self.command)}: {e}')
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f'Сервер завершился при запуске: {" ".join(self.command)}')
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise CommandError(f'Сервер не запустился за {SERVER_START_TIMEOUT} с: {" ".join(self.command)}')
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from mailing.services import merge_duplicate_clients, normalize_client_emails
+
+
+class Command(BaseCommand):
+    help = ('Приводит адреса клиентов к нижнему регистру и объединяет клиентов одного владельца с одинаковым '
+            'адресом, перенося их связи с рассылками и сегментами. Работает пачками, поэтому большие таблицы '
+            'можно обработать до применения миграции с уникальным индексом')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество клиентов (групп дубликатов) в одной транзакции')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        normalized = normalize_client_emails(batch_size)
+        groups, deleted = merge_duplicate_clients(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Адресов приведено: {normalized}, групп дубликатов: {groups}, удалено клиентов: {deleted}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from mailing.models import Mailing
+from mailing.services import rebuild_mailing_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики попыток рассылок по журналу попыток'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество рассылок в одном UPDATE')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        last_pk = 0
+        while True:
+            pks = list(Mailing.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            updated += rebuild_mailing_stats(Mailing.objects.filter(pk__in=pks))
+            last_pk = pks[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Счётчики пересчитаны для рассылок: {updated}'))
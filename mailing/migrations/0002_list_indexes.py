@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', 'name', 'id'], name='client_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['name', 'id'], name='client_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['-time', '-id'], name='log_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mailing',
+            index=models.Index(fields=['owner', 'name', 'id'], name='mailing_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mailing',
+            index=models.Index(fields=['name', 'id'], name='mailing_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['owner', '-id'], name='message_owner_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0002_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['mailing', '-time', '-id'], name='log_mailing_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['status', '-time', '-id'], name='log_status_time_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0003_log_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailing',
+            name='fail_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Неуспешных попыток'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='last_attempt_time',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последняя попытка'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='last_status',
+            field=models.CharField(blank=True, editable=False, max_length=50, null=True, verbose_name='Статус последней попытки'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='success_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Успешных попыток'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='total_attempts',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Всего попыток'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations
+
+# Поисковый вектор поддерживается триггером, поэтому он актуален и при массовых INSERT ... SELECT и UPDATE.
+# Адрес почты индексируется целиком и по частям (имя ящика, домен) без морфологии.
+CLIENT_TRIGGER_SQL = """
+CREATE FUNCTION mailing_client_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.email, '')), 'A') ||
+        setweight(to_tsvector('simple', translate(coalesce(NEW.email, ''), '@.', '  ')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(NEW.comment, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER mailing_client_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, email, comment, search_vector ON mailing_client
+FOR EACH ROW EXECUTE FUNCTION mailing_client_search_vector_update();
+
+UPDATE mailing_client SET search_vector = NULL;
+"""
+
+CLIENT_TRIGGER_REVERSE_SQL = """
+DROP TRIGGER mailing_client_search_vector_trigger ON mailing_client;
+DROP FUNCTION mailing_client_search_vector_update();
+"""
+
+MESSAGE_TRIGGER_SQL = """
+CREATE FUNCTION mailing_message_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.message, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER mailing_message_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, message, search_vector ON mailing_message
+FOR EACH ROW EXECUTE FUNCTION mailing_message_search_vector_update();
+
+UPDATE mailing_message SET search_vector = NULL;
+"""
+
+MESSAGE_TRIGGER_REVERSE_SQL = """
+DROP TRIGGER mailing_message_search_vector_trigger ON mailing_message;
+DROP FUNCTION mailing_message_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0005_lookup_prefix_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name='client',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(CLIENT_TRIGGER_SQL, CLIENT_TRIGGER_REVERSE_SQL),
+        migrations.RunSQL(MESSAGE_TRIGGER_SQL, MESSAGE_TRIGGER_REVERSE_SQL),
+        migrations.AddIndex(
+            model_name='client',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='client_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), name='client_email_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+# Слова, которые раньше были зашиты в MessageForm
+INITIAL_WORDS = ['казино', 'криптовалюта', 'крипта', 'биржа', 'обман']
+
+
+def add_initial_words(apps, schema_editor):
+    ForbiddenWord = apps.get_model('mailing', 'ForbiddenWord')
+    ForbiddenWord.objects.bulk_create([ForbiddenWord(word=word) for word in INITIAL_WORDS], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0006_full_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForbiddenWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=100, unique=True, verbose_name='Слово')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Действует')),
+            ],
+            options={
+                'verbose_name': 'Запрещённое слово',
+                'verbose_name_plural': 'Запрещённые слова',
+                'ordering': ('word',),
+            },
+        ),
+        migrations.RunPython(add_initial_words, migrations.RunPython.noop),
+    ]
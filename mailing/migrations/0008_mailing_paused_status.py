@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0007_forbidden_words'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailing',
+            name='status',
+            field=models.CharField(choices=[('Завершена', 'Завершена'), ('Создана', 'Создана'), ('Запущена', 'Запущена'), ('Приостановлена', 'Приостановлена')], default='Создана', max_length=150, verbose_name='Статус'),
+        ),
+    ]
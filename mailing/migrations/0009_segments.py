@@ -0,0 +1,65 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0008_mailing_paused_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailing',
+            name='clients',
+            field=models.ManyToManyField(blank=True, related_name='mailing', to='mailing.client', verbose_name='Клиенты для рассылки'),
+        ),
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150, verbose_name='Название')),
+                ('name_contains', models.CharField(blank=True, max_length=100, verbose_name='Имя содержит')),
+                ('email_contains', models.CharField(blank=True, help_text='например, @example.com', max_length=100, verbose_name='Адрес почты содержит')),
+                ('comment_contains', models.CharField(blank=True, max_length=100, verbose_name='Комментарий содержит')),
+                ('search', models.CharField(blank=True, help_text='полнотекстовый поиск по имени, почте и комментарию', max_length=255, verbose_name='Поисковый запрос')),
+                ('is_materialized', models.BooleanField(default=False, help_text='для сложных условий: состав пересчитывается по расписанию и читается из снимка', verbose_name='Хранить состав')),
+                ('refreshed_at', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Состав пересчитан')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Сегмент',
+                'verbose_name_plural': 'Сегменты',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mailings', to='mailing.segment', verbose_name='Сегмент'),
+        ),
+        migrations.CreateModel(
+            name='SegmentMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_memberships', to='mailing.client', verbose_name='Клиент')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='mailing.segment', verbose_name='Сегмент')),
+            ],
+            options={
+                'verbose_name': 'Клиент сегмента',
+                'verbose_name_plural': 'Клиенты сегментов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='segment',
+            index=models.Index(fields=['owner', 'name', 'id'], name='segment_owner_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='segmentmember',
+            constraint=models.UniqueConstraint(fields=('segment', 'client'), name='segment_member_unique'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:58
+
+from django.db import migrations
+
+# Адреса приводятся к нижнему регистру без пробелов, дубликаты (тот же владелец и адрес) сливаются
+# в самого старого клиента вместе со связями с рассылками и сегментами. Большие таблицы лучше
+# обработать заранее пачками командой merge_duplicate_clients, тогда здесь останется пустой проход
+NORMALIZE_SQL = """
+UPDATE mailing_client SET email = LOWER(BTRIM(email)) WHERE email <> LOWER(BTRIM(email));
+"""
+
+MERGE_SQL = """
+CREATE TEMPORARY TABLE mailing_client_dups ON COMMIT DROP AS
+SELECT c.id AS dup_id, g.keep_id
+FROM mailing_client c
+JOIN (
+    SELECT owner_id, email, MIN(id) AS keep_id FROM mailing_client
+    WHERE owner_id IS NOT NULL
+    GROUP BY owner_id, email HAVING COUNT(*) > 1
+) g ON c.owner_id = g.owner_id AND c.email = g.email AND c.id <> g.keep_id;
+
+INSERT INTO mailing_mailing_clients (mailing_id, client_id)
+SELECT l.mailing_id, d.keep_id FROM mailing_mailing_clients l JOIN mailing_client_dups d ON l.client_id = d.dup_id
+ON CONFLICT DO NOTHING;
+DELETE FROM mailing_mailing_clients WHERE client_id IN (SELECT dup_id FROM mailing_client_dups);
+
+INSERT INTO mailing_segmentmember (segment_id, client_id)
+SELECT m.segment_id, d.keep_id FROM mailing_segmentmember m JOIN mailing_client_dups d ON m.client_id = d.dup_id
+ON CONFLICT DO NOTHING;
+DELETE FROM mailing_segmentmember WHERE client_id IN (SELECT dup_id FROM mailing_client_dups);
+
+DELETE FROM mailing_client WHERE id IN (SELECT dup_id FROM mailing_client_dups);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0009_segments'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NORMALIZE_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(MERGE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:59
+
+import django.db.models.functions.text
+import mailing.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0010_merge_duplicate_clients'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='client',
+            name='email',
+            field=mailing.fields.NormalizedEmailField(max_length=100, verbose_name='Электронная почта'),
+        ),
+        migrations.AddConstraint(
+            model_name='client',
+            constraint=models.UniqueConstraint(fields=('email', 'owner'), name='client_email_owner_unique', violation_error_message='Клиент с такой почтой уже есть.'),
+        ),
+        migrations.AddConstraint(
+            model_name='client',
+            constraint=models.CheckConstraint(check=models.Q(('email', django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('email')))), name='client_email_normalized'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:02
+
+import django.db.models.deletion
+import mailing.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0011_client_email_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', mailing.fields.NormalizedEmailField(max_length=100, verbose_name='Электронная почта')),
+                ('reason', models.CharField(choices=[('unsubscribe', 'Отписка'), ('bounce', 'Постоянная ошибка доставки'), ('complaint', 'Жалоба на спам'), ('manual', 'Добавлен вручную')], max_length=20, verbose_name='Причина')),
+                ('details', models.CharField(blank=True, max_length=150, verbose_name='Подробности')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Добавлен')),
+                ('owner', models.ForeignKey(blank=True, help_text='пусто - адрес исключён из рассылок всех владельцев', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='suppressions', to=settings.AUTH_USER_MODEL, verbose_name='Владелец')),
+            ],
+            options={
+                'verbose_name': 'Исключённый адрес',
+                'verbose_name_plural': 'Исключённые адреса',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='suppression',
+            constraint=models.UniqueConstraint(fields=('email', 'owner'), name='suppression_email_owner_unique', nulls_distinct=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:05
+
+import django.db.models.deletion
+import mailing.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0012_suppressions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='timezone',
+            field=models.CharField(blank=True, help_text='пусто - часовой пояс сервиса', max_length=63, validators=[mailing.fields.validate_timezone], verbose_name='Часовой пояс'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='send_in_local_time',
+            field=models.BooleanField(default=False, help_text='время отправки считается по часовому поясу каждого клиента, письма уходят частями в течение суток', verbose_name='По местному времени получателя'),
+        ),
+        migrations.CreateModel(
+            name='MailingBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence', models.DateTimeField(verbose_name='Отправка по времени сервиса')),
+                ('timezone', models.CharField(blank=True, max_length=63, verbose_name='Часовой пояс')),
+                ('due_time', models.DateTimeField(verbose_name='Время отправки')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='mailing.mailing', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Часть отправки рассылки',
+                'verbose_name_plural': 'Части отправки рассылок',
+                'indexes': [models.Index(fields=['due_time'], name='mailing_bucket_due_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mailingbucket',
+            constraint=models.UniqueConstraint(fields=('mailing', 'occurrence', 'timezone'), name='mailing_bucket_unique'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0013_local_time_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='mailing/attachments', verbose_name='Файл')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='Имя файла в письме')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Тип содержимого')),
+                ('size', models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Размер, байт')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='mailing.message', verbose_name='Сообщение')),
+            ],
+            options={
+                'verbose_name': 'Вложение',
+                'verbose_name_plural': 'Вложения',
+                'ordering': ('id',),
+            },
+        ),
+    ]
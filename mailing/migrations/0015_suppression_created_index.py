@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-19 16:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0014_attachments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='suppression',
+            index=models.Index(fields=['created_at'], name='suppression_created_idx'),
+        ),
+    ]
@@ -1,5 +1,13 @@
+import mimetypes
+import posixpath
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower, Trim, Upper
 
+from mailing.fields import NormalizedEmailField, validate_timezone
 from users.models import User
 
 NULLABLE = {"null": True, "blank": True}
@@ -11,9 +19,13 @@ class Client(models.Model):
     """
 
     name = models.CharField(max_length=100, verbose_name='Имя')
-    email = models.EmailField(max_length=100, verbose_name='Электронная почта')
+    email = NormalizedEmailField(max_length=100, verbose_name='Электронная почта')
     comment = models.TextField(verbose_name='Комментарий', **NULLABLE)
+    timezone = models.CharField(max_length=63, blank=True, validators=[validate_timezone],
+                                verbose_name='Часовой пояс', help_text='пусто - часовой пояс сервиса')
     owner = models.ForeignKey(User, verbose_name='Владелец', on_delete=models.SET_NULL, **NULLABLE)
+    # Заполняется триггером БД из имени, почты и комментария
+    search_vector = SearchVectorField(editable=False, **NULLABLE)
 
     def __str__(self):
         return self.name
@@ -22,6 +34,23 @@ class Client(models.Model):
         verbose_name = "Клиент"
         verbose_name_plural = "Клиенты"
         ordering = ("name",)
+        indexes = [
+            models.Index(fields=['owner', 'name', 'id'], name='client_owner_name_idx'),
+            models.Index(fields=['name', 'id'], name='client_name_idx'),
+            # Поиск по началу имени и адреса в выборе получателей (istartswith / startswith)
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'), name='client_name_prefix_idx'),
+            models.Index(fields=['owner', 'email'], opclasses=['int8_ops', 'varchar_pattern_ops'],
+                         name='client_owner_email_prefix_idx'),
+            GinIndex(fields=['search_vector'], name='client_search_idx'),
+            # Поиск по фрагменту адреса почты (icontains)
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='client_email_trgm_idx'),
+        ]
+        constraints = [
+            # Адрес начинает индекс, поэтому подсчёт разных адресов выполняется только по индексу
+            models.UniqueConstraint(fields=['email', 'owner'], name='client_email_owner_unique',
+                                    violation_error_message='Клиент с такой почтой уже есть.'),
+            models.CheckConstraint(check=Q(email=Lower(Trim('email'))), name='client_email_normalized'),
+        ]
 
 
 class Message(models.Model):
@@ -32,6 +61,8 @@ class Message(models.Model):
     title = models.CharField(max_length=255, verbose_name="Тема")
     message = models.TextField(verbose_name="Сообщение")
     owner = models.ForeignKey(User, verbose_name='Владелец', on_delete=models.SET_NULL, **NULLABLE)
+    # Заполняется триггером БД из темы и текста сообщения
+    search_vector = SearchVectorField(editable=False, **NULLABLE)
 
     def __str__(self):
         return self.title
@@ -39,6 +70,40 @@ class Message(models.Model):
     class Meta:
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
+        indexes = [
+            models.Index(fields=['owner', '-id'], name='message_owner_idx'),
+            models.Index(OpClass(Upper('title'), name='text_pattern_ops'), name='message_title_prefix_idx'),
+            GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ]
+
+
+class Attachment(models.Model):
+    """
+    Файл, который прикладывается к каждому письму с сообщением. При отправке файл кодируется
+    в base64 один раз, закодированная часть письма хранится рядом с файлом
+    """
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments',
+                                verbose_name='Сообщение')
+    file = models.FileField(upload_to='mailing/attachments', verbose_name='Файл')
+    name = models.CharField(max_length=255, blank=True, verbose_name='Имя файла в письме')
+    content_type = models.CharField(max_length=100, blank=True, verbose_name='Тип содержимого')
+    size = models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Размер, байт')
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        if not self.name:
+            self.name = posixpath.basename(self.file.name)
+        if not self.content_type:
+            self.content_type = mimetypes.guess_type(self.name)[0] or 'application/octet-stream'
+        self.size = self.file.size
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = 'Вложение'
+        verbose_name_plural = 'Вложения'
+        ordering = ('id',)
 
 
 class Mailing(models.Model):
@@ -58,12 +123,14 @@ class Mailing(models.Model):
 
     CREATED = "Создана"
     STARTED = "Запущена"
+    PAUSED = "Приостановлена"
     COMPLETED = "Завершена"
 
     STATUS_CHOICES = [
         (COMPLETED, "Завершена"),
         (CREATED, "Создана"),
         (STARTED, "Запущена"),
+        (PAUSED, "Приостановлена"),
     ]
 
     name = models.CharField(max_length=150, verbose_name="Название")
@@ -82,13 +149,32 @@ class Mailing(models.Model):
     )
     end_date = models.DateTimeField(verbose_name='Дата окончания', **NULLABLE, help_text='не обязательное поле')
     next_send_time = models.DateTimeField(verbose_name='Время следующей отправки', **NULLABLE)
-    clients = models.ManyToManyField(Client, related_name='mailing', verbose_name='Клиенты для рассылки')
+    clients = models.ManyToManyField(Client, related_name='mailing', verbose_name='Клиенты для рассылки', blank=True)
+    # Клиенты сегмента отбираются при каждой отправке и добавляются к выбранным вручную
+    segment = models.ForeignKey('Segment', verbose_name='Сегмент', on_delete=models.SET_NULL, related_name='mailings',
+                                **NULLABLE)
     message = models.ForeignKey(Message, verbose_name='Cообщение', on_delete=models.CASCADE, **NULLABLE)
     owner = models.ForeignKey(User, verbose_name='Владелец', on_delete=models.SET_NULL, **NULLABLE)
+    send_in_local_time = models.BooleanField(
+        default=False, verbose_name='По местному времени получателя',
+        help_text='время отправки считается по часовому поясу каждого клиента, письма уходят частями в течение суток',
+    )
+
+    # Денормализованные счётчики попыток отправки, обновляются диспетчером через F().
+    # Попытка - одна запись журнала: у рассылки по местному времени это отправка одной части
+    # (часового пояса), поэтому одна отправка такой рассылки даёт столько попыток, сколько у неё поясов
+    total_attempts = models.PositiveIntegerField(default=0, editable=False, verbose_name='Всего попыток')
+    success_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Успешных попыток')
+    fail_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Неуспешных попыток')
+    last_attempt_time = models.DateTimeField(editable=False, verbose_name='Последняя попытка', **NULLABLE)
+    last_status = models.CharField(max_length=50, editable=False, verbose_name='Статус последней попытки',
+                                   **NULLABLE)
 
     def __str__(self):
         return f"{self.name}, статус: {self.status}"
 
+    COUNTER_FIELDS = ('total_attempts', 'success_count', 'fail_count', 'last_attempt_time', 'last_status')
+
     def save(self, *args, **kwargs):
         if not self.next_send_time:
             self.next_send_time = self.start_date
@@ -102,12 +188,110 @@ class Mailing(models.Model):
         verbose_name = "Рассылка"
         verbose_name_plural = "Рассылки"
         ordering = ("name",)
+        indexes = [
+            models.Index(fields=['owner', 'name', 'id'], name='mailing_owner_name_idx'),
+            models.Index(fields=['name', 'id'], name='mailing_name_idx'),
+        ]
         permissions = [
             ('deactivate_mailing', 'Can deactivate mailing'),
             ('view_all_mailings', 'Can view all mailings'),
         ]
 
 
+class Segment(models.Model):
+    """
+    Динамическая аудитория рассылки: условия отбора клиентов владельца.
+    Состав сегмента вычисляется запросом к БД в момент отправки, а не хранится в связях рассылки
+    """
+    name = models.CharField(max_length=150, verbose_name='Название')
+    owner = models.ForeignKey(User, verbose_name='Владелец', on_delete=models.SET_NULL, **NULLABLE)
+    name_contains = models.CharField(max_length=100, blank=True, verbose_name='Имя содержит')
+    email_contains = models.CharField(max_length=100, blank=True, verbose_name='Адрес почты содержит',
+                                      help_text='например, @example.com')
+    comment_contains = models.CharField(max_length=100, blank=True, verbose_name='Комментарий содержит')
+    search = models.CharField(max_length=255, blank=True, verbose_name='Поисковый запрос',
+                              help_text='полнотекстовый поиск по имени, почте и комментарию')
+    is_materialized = models.BooleanField(
+        default=False, verbose_name='Хранить состав',
+        help_text='для сложных условий: состав пересчитывается по расписанию и читается из снимка',
+    )
+    refreshed_at = models.DateTimeField(editable=False, verbose_name='Состав пересчитан', **NULLABLE)
+
+    def __str__(self):
+        return self.name
+
+    def snapshot_key(self):
+        """
+        Значения, от которых зависит снимок состава: владелец, условия отбора и хранение состава
+        """
+        return (self.owner_id, self.name_contains, self.email_contains, self.comment_contains, self.search,
+                self.is_materialized)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        segment = super().from_db(db, field_names, values)
+        segment._saved_snapshot_key = segment.snapshot_key()
+        return segment
+
+    def save(self, *args, **kwargs):
+        # После изменения условий снимок устарел: до пересчёта состав вычисляется запросом.
+        # Переименование снимок не сбрасывает
+        if self.snapshot_key() != getattr(self, '_saved_snapshot_key', None):
+            self.refreshed_at = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'refreshed_at'}
+        super().save(*args, **kwargs)
+        self._saved_snapshot_key = self.snapshot_key()
+
+    class Meta:
+        verbose_name = 'Сегмент'
+        verbose_name_plural = 'Сегменты'
+        ordering = ('name',)
+        indexes = [
+            models.Index(fields=['owner', 'name', 'id'], name='segment_owner_name_idx'),
+        ]
+
+
+class SegmentMember(models.Model):
+    """
+    Снимок состава сегмента с хранимым составом. Пересчёт меняет только изменившиеся строки
+    """
+    segment = models.ForeignKey(Segment, on_delete=models.CASCADE, related_name='members', verbose_name='Сегмент')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='segment_memberships',
+                               verbose_name='Клиент')
+
+    class Meta:
+        verbose_name = 'Клиент сегмента'
+        verbose_name_plural = 'Клиенты сегментов'
+        constraints = [
+            models.UniqueConstraint(fields=['segment', 'client'], name='segment_member_unique'),
+        ]
+
+
+class MailingBucket(models.Model):
+    """
+    Часть очередной отправки рассылки по местному времени: клиенты одного часового пояса
+    и момент, когда у них наступает время отправки. Диспетчер выбирает наступившие части по индексу
+    """
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, related_name='buckets', verbose_name='Рассылка')
+    occurrence = models.DateTimeField(verbose_name='Отправка по времени сервиса')
+    timezone = models.CharField(max_length=63, blank=True, verbose_name='Часовой пояс')
+    due_time = models.DateTimeField(verbose_name='Время отправки')
+
+    def __str__(self):
+        return f'{self.mailing_id} {self.timezone or "-"} {self.due_time}'
+
+    class Meta:
+        verbose_name = 'Часть отправки рассылки'
+        verbose_name_plural = 'Части отправки рассылок'
+        indexes = [
+            models.Index(fields=['due_time'], name='mailing_bucket_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['mailing', 'occurrence', 'timezone'], name='mailing_bucket_unique'),
+        ]
+
+
 class Log(models.Model):
     """
     Модель для хранения информации о попытках рассылок
@@ -134,3 +318,65 @@ class Log(models.Model):
     class Meta:
         verbose_name = "Попытка рассылки"
         verbose_name_plural = "Попытки рассылки"
+        indexes = [
+            models.Index(fields=['-time', '-id'], name='log_time_idx'),
+            models.Index(fields=['mailing', '-time', '-id'], name='log_mailing_time_idx'),
+            models.Index(fields=['status', '-time', '-id'], name='log_status_time_idx'),
+        ]
+
+
+class ForbiddenWord(models.Model):
+    """
+    Слово, которое нельзя использовать в теме и тексте сообщений
+    """
+    word = models.CharField(max_length=100, unique=True, verbose_name='Слово')
+    is_active = models.BooleanField(default=True, verbose_name='Действует')
+
+    def __str__(self):
+        return self.word
+
+    class Meta:
+        verbose_name = 'Запрещённое слово'
+        verbose_name_plural = 'Запрещённые слова'
+        ordering = ('word',)
+
+
+class Suppression(models.Model):
+    """
+    Адрес, на который рассылки не отправляются: отписка от рассылок владельца или постоянная
+    ошибка доставки. Запись без владельца действует для всех владельцев
+    """
+    UNSUBSCRIBE = 'unsubscribe'
+    BOUNCE = 'bounce'
+    COMPLAINT = 'complaint'
+    MANUAL = 'manual'
+    REASON_CHOICES = [
+        (UNSUBSCRIBE, 'Отписка'),
+        (BOUNCE, 'Постоянная ошибка доставки'),
+        (COMPLAINT, 'Жалоба на спам'),
+        (MANUAL, 'Добавлен вручную'),
+    ]
+
+    email = NormalizedEmailField(max_length=100, verbose_name='Электронная почта')
+    owner = models.ForeignKey(User, verbose_name='Владелец', on_delete=models.CASCADE, related_name='suppressions',
+                              help_text='пусто - адрес исключён из рассылок всех владельцев', **NULLABLE)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name='Причина')
+    details = models.CharField(max_length=150, blank=True, verbose_name='Подробности')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Добавлен')
+
+    def __str__(self):
+        return self.email
+
+    class Meta:
+        verbose_name = 'Исключённый адрес'
+        verbose_name_plural = 'Исключённые адреса'
+        ordering = ('-created_at',)
+        constraints = [
+            # Глобальная запись (owner IS NULL) тоже одна на адрес
+            models.UniqueConstraint(fields=['email', 'owner'], nulls_distinct=False,
+                                    name='suppression_email_owner_unique'),
+        ]
+        indexes = [
+            # Фильтр Блума дочитывает новые записи по времени добавления
+            models.Index(fields=['created_at'], name='suppression_created_idx'),
+        ]
@@ -1,16 +1,592 @@
+import functools
+import itertools
 import smtplib
 import logging
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.conf import settings
-from django.core.mail import send_mail
-from mailing.models import Mailing, Log, Message
+from django.contrib.postgres.search import SearchQuery
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction, connections, router, close_old_connections
+from django.db.models import Case, Count, Exists, Q, Max, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.services import flush_views
+from users.services import process_outbox, purge_expired_tokens, purge_user_sessions
+from mailing.attachments import EncodedAttachments, MultipartEmail, send_email
+from mailing.content_filter import check_message, format_hits
+from mailing.fields import known_timezones
+from mailing.models import Client, Mailing, MailingBucket, Log, Message, Segment, SegmentMember, Suppression
+from mailing.suppression import filter_suppressed, get_suppression_filter, make_unsubscribe_token, suppress_many
 from django.core.cache import cache
+from config.db.pool import log_pool_stats
+from config.db.routers import use_primary
+from config.search import SEARCH_CONFIG
 from config.settings import CACHE_ENABLED
 
 logger = logging.getLogger(__name__)
 
+MAILING_PERIODS = {
+    Mailing.DAILY: timedelta(days=1),
+    Mailing.WEEKLY: timedelta(weeks=1),
+    Mailing.MONTHLY: timedelta(days=30),
+}
+# Насколько раньше времени отправки по часам сервиса может наступить то же время в другом
+# часовом поясе: разница между поясами UTC-12 и UTC+14
+LOCAL_TIME_PLAN_AHEAD = timedelta(hours=26)
+
+
+def record_attempt(mailing, status, server_response):
+    """
+    Записывает попытку отправки в журнал и атомарно обновляет счётчики рассылки
+    """
+    with transaction.atomic():
+        log = Log.objects.create(status=status, server_response=server_response, mailing=mailing)
+        Mailing.objects.filter(pk=mailing.pk).update(
+            total_attempts=F('total_attempts') + 1,
+            success_count=F('success_count') + int(status == Log.SUCCESS),
+            fail_count=F('fail_count') + int(status == Log.FAIL),
+            last_attempt_time=log.time,
+            last_status=status,
+        )
+    return log
+
+
+def insert_from_select(model, columns, queryset):
+    """
+    Выполняет INSERT INTO ... SELECT одним запросом, пропуская уже существующие строки.
+    columns - словарь {имя поля модели: выражение над queryset}
+    """
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    aliases = {f'_insert_{i}': expression for i, expression in enumerate(columns.values())}
+    select = queryset.order_by().annotate(**aliases).values_list(*aliases)
+    sql, params = select.query.sql_with_params()
+    target_columns = ', '.join(quote_name(model._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(model._meta.db_table)} ({target_columns}) {sql} ON CONFLICT DO NOTHING',
+            params,
+        )
+        return cursor.rowcount
+
+
+def pause_mailings(queryset):
+    """
+    Приостанавливает созданные и запущенные рассылки одним UPDATE. Возвращает число изменённых
+    """
+    return queryset.filter(status__in=[Mailing.CREATED, Mailing.STARTED]).update(status=Mailing.PAUSED)
+
+
+def resume_mailings(queryset):
+    """
+    Возобновляет приостановленные рассылки. Статус «Запущена» получают только рассылки, которые
+    уже отправлялись, остальные возвращаются в «Создана»
+    """
+    return queryset.filter(status=Mailing.PAUSED).update(status=Case(
+        When(last_attempt_time__isnull=True, then=Value(Mailing.CREATED)),
+        default=Value(Mailing.STARTED),
+    ))
+
+
+def complete_mailings(queryset):
+    return queryset.exclude(status=Mailing.COMPLETED).update(status=Mailing.COMPLETED)
+
+
+def reschedule_mailings(queryset, next_send_time=None, shift=None):
+    """
+    Назначает рассылкам новое время следующей отправки или сдвигает текущее на shift одним UPDATE
+    """
+    queryset = queryset.exclude(status=Mailing.COMPLETED)
+    if shift is not None:
+        return queryset.filter(next_send_time__isnull=False).update(next_send_time=F('next_send_time') + shift)
+    return queryset.update(next_send_time=next_send_time)
+
+
+CLONE_SUFFIX = ' (копия)'
+
+
+def clone_mailings(queryset, owner=None):
+    """
+    Копирует рассылки вместе с их клиентами одним SQL-запросом: новые идентификаторы берутся
+    из последовательности, затем INSERT ... SELECT копирует рассылки и строки таблицы связи.
+    Копии создаются в статусе «Создана» с обнулёнными счётчиками. Возвращает (рассылок, связей с клиентами)
+    """
+    connection = connections[router.db_for_write(Mailing)]
+    quote_name = connection.ops.quote_name
+    meta = Mailing._meta
+    through = Mailing.clients.through
+    name_length = meta.get_field('name').max_length - len(CLONE_SUFFIX)
+
+    columns, values, params = [], [], []
+    for field in meta.concrete_fields:
+        column = quote_name(field.column)
+        columns.append(column)
+        if field.primary_key:
+            values.append('src.new_id')
+        elif field.name == 'name':
+            values.append(f'LEFT(m.{column}, %s) || %s')
+            params += [name_length, CLONE_SUFFIX]
+        elif field.name == 'status':
+            values.append('%s')
+            params.append(Mailing.CREATED)
+        elif field.name in Mailing.COUNTER_FIELDS:
+            values.append('%s')
+            params.append(field.get_default())
+        elif field.name == 'owner' and owner is not None:
+            values.append('%s')
+            params.append(owner.pk)
+        elif field.name == 'segment' and owner is not None:
+            # Сегмент отбирает клиентов своего владельца, поэтому в копию для другого владельца не переносится
+            values.append(f"CASE WHEN m.{quote_name(meta.get_field('owner').column)} = %s THEN m.{column} END")
+            params.append(owner.pk)
+        else:
+            values.append(f'm.{column}')
+
+    source_sql, source_params = queryset.order_by().values('pk').query.sql_with_params()
+    table = quote_name(meta.db_table)
+    pk_column = quote_name(meta.pk.column)
+    mailing_column = quote_name(through._meta.get_field('mailing').column)
+    client_column = quote_name(through._meta.get_field('client').column)
+    sql = f"""
+        WITH src AS (
+            SELECT ids.{pk_column} AS id, nextval(pg_get_serial_sequence(%s, %s)) AS new_id
+            FROM ({source_sql}) ids
+        ), mailings AS (
+            INSERT INTO {table} ({', '.join(columns)})
+            SELECT {', '.join(values)} FROM {table} m JOIN src ON src.id = m.{pk_column}
+            RETURNING 1
+        ), links AS (
+            INSERT INTO {quote_name(through._meta.db_table)} ({mailing_column}, {client_column})
+            SELECT src.new_id, mc.{client_column}
+            FROM {quote_name(through._meta.db_table)} mc JOIN src ON src.id = mc.{mailing_column}
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM mailings), (SELECT COUNT(*) FROM links)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [meta.db_table, meta.pk.column, *source_params, *params])
+        return cursor.fetchone()
+
+
+def search_clients(queryset, query):
+    """
+    Поиск клиентов по началу имени или адреса почты
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    return queryset.filter(Q(name__istartswith=query) | Q(email__startswith=query.lower()))
+
+
+def add_clients_to_mailing(mailing, clients):
+    """
+    Добавляет в рассылку всех клиентов из queryset одним INSERT ... SELECT в таблицу связи
+    """
+    through = Mailing.clients.through
+    return insert_from_select(through, {'mailing': Value(mailing.pk), 'client': F('pk')}, clients)
+
+
+def normalize_client_emails(batch_size=1000):
+    """
+    Приводит адреса клиентов к каноническому виду (нижний регистр, без пробелов) пачками по batch_size.
+    Возвращает количество изменённых клиентов
+    """
+    connection = connections[router.db_for_write(Client)]
+    quote_name = connection.ops.quote_name
+    table = quote_name(Client._meta.db_table)
+    pk = quote_name(Client._meta.pk.column)
+    email = quote_name(Client._meta.get_field('email').column)
+    sql = f"""
+        UPDATE {table} SET {email} = LOWER(BTRIM({email}))
+        WHERE {pk} IN (SELECT {pk} FROM {table} WHERE {email} <> LOWER(BTRIM({email})) LIMIT %s)
+    """
+    updated = 0
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(sql, [batch_size])
+            if not cursor.rowcount:
+                return updated
+            updated += cursor.rowcount
+
+
+def merge_duplicate_clients(batch_size=1000):
+    """
+    Объединяет клиентов одного владельца с одинаковым адресом: остаётся самый старый клиент,
+    связи дубликатов с рассылками и сегментами переносятся на него, дубликаты удаляются.
+    Каждая пачка из batch_size групп дубликатов обрабатывается одним запросом в своей транзакции.
+    Возвращает (групп, удалено клиентов)
+    """
+    connection = connections[router.db_for_write(Client)]
+    quote_name = connection.ops.quote_name
+    table = quote_name(Client._meta.db_table)
+    pk = quote_name(Client._meta.pk.column)
+    email = quote_name(Client._meta.get_field('email').column)
+    owner = quote_name(Client._meta.get_field('owner').column)
+
+    # Таблицы, ссылающиеся на клиента: (таблица, столбец клиента, столбец второй стороны связи)
+    links = []
+    for model, client_field, other_field in ((Mailing.clients.through, 'client', 'mailing'),
+                                             (SegmentMember, 'client', 'segment')):
+        links.append((quote_name(model._meta.db_table), quote_name(model._meta.get_field(client_field).column),
+                      quote_name(model._meta.get_field(other_field).column)))
+
+    rewire = []
+    for i, (link_table, client_column, other_column) in enumerate(links):
+        rewire.append(f"""
+            moved_{i} AS (
+                INSERT INTO {link_table} ({other_column}, {client_column})
+                SELECT l.{other_column}, d.keep_id FROM {link_table} l JOIN dups d ON l.{client_column} = d.dup_id
+                ON CONFLICT DO NOTHING
+                RETURNING 1
+            ),
+            unlinked_{i} AS (
+                DELETE FROM {link_table} WHERE {client_column} IN (SELECT dup_id FROM dups)
+                RETURNING 1
+            )""")
+    sql = f"""
+        WITH groups AS (
+            SELECT {owner} AS owner_id, {email} AS email, MIN({pk}) AS keep_id FROM {table}
+            WHERE {owner} IS NOT NULL
+            GROUP BY {owner}, {email} HAVING COUNT(*) > 1
+            LIMIT %s
+        ),
+        dups AS (
+            SELECT c.{pk} AS dup_id, g.keep_id FROM {table} c
+            JOIN groups g ON c.{owner} = g.owner_id AND c.{email} = g.email AND c.{pk} <> g.keep_id
+        ),{','.join(rewire)},
+        deleted AS (
+            DELETE FROM {table} WHERE {pk} IN (SELECT dup_id FROM dups)
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM groups), (SELECT COUNT(*) FROM deleted)
+    """
+    groups = deleted = 0
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(sql, [batch_size])
+            batch_groups, batch_deleted = cursor.fetchone()
+        if not batch_groups:
+            return groups, deleted
+        groups += batch_groups
+        deleted += batch_deleted
+
+
+def segment_condition(segment):
+    """
+    Условие отбора клиентов сегмента; пустые условия не ограничивают выборку
+    """
+    condition = Q(owner_id=segment.owner_id)
+    if segment.name_contains:
+        condition &= Q(name__icontains=segment.name_contains)
+    if segment.email_contains:
+        # UPPER(email) LIKE UPPER(...) использует триграммный индекс по адресу
+        condition &= Q(email__icontains=segment.email_contains)
+    if segment.comment_contains:
+        condition &= Q(comment__icontains=segment.comment_contains)
+    if segment.search:
+        condition &= Q(search_vector=SearchQuery(segment.search, config=SEARCH_CONFIG, search_type='websearch'))
+    return condition
+
+
+def resolve_segment(segment):
+    """
+    Клиенты, которые подходят под условия сегмента сейчас
+    """
+    if segment.owner_id is None:
+        return Client.objects.none()
+    return Client.objects.filter(segment_condition(segment))
+
+
+def segment_clients(segment):
+    """
+    Состав сегмента: из снимка, если он хранится и пересчитан после изменения условий, иначе запросом
+    """
+    if segment.is_materialized and segment.refreshed_at is not None:
+        return Client.objects.filter(segment_memberships__segment=segment)
+    return resolve_segment(segment)
+
+
+def refresh_segment(segment):
+    """
+    Пересчитывает снимок состава сегмента: удаляет клиентов, переставших подходить, и добавляет новых
+    (INSERT ... SELECT). Неизменившиеся строки снимка не переписываются. Возвращает (добавлено, удалено)
+    """
+    matching = resolve_segment(segment).order_by().values('pk')
+    with transaction.atomic():
+        removed, _ = SegmentMember.objects.filter(segment=segment).exclude(client__in=matching).delete()
+        added = insert_from_select(SegmentMember, {'segment': Value(segment.pk), 'client': F('pk')},
+                                   resolve_segment(segment))
+        Segment.objects.filter(pk=segment.pk).update(refreshed_at=timezone.now())
+    return added, removed
+
+
+def refresh_segments():
+    """
+    Пересчитывает снимки сегментов с хранимым составом, которые изменились или давно не пересчитывались
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.SEGMENT_REFRESH_INTERVAL)
+    segments = Segment.objects.filter(is_materialized=True).filter(
+        Q(refreshed_at__isnull=True) | Q(refreshed_at__lt=stale_before))
+    for segment in segments.iterator():
+        added, removed = refresh_segment(segment)
+        logger.debug(f"Segment {segment.pk} refreshed: +{added} -{removed}")
+    # У сегментов без хранимого состава снимок не нужен
+    SegmentMember.objects.filter(segment__is_materialized=False).delete()
+
+
+def mailing_audience(mailing, timezone_name=None):
+    """
+    Запросы клиентов рассылки: выбранные вручную и, если задан сегмент, клиенты сегмента.
+    timezone_name ограничивает клиентов одним часовым поясом ('' - клиенты без своего пояса)
+    """
+    audience = [mailing.clients.order_by()]
+    if mailing.segment is not None:
+        audience.append(segment_clients(mailing.segment).order_by())
+    if timezone_name is not None:
+        audience = [clients.filter(timezone=timezone_name) for clients in audience]
+    return audience
+
+
+def mailing_recipients(mailing, timezone_name=None):
+    """
+    Адреса получателей рассылки: выбранные вручную клиенты и клиенты сегмента одним запросом.
+    Каждый адрес получает письмо один раз, даже если попал в рассылку через нескольких клиентов.
+    Адреса читаются серверным курсором пачками, поэтому размер аудитории не ограничен памятью
+    """
+    clients, *others = mailing_audience(mailing, timezone_name)
+    recipients = clients.values_list('email', flat=True).distinct()
+    if others:
+        recipients = recipients.union(*(queryset.values_list('email', flat=True) for queryset in others))
+    return recipients.iterator(chunk_size=settings.MAILING_SEND_BATCH_SIZE)
+
+
+def mailing_timezones(mailing):
+    """
+    Часовые пояса клиентов рассылки одним запросом
+    """
+    clients, *others = mailing_audience(mailing)
+    timezones = clients.values_list('timezone', flat=True).distinct()
+    if others:
+        timezones = timezones.union(*(queryset.values_list('timezone', flat=True) for queryset in others))
+    return list(timezones)
+
+
+def local_due_time(occurrence, timezone_name):
+    """
+    Момент, когда в часовом поясе клиента наступает то же время на часах, что и время отправки
+    рассылки в часовом поясе сервиса. Для пустого или неизвестного пояса - время сервиса
+    """
+    if timezone_name not in known_timezones():
+        timezone_name = settings.TIME_ZONE
+    wall_time = occurrence.astimezone(ZoneInfo(settings.TIME_ZONE)).replace(tzinfo=None)
+    return wall_time.replace(tzinfo=ZoneInfo(timezone_name))
+
+
+def iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def unsuppressed_batches(batches, owner_id):
+    """
+    Пачки получателей без исключённых адресов; опустевшие пачки пропускаются
+    """
+    bloom = get_suppression_filter()
+    for batch in batches:
+        batch = filter_suppressed(batch, owner_id, bloom)
+        if batch:
+            yield batch
+
+
+def unsubscribe_url(recipient, owner_id):
+    return settings.SITE_URL + reverse('mailing:unsubscribe', args=[make_unsubscribe_token(recipient, owner_id)])
+
+
+def build_email(message, recipient, owner_id, connection, email_class=EmailMessage):
+    """
+    Письмо рассылки одному получателю со ссылкой отписки в тексте и в заголовке List-Unsubscribe
+    """
+    url = unsubscribe_url(recipient, owner_id)
+    return email_class(
+        subject=message.title,
+        body=f'{message.message}\n\n--\nОтписаться от рассылки: {url}',
+        from_email=settings.EMAIL_HOST_USER,
+        to=[recipient],
+        connection=connection,
+        headers={'List-Unsubscribe': f'<{url}>', 'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'},
+    )
+
+
+def send_to_recipients(message, batches, owner_id=None):
+    """
+    Отправляет сообщение каждому получателю отдельным письмом через одно соединение с почтовым сервером.
+    Вложения кодируются один раз на всю отправку и передаются во все письма из отображённых в память файлов.
+    Адреса, которые сервер отверг с постоянной ошибкой (5xx), исключаются из всех рассылок, временные
+    ошибки (4xx) только записываются в лог. Если сервер разорвал соединение или отверг отправителя,
+    остаток пачки не отправляется, а следующая пачка идёт через новое соединение: часть получателей
+    письмо уже получила, поэтому итог содержит число неотправленных писем. Исключение выбрасывается,
+    только если не отправлено ни одно письмо. Возвращает итог отправки для журнала
+    """
+    sent = deferred = bounced_count = interrupted = 0
+    error = None
+    reconnect = False
+    batches = iter(batches)
+    with get_connection() as connection, EncodedAttachments(message.attachments.all()) as attachments:
+        email_class = MultipartEmail if attachments else EmailMessage
+        for recipient_list in batches:
+            if reconnect:
+                try:
+                    connection.close()
+                    connection.open()
+                except (OSError, smtplib.SMTPException) as e:
+                    # Переподключиться не удалось: эта и остальные пачки не отправляются
+                    error = e
+                    interrupted += len(recipient_list) + sum(len(rest) for rest in batches)
+                    break
+                reconnect = False
+            bounced = {}
+            for position, recipient in enumerate(recipient_list):
+                try:
+                    sent += send_email(build_email(message, recipient, owner_id, connection, email_class), attachments)
+                except smtplib.SMTPRecipientsRefused as e:
+                    for address, (code, response) in e.recipients.items():
+                        if code >= 500:
+                            bounced[address] = f"{code} {response.decode(errors='replace')}"
+                        else:
+                            deferred += 1
+                            logger.warning(f"Recipient {address} temporarily refused: {code} {response!r}")
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused) as e:
+                    interrupted += len(recipient_list) - position
+                    error, reconnect = e, True
+                    logger.warning(f"Batch interrupted after {position} of {len(recipient_list)} recipients: {e}")
+                    break
+            if bounced:
+                bounced_count += len(bounced)
+                suppress_many(bounced, Suppression.BOUNCE)
+    if interrupted and not sent:
+        raise error
+    server_response = f'Отправлено писем: {sent}'
+    if deferred:
+        server_response += f', временные ошибки (4xx): {deferred}'
+    if bounced_count:
+        server_response += f', отвергнуто (5xx): {bounced_count}'
+    if interrupted:
+        server_response += f', не отправлено из-за ошибки сервера: {interrupted} ({error})'
+    return server_response
+
+
+def rebuild_mailing_stats(queryset=None):
+    """
+    Пересчитывает счётчики попыток рассылок по журналу одним UPDATE с подзапросами
+    """
+    if queryset is None:
+        queryset = Mailing.objects.all()
+    logs = Log.objects.filter(mailing=OuterRef('pk')).order_by()
+
+    def count(**filters):
+        return Coalesce(
+            Subquery(logs.filter(**filters).values('mailing').annotate(c=Count('id')).values('c')),
+            Value(0),
+        )
+
+    last_log = logs.order_by('-time', '-id')
+    return queryset.update(
+        total_attempts=count(),
+        success_count=count(status=Log.SUCCESS),
+        fail_count=count(status=Log.FAIL),
+        last_attempt_time=Subquery(last_log.values('time')[:1]),
+        last_status=Subquery(last_log.values('status')[:1]),
+    )
+
+
+def deliver_mailing(mailing, recipients):
+    """
+    Отправляет рассылку получателям, кроме исключённых адресов, и записывает попытку в журнал.
+    Возвращает False, если отправлять некому
+    """
+    batches = unsuppressed_batches(iter_batches(recipients, settings.MAILING_SEND_BATCH_SIZE), mailing.owner_id)
+    first_batch = next(batches, None)
+    if first_batch is None:
+        return False
+
+    # Список запрещённых слов мог пополниться уже после сохранения сообщения
+    violations = check_message(mailing.message)
+    if violations:
+        words = format_hits([hit for hits in violations.values() for hit in hits])
+        logger.warning(f"Mailing {mailing.id} not sent, forbidden words: {words}")
+        record_attempt(mailing, Log.FAIL, f'Запрещённые слова: {words}'[:150])
+    else:
+        try:
+            logger.debug(f"Sending mailing {mailing.id}: {mailing.message.title}")
+            server_response = send_to_recipients(mailing.message, itertools.chain([first_batch], batches),
+                                                 mailing.owner_id)
+            logger.debug(f"Mail sent successfully: {server_response}")
+            record_attempt(mailing, Log.SUCCESS, server_response[:150])
+        except smtplib.SMTPException as e:
+            logger.error(f"Mail sending failed: {str(e)}")
+            record_attempt(mailing, Log.FAIL, str(e))
+    return True
+
+
+def plan_buckets(mailing):
+    """
+    Делит очередную отправку рассылки по местному времени на части по часовым поясам клиентов.
+    Возвращает количество созданных частей
+    """
+    buckets = [
+        MailingBucket(mailing=mailing, occurrence=mailing.next_send_time, timezone=timezone_name,
+                      due_time=local_due_time(mailing.next_send_time, timezone_name))
+        for timezone_name in mailing_timezones(mailing)
+    ]
+    MailingBucket.objects.bulk_create(buckets, ignore_conflicts=True)
+    logger.debug(f"Mailing {mailing.id} split into {len(buckets)} time zone buckets")
+    return len(buckets)
+
+
+def send_due_buckets(current_datetime):
+    """
+    Отправляет наступившие части рассылок по местному времени. После последней части отправки
+    время следующей отправки рассылки сдвигается на период. Каждая часть записывается в журнал
+    отдельной попыткой, так что счётчики попыток считают части (часовые пояса), а не отправки
+    """
+    # Части завершённых рассылок и отправок, время которых изменили после разбиения, больше не нужны
+    MailingBucket.objects.filter(
+        Q(mailing__status=Mailing.COMPLETED) | ~Q(occurrence=F('mailing__next_send_time'))
+        | Q(mailing__send_in_local_time=False)
+    ).delete()
+    buckets = (MailingBucket.objects.filter(due_time__lte=current_datetime,
+                                            mailing__status__in=[Mailing.STARTED, Mailing.CREATED])
+               .select_related('mailing__message', 'mailing__segment').order_by('due_time'))
+    for bucket in buckets:
+        mailing = bucket.mailing
+        if mailing.end_date and bucket.due_time >= mailing.end_date:
+            logger.debug(f"Mailing {mailing.id} bucket {bucket.timezone} skipped: after end_date")
+        elif not deliver_mailing(mailing, mailing_recipients(mailing, bucket.timezone)):
+            logger.debug(f"No clients for mailing {mailing.id} in time zone {bucket.timezone}")
+
+        with transaction.atomic():
+            bucket.delete()
+            if not MailingBucket.objects.filter(mailing=mailing, occurrence=bucket.occurrence).exists():
+                # Рассылку могли приостановить или завершить, пока отправлялась часть: статус меняется
+                # только у созданной, а отправка сдвигается в любом случае, чтобы после возобновления
+                # не повторилась целиком
+                Mailing.objects.filter(pk=mailing.pk, next_send_time=bucket.occurrence).update(
+                    status=Case(When(status=Mailing.CREATED, then=Value(Mailing.STARTED)), default=F('status')),
+                    next_send_time=bucket.occurrence + MAILING_PERIODS[mailing.periodicity])
+                logger.debug(f"Mailing {mailing.id} occurrence {bucket.occurrence} finished")
+
 
 def send_mailing():
     """
@@ -19,7 +595,9 @@ def send_mailing():
     logger.debug("send_mailing function called")
     zone = pytz.timezone(settings.TIME_ZONE)
     current_datetime = datetime.now(zone)
-    mailings = Mailing.objects.filter(status__in=[Mailing.STARTED, Mailing.CREATED])
+    planned = MailingBucket.objects.filter(mailing=OuterRef('pk'), occurrence=OuterRef('next_send_time'))
+    mailings = (Mailing.objects.filter(status__in=[Mailing.STARTED, Mailing.CREATED])
+                .select_related('message', 'segment').annotate(is_planned=Exists(planned)))
 
     if not mailings:
         logger.debug("No mailings to process")
@@ -31,56 +609,55 @@ def send_mailing():
         # Если достигли end_date, завершить рассылку
         if mailing.end_date and current_datetime >= mailing.end_date:
             mailing.status = Mailing.COMPLETED
-            mailing.save()
+            mailing.save(update_fields=['status'])
             logger.debug(f"Mailing {mailing.id} completed due to end_date.")
             continue  # Пропустить отправку, если end_date достигнут
 
         # Проверить, нужно ли отправить сообщение в текущий момент времени
         logger.debug(f"Mailing next_send_time: {mailing.next_send_time}")
+        if mailing.send_in_local_time:
+            # Части отправки создаются заранее: восточнее сервиса время отправки наступает раньше
+            if (mailing.next_send_time and not mailing.is_planned
+                    and current_datetime >= mailing.next_send_time - LOCAL_TIME_PLAN_AHEAD
+                    and not plan_buckets(mailing)):
+                # Без получателей частей нет, и без сдвига отправка разбивалась бы заново при каждом запуске
+                logger.info(f"Mailing {mailing.id} occurrence {mailing.next_send_time} skipped: no clients")
+                mailing.next_send_time += MAILING_PERIODS[mailing.periodicity]
+                mailing.save(update_fields=['next_send_time'])
+            continue
+
         if mailing.next_send_time and current_datetime >= mailing.next_send_time:
             mailing.status = Mailing.STARTED
-            clients = mailing.clients.all()
-            logger.debug(f"Clients to send: {[client.email for client in clients]}")
-
-            if not clients:
+            if not deliver_mailing(mailing, mailing_recipients(mailing)):
                 logger.debug(f"No clients for mailing {mailing.id}")
                 continue
 
-            try:
-                logger.debug("Sending mail with following details:")
-                logger.debug(f"Subject: {mailing.message.title}")
-                logger.debug(f"Message: {mailing.message.message}")
-                logger.debug(f"From: {settings.EMAIL_HOST_USER}")
-                logger.debug(f"To: {[client.email for client in clients]}")
-
-                server_response = send_mail(
-                    subject=mailing.message.title,
-                    message=mailing.message.message,
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[client.email for client in clients],
-                    fail_silently=False,
-                )
-                logger.debug(f"Mail sent successfully: {server_response}")
-                Log.objects.create(status=Log.SUCCESS,
-                                   server_response=server_response,
-                                   mailing=mailing)
-            except smtplib.SMTPException as e:
-                logger.error(f"Mail sending failed: {str(e)}")
-                Log.objects.create(status=Log.FAIL,
-                                   server_response=str(e),
-                                   mailing=mailing)
-
             # Обновление времени следующей отправки
-            if mailing.periodicity == Mailing.DAILY:
-                mailing.next_send_time += timedelta(days=1)
-            elif mailing.periodicity == Mailing.WEEKLY:
-                mailing.next_send_time += timedelta(weeks=1)
-            elif mailing.periodicity == Mailing.MONTHLY:
-                mailing.next_send_time += timedelta(days=30)
-
-            mailing.save()
+            mailing.next_send_time += MAILING_PERIODS[mailing.periodicity]
+
+            # Сохраняем только изменённые поля, чтобы не затереть счётчики попыток
+            mailing.save(update_fields=['status', 'next_send_time'])
             logger.debug(f"Mailing {mailing.id} next_send_time updated to {mailing.next_send_time}")
 
+    send_due_buckets(current_datetime)
+
+
+def scheduled_job(job):
+    """
+    Задача планировщика берёт соединения с БД из пула только на время запуска
+    и возвращает их после, чтобы потоки планировщика не держали соединения между запусками.
+    Задачи выбирают и обновляют рассылки, поэтому всегда работают с основной базой
+    """
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            with use_primary():
+                return job(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wrapper
+
 
 def start_scheduler():
     logger.debug("Starting scheduler...")
@@ -88,7 +665,13 @@ def start_scheduler():
     # Проверка, добавлена ли задача уже
     if not scheduler.get_jobs():
         logger.debug("Adding job to scheduler...")
-        scheduler.add_job(send_mailing, 'interval', seconds=30)
+        scheduler.add_job(scheduled_job(send_mailing), 'interval', seconds=30)
+        scheduler.add_job(scheduled_job(flush_views), 'interval', seconds=settings.BLOG_VIEWS_FLUSH_INTERVAL)
+        scheduler.add_job(scheduled_job(process_outbox), 'interval', seconds=settings.EMAIL_OUTBOX_INTERVAL)
+        scheduler.add_job(scheduled_job(purge_expired_tokens), 'interval', seconds=settings.USER_TOKEN_PURGE_INTERVAL)
+        scheduler.add_job(scheduled_job(purge_user_sessions), 'interval', seconds=settings.USER_TOKEN_PURGE_INTERVAL)
+        scheduler.add_job(scheduled_job(refresh_segments), 'interval', seconds=settings.SEGMENT_REFRESH_INTERVAL)
+        scheduler.add_job(log_pool_stats, 'interval', seconds=settings.DB_POOL_STATS_INTERVAL)
 
     if not scheduler.running:
         scheduler.start()
@@ -110,3 +693,49 @@ def get_messages_from_cache():
             messages = Message.objects.all()
             cache.set(key, messages)
             return messages
+
+
+LOG_PERIODS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+LOG_STATS_DEFAULT_PERIOD = timedelta(weeks=1)
+
+
+def filter_logs(queryset, mailing=None, status=None, period=None, date_from=None, date_to=None, owner=None):
+    """
+    Фильтрация журнала попыток рассылок. Условия совпадают с индексами (mailing, time) и (status, time)
+    """
+    if mailing:
+        queryset = queryset.filter(mailing=mailing)
+    if status:
+        queryset = queryset.filter(status=status)
+    if period in LOG_PERIODS:
+        queryset = queryset.filter(time__gte=timezone.now() - LOG_PERIODS[period])
+    if date_from:
+        queryset = queryset.filter(time__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(time__lte=date_to)
+    if owner:
+        queryset = queryset.filter(mailing__owner=owner)
+    return queryset
+
+
+def get_log_stats(queryset, group_by='mailing'):
+    """
+    Агрегированная статистика попыток рассылок по рассылкам или по дням, считается на стороне БД
+    """
+    if group_by == 'day':
+        queryset = queryset.annotate(day=TruncDate('time')).values('day').order_by('-day')
+    else:
+        queryset = queryset.values('mailing', 'mailing__name').order_by('mailing__name')
+    stats = list(queryset.annotate(
+        total=Count('id'),
+        success=Count('id', filter=Q(status=Log.SUCCESS)),
+        fail=Count('id', filter=Q(status=Log.FAIL)),
+        last_time=Max('time'),
+    ))
+    for row in stats:
+        row['success_rate'] = round(row['success'] * 100 / row['total'], 1) if row['total'] else 0
+    return stats
@@ -0,0 +1,178 @@
+import hashlib
+import math
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from mailing.fields import normalize_email
+from mailing.models import Suppression
+
+SUPPRESSIONS_VERSION_KEY = 'suppressions:version'
+UNSUBSCRIBE_SALT = 'mailing.unsubscribe'
+
+
+class BloomFilter:
+    """
+    Фильтр Блума по адресам почты: «нет» - адреса точно нет в списке, «да» - адрес, скорее всего,
+    есть и это нужно подтвердить запросом к БД. Доля ложных «да» не превышает error_rate,
+    пока в фильтре не больше capacity адресов
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Двойное хэширование: k позиций из двух 64-битных половин одного хэша
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        # Повторно добавленный адрес не меняет ни одного бита и не занимает ёмкость (как и редкий
+        # новый, уже совпавший с фильтром, - счётчик немного занижен, но в пределах error_rate)
+        added = False
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        self.count += added
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def is_full(self):
+        return self.count > self.capacity
+
+
+_lock = threading.Lock()
+# (версия, фильтр, время сборки, с какого created_at дочитывать записи)
+_state = (None, None, None, None)
+
+
+def _get_version():
+    version = cache.get(SUPPRESSIONS_VERSION_KEY)
+    if version is None:
+        cache.add(SUPPRESSIONS_VERSION_KEY, 0, timeout=None)
+        version = 0
+    return version
+
+
+def _load(bloom, since=None):
+    """
+    Добавляет в фильтр записи, созданные не раньше since (все, если since не задан). Возвращает, с какого
+    момента читать в следующий раз: время начала чтения минус окно перекрытия. created_at ставится
+    до фиксации транзакции, поэтому запись может стать видна позже, чем прочитаны более новые;
+    окно перекрытия дочитывает такие записи, повторное добавление адреса фильтр не меняет
+    """
+    started = timezone.now()
+    rows = Suppression.objects.all()
+    if since is not None:
+        rows = rows.filter(created_at__gte=since)
+    for email in rows.values_list('email', flat=True).iterator(chunk_size=10000):
+        bloom.add(email)
+    return started - timedelta(seconds=settings.SUPPRESSION_BLOOM_OVERLAP)
+
+
+def get_suppression_filter():
+    """
+    Фильтр Блума по всем исключённым адресам. Собирается один раз на процесс, затем при каждом
+    обращении дочитывает только записи, созданные с прошлого чтения (с окном перекрытия, см. _load).
+    Заново фильтр собирается при удалении записей (меняется версия в кэше), при переполнении -
+    с удвоенной ёмкостью, и раз в SUPPRESSION_BLOOM_REBUILD_INTERVAL секунд: так в фильтр попадают
+    и записи транзакций, зафиксированных позже окна перекрытия
+    """
+    global _state
+    version = _get_version()
+    with _lock:
+        state_version, bloom, built_at, since = _state
+        now = timezone.now()
+        if (bloom is None or state_version != version or bloom.is_full
+                or now - built_at > timedelta(seconds=settings.SUPPRESSION_BLOOM_REBUILD_INTERVAL)):
+            capacity = settings.SUPPRESSION_BLOOM_CAPACITY
+            if bloom is not None:
+                capacity = max(capacity, bloom.capacity * (2 if bloom.is_full else 1))
+            capacity = max(capacity, 2 * Suppression.objects.count())
+            bloom = BloomFilter(capacity, settings.SUPPRESSION_BLOOM_ERROR_RATE)
+            built_at, since = now, None
+        since = _load(bloom, since)
+        _state = (version, bloom, built_at, since)
+    return bloom
+
+
+def filter_suppressed(emails, owner_id, bloom=None):
+    """
+    Убирает из списка адреса, исключённые для владельца или для всех. Адреса проверяются в фильтре Блума
+    в памяти, а БД спрашивается одним запросом только о тех, что фильтр пропустил
+    """
+    if bloom is None:
+        bloom = get_suppression_filter()
+    candidates = [email for email in emails if email in bloom]
+    if not candidates:
+        return emails
+    suppressed = set(Suppression.objects.filter(Q(owner__isnull=True) | Q(owner_id=owner_id), email__in=candidates)
+                     .values_list('email', flat=True))
+    if not suppressed:
+        return emails
+    return [email for email in emails if email not in suppressed]
+
+
+def suppress(email, reason, owner=None, details=''):
+    """
+    Исключает адрес из рассылок владельца (или всех владельцев). Повторное исключение ничего не меняет
+    """
+    suppression, _ = Suppression.objects.get_or_create(
+        email=normalize_email(email), owner=owner, defaults={'reason': reason, 'details': details[:150]})
+    return suppression
+
+
+def suppress_many(entries, reason, owner=None):
+    """
+    Исключает несколько адресов одним INSERT ... ON CONFLICT DO NOTHING. entries - {адрес: подробности}
+    """
+    Suppression.objects.bulk_create(
+        [Suppression(email=normalize_email(email), owner=owner, reason=reason, details=details[:150])
+         for email, details in entries.items()],
+        ignore_conflicts=True,
+    )
+
+
+def make_unsubscribe_token(email, owner_id):
+    return signing.dumps([email, owner_id], salt=UNSUBSCRIBE_SALT, compress=True)
+
+
+def read_unsubscribe_token(token):
+    """
+    (адрес, id владельца) из ссылки отписки или None, если подпись неверна
+    """
+    try:
+        email, owner_id = signing.loads(token, salt=UNSUBSCRIBE_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    return email, owner_id
+
+
+def invalidate_suppressions():
+    cache.add(SUPPRESSIONS_VERSION_KEY, 0, timeout=None)
+    cache.incr(SUPPRESSIONS_VERSION_KEY)
+
+
+@receiver(post_delete, sender=Suppression)
+def suppression_deleted(sender, **kwargs):
+    # Из фильтра Блума нельзя удалить адрес; устаревшее «да» отсеялось бы запросом к БД,
+    # но фильтр пересобирается, чтобы такие адреса не копились
+    invalidate_suppressions()
@@ -1,3 +1,980 @@
-from django.test import TestCase
+import email
+import email.policy
+import os
+import shutil
+import smtplib
+import socketserver
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.auth.models import AnonymousUser, Group, Permission
+from django.contrib.sessions.backends.base import SessionBase
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.views.generic import ListView
+
+from config.pagination import KeysetPaginationMixin
+from config.search import SearchMixin, search_queryset
+from config.testing import QueryBudgetMixin, get_keyset_page, walk_keyset_pages
+from mailing import content_filter, services, suppression
+from mailing.access import MANAGER_GROUP
+from mailing.attachments import encode_part
+from mailing.content_filter import ContentFilter, Hit, check_message, find_forbidden_words
+from mailing.dataset import CLIENT_COLUMNS, DatasetGenerator, copy_rows, reserve_ids
+from mailing.forms import ClientForm, MailingBulkForm
+from mailing.models import (Attachment, Client, ForbiddenWord, Message, Mailing, MailingBucket, Log, Segment, SegmentMember,
+                            Suppression)
+from mailing.services import (clone_mailings, deliver_mailing, local_due_time, merge_duplicate_clients,
+                              normalize_client_emails, pause_mailings, plan_buckets, rebuild_mailing_stats,
+                              record_attempt, refresh_segment, refresh_segments, resolve_segment, segment_clients,
+                              send_mailing, send_to_recipients)
+from mailing.suppression import (BloomFilter, filter_suppressed, get_suppression_filter, make_unsubscribe_token,
+                                 read_unsubscribe_token, suppress)
+from mailing.views import AsyncClientListView
+from users.models import User
+
+
+class MailingQueryBudgetTest(QueryBudgetMixin, TestCase):
+    namespace = 'mailing'
+    # Поиск владельцев доступен только тем, кто видит все рассылки, и проверяется отдельно
+    skip_urls = ('add_clients', 'bulk_mailings', 'lookup_owners')
+    query_budgets = {
+        'index': 9,
+        'create': 4,
+        'clients_list': 9,
+        'view': 5,
+        'edit': 5,
+        'delete': 5,
+        'messages_list': 5,
+        'create_message': 4,
+        'view_message': 6,
+        'edit_message': 5,
+        'delete_message': 5,
+        'mailings_list': 5,
+        'create_mailing': 5,
+        'view_mailing': 7,
+        'edit_mailing': 9,
+        'delete_mailing': 5,
+        'logs_list': 8,
+        'lookup_clients': 3,
+        'lookup_messages': 3,
+        'lookup_mailings': 3,
+        'segments_list': 5,
+        'create_segment': 4,
+        'view_segment': 7,
+        'edit_segment': 5,
+        'delete_segment': 5,
+        'unsubscribe': 4,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(email='owner@test.ru')
+        self.user.user_permissions.add(Permission.objects.get(codename='change_mailing'))
+
+    def create_data(self, size):
+        for i in range(size):
+            client = Client.objects.create(name=f'Клиент {i}', email=f'client{size}.{i}@test.ru', owner=self.user)
+            message = Message.objects.create(title=f'Тема {i}', message='Текст', owner=self.user)
+            mailing = Mailing.objects.create(name=f'Рассылка {i}', message=message, owner=self.user)
+            mailing.clients.add(client)
+            Log.objects.create(status=Log.SUCCESS, mailing=mailing)
+        self.client_obj = Client.objects.filter(owner=self.user).first()
+        self.message = Message.objects.filter(owner=self.user).first()
+        self.mailing = Mailing.objects.filter(owner=self.user).first()
+        self.mailing.clients.add(*Client.objects.filter(owner=self.user))
+        Segment.objects.create(name=f'Сегмент {size}', email_contains='@test.ru', owner=self.user)
+        self.segment = Segment.objects.filter(owner=self.user).first()
+
+    def get_url_args(self, url_name):
+        if url_name in ('view', 'edit', 'delete'):
+            return [self.client_obj.pk]
+        if url_name in ('view_message', 'edit_message', 'delete_message'):
+            return [self.message.pk]
+        if url_name in ('view_mailing', 'edit_mailing', 'delete_mailing'):
+            return [self.mailing.pk]
+        if url_name in ('view_segment', 'edit_segment', 'delete_segment'):
+            return [self.segment.pk]
+        if url_name == 'unsubscribe':
+            return [make_unsubscribe_token(self.client_obj.email, self.user.pk)]
+        return []
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'Реплика не настроена (REPLICA_HOST или REPLICA_NAME)')
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Маршрутизация чтений в реплику. В тестах реплика - зеркало тестовой основной базы
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create(email='owner@test.ru')
+        self.client.force_login(self.user)
+        self.replica = connections[settings.DATABASE_REPLICAS[0]]
+
+    def test_list_reads_from_replica(self):
+        with CaptureQueriesContext(self.replica) as queries:
+            response = self.client.get(reverse('mailing:clients_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
+
+    def test_write_pins_to_primary(self):
+        response = self.client.post(reverse('mailing:create'), {'name': 'Клиент', 'email': 'client@test.ru'})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        with CaptureQueriesContext(self.replica) as queries:
+            self.client.get(reverse('mailing:clients_list'))
+        self.assertFalse(queries.captured_queries)
+
+    def test_form_pages_read_from_primary(self):
+        with CaptureQueriesContext(self.replica) as queries:
+            self.client.get(reverse('mailing:create'))
+        self.assertFalse(queries.captured_queries)
+
+
+class SuppressionTest(TestCase):
+
+    def setUp(self):
+        # Фильтр Блума живёт в памяти процесса, каждый тест собирает его заново
+        suppression._state = (None, None, None, None)
+        self.owner = User.objects.create(email='owner@test.ru')
+        self.other_owner = User.objects.create(email='other@test.ru')
+        self.message = Message.objects.create(title='Тема', message='Текст', owner=self.owner)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(10000, 0.01)
+        added = [f'client{i}@test.ru' for i in range(10000)]
+        for email in added:
+            bloom.add(email)
+        self.assertTrue(all(email in bloom for email in added))
+        false_positives = sum(f'missing{i}@test.ru' in bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+        # Повторное добавление не занимает ёмкость
+        count = bloom.count
+        bloom.add(added[0])
+        self.assertEqual(bloom.count, count)
+
+    def test_filter_scope(self):
+        suppress('Global@Test.ru ', Suppression.BOUNCE)
+        suppress('own@test.ru', Suppression.UNSUBSCRIBE, owner=self.owner)
+        suppress('foreign@test.ru', Suppression.UNSUBSCRIBE, owner=self.other_owner)
+        emails = ['global@test.ru', 'own@test.ru', 'foreign@test.ru', 'free@test.ru']
+        self.assertEqual(filter_suppressed(emails, self.owner.pk), ['foreign@test.ru', 'free@test.ru'])
+        self.assertEqual(filter_suppressed(emails, None), ['own@test.ru', 'foreign@test.ru', 'free@test.ru'])
+
+    def test_bloom_hits_are_confirmed(self):
+        bloom = BloomFilter(100, 0.01)
+        bloom.add('free@test.ru')
+        with self.assertNumQueries(1):
+            self.assertEqual(filter_suppressed(['free@test.ru'], self.owner.pk, bloom), ['free@test.ru'])
+        with self.assertNumQueries(0):
+            self.assertEqual(filter_suppressed(['other@test.ru'], self.owner.pk, bloom), ['other@test.ru'])
+
+    def test_late_commits_are_loaded(self):
+        get_suppression_filter()
+        # Запись транзакции, зафиксированной позже, чем фильтр прочитал более новые записи
+        late = suppress('late@test.ru', Suppression.MANUAL)
+        Suppression.objects.filter(pk=late.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertIn('late@test.ru', get_suppression_filter())
+
+        older = suppress('older@test.ru', Suppression.MANUAL)
+        Suppression.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(days=1))
+        with override_settings(SUPPRESSION_BLOOM_REBUILD_INTERVAL=0):
+            self.assertIn('older@test.ru', get_suppression_filter())
+
+    def test_deleted_suppression_rebuilds_filter(self):
+        suppress('client@test.ru', Suppression.MANUAL)
+        self.assertEqual(filter_suppressed(['client@test.ru'], None), [])
+        Suppression.objects.all().delete()
+        self.assertNotIn('client@test.ru', get_suppression_filter())
+
+    def test_unsubscribe_token(self):
+        token = make_unsubscribe_token('client@test.ru', self.owner.pk)
+        self.assertEqual(read_unsubscribe_token(token), ('client@test.ru', self.owner.pk))
+        self.assertIsNone(read_unsubscribe_token(token[:-2] + 'xx'))
+        self.assertIsNone(read_unsubscribe_token('client@test.ru'))
+
+    def test_unsubscribe_view(self):
+        url = reverse('mailing:unsubscribe', args=[make_unsubscribe_token('client@test.ru', self.owner.pk)])
+        self.client.get(url)
+        self.assertFalse(Suppression.objects.exists())
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(Suppression.objects.get().owner, self.owner)
+
+    def test_unsubscribe_deleted_owner(self):
+        url = reverse('mailing:unsubscribe', args=[make_unsubscribe_token('client@test.ru', self.other_owner.pk)])
+        self.other_owner.delete()
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertFalse(Suppression.objects.exists())
+
+    def test_bounces(self):
+        send_messages = EmailBackend.send_messages
+
+        def refuse(backend, messages):
+            recipient = messages[0].to[0]
+            if recipient == 'bounce@test.ru':
+                raise smtplib.SMTPRecipientsRefused({recipient: (550, b'no such user')})
+            if recipient == 'later@test.ru':
+                raise smtplib.SMTPRecipientsRefused({recipient: (450, b'try again later')})
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', refuse), self.assertLogs('mailing.services', 'WARNING'):
+            response = send_to_recipients(self.message, [['ok@test.ru', 'bounce@test.ru', 'later@test.ru']],
+                                          self.owner.pk)
+        self.assertEqual(response, 'Отправлено писем: 1, временные ошибки (4xx): 1, отвергнуто (5xx): 1')
+        self.assertEqual([email.to for email in mail.outbox], [['ok@test.ru']])
+        bounce = Suppression.objects.get()
+        self.assertEqual((bounce.email, bounce.owner, bounce.reason, bounce.details),
+                         ('bounce@test.ru', None, Suppression.BOUNCE, '550 no such user'))
+
+
+@override_settings(MAILING_SEND_BATCH_SIZE=3)
+class InterruptedSendTest(TestCase):
+
+    def setUp(self):
+        suppression._state = (None, None, None, None)
+        content_filter._compiled = (None, None)
+        self.owner = User.objects.create(email='owner@test.ru')
+        self.message = Message.objects.create(title='Тема', message='Текст', owner=self.owner)
+        self.mailing = Mailing.objects.create(name='Рассылка', message=self.message, owner=self.owner)
+        self.recipients = ['first@test.ru', 'drop@test.ru', 'second@test.ru', 'third@test.ru', 'fourth@test.ru']
+
+    def patch_send(self, error, fail_on='drop@test.ru'):
+        send_messages = EmailBackend.send_messages
+
+        def send(backend, messages):
+            if messages[0].to[0] == fail_on:
+                raise error
+            return send_messages(backend, messages)
+
+        return mock.patch.object(EmailBackend, 'send_messages', send)
+
+    def test_partial_delivery_is_success(self):
+        with self.patch_send(smtplib.SMTPServerDisconnected('Connection unexpectedly closed')), \
+                self.assertLogs('mailing.services', 'WARNING'):
+            deliver_mailing(self.mailing, self.recipients)
+        # Остаток прерванной пачки не отправлен, следующая пачка ушла через новое соединение
+        self.assertEqual([email.to[0] for email in mail.outbox], ['first@test.ru', 'third@test.ru', 'fourth@test.ru'])
+        log = Log.objects.get()
+        self.assertEqual(log.status, Log.SUCCESS)
+        self.assertEqual(log.server_response, 'Отправлено писем: 3, не отправлено из-за ошибки сервера: 2 '
+                                              '(Connection unexpectedly closed)')
+        self.mailing.refresh_from_db()
+        self.assertEqual((self.mailing.success_count, self.mailing.fail_count), (1, 0))
+
+    def test_failed_reconnect_counts_rest(self):
+        with self.patch_send(smtplib.SMTPSenderRefused(553, b'sender rejected', 'owner@test.ru')), \
+                mock.patch.object(EmailBackend, 'open', side_effect=[None, ConnectionRefusedError('refused')]), \
+                self.assertLogs('mailing.services', 'WARNING'):
+            response = send_to_recipients(self.message, [self.recipients[:3], self.recipients[3:]], self.owner.pk)
+        self.assertEqual(response, 'Отправлено писем: 1, не отправлено из-за ошибки сервера: 4 (refused)')
+
+    def test_nothing_sent_is_fail(self):
+        with self.patch_send(smtplib.SMTPServerDisconnected('Connection unexpectedly closed'), 'first@test.ru'), \
+                self.assertLogs('mailing.services', 'WARNING'):
+            deliver_mailing(self.mailing, self.recipients[:1])
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual((Log.objects.get().status, Log.objects.get().server_response),
+                         (Log.FAIL, 'Connection unexpectedly closed'))
+
+
+class MailingStatsTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        self.owner.user_permissions.add(Permission.objects.get(codename='change_mailing'))
+        message = Message.objects.create(title='Тема', message='Текст', owner=self.owner)
+        self.client_obj = Client.objects.create(name='Клиент', email='client@test.ru', owner=self.owner)
+        self.mailing = Mailing.objects.create(name='Рассылка', message=message, owner=self.owner)
+        self.mailing.clients.add(self.client_obj)
+
+    def counters(self):
+        return Mailing.objects.values_list(*Mailing.COUNTER_FIELDS).get(pk=self.mailing.pk)
+
+    def test_record_attempt_matches_rebuild(self):
+        for status in (Log.SUCCESS, Log.FAIL, Log.SUCCESS):
+            record_attempt(self.mailing, status, 'ответ')
+        recorded = self.counters()
+        self.assertEqual(recorded[:3], (3, 2, 1))
+        Mailing.objects.filter(pk=self.mailing.pk).update(total_attempts=0, success_count=0, fail_count=0,
+                                                          last_attempt_time=None, last_status=None)
+        rebuild_mailing_stats()
+        self.assertEqual(self.counters(), recorded)
+
+    def test_edit_keeps_counters(self):
+        record_attempt(self.mailing, Log.SUCCESS, 'ответ')
+        counters = self.counters()
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse('mailing:edit_mailing', args=[self.mailing.pk]), {
+            'name': 'Новое название', 'status': Mailing.CREATED, 'periodicity': Mailing.DAILY,
+            'clients': [self.client_obj.pk], 'message': self.mailing.message_id,
+        })
+        self.assertRedirects(response, reverse('mailing:mailings_list'), fetch_redirect_response=False)
+        self.assertEqual(Mailing.objects.get(pk=self.mailing.pk).name, 'Новое название')
+        self.assertEqual(self.counters(), counters)
+
+
+class MailingAddClientsTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        Client.objects.create(name='Свой', email='own@test.ru', owner=self.owner)
+        Client.objects.create(name='Без владельца', email='orphan@test.ru')
+
+    def test_adds_owner_clients(self):
+        mailing = Mailing.objects.create(name='Рассылка', owner=self.owner)
+        self.client.force_login(self.owner)
+        self.client.post(reverse('mailing:add_clients', args=[mailing.pk]), {'q': ''})
+        self.assertEqual(list(mailing.clients.values_list('email', flat=True)), ['own@test.ru'])
+
+    def test_ownerless_mailing(self):
+        mailing = Mailing.objects.create(name='Рассылка')
+        self.client.force_login(User.objects.create(email='admin@test.ru', is_superuser=True))
+        self.client.post(reverse('mailing:add_clients', args=[mailing.pk]), {'q': ''})
+        self.assertFalse(mailing.clients.exists())
+
+
+class LogFilterTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        User.objects.create(email='idle@test.ru')
+        self.admin = User.objects.create(email='admin@test.ru', is_superuser=True)
+        self.mailing = Mailing.objects.create(name='Рассылка', owner=self.owner)
+        Log.objects.create(status=Log.SUCCESS, mailing=self.mailing)
+
+    def test_invalid_filter_shows_errors(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('mailing:logs_list'), {'date_from': 'вчера'})
+        self.assertFalse(response.context['object_list'])
+        self.assertTrue(response.context['filter_form'].errors['date_from'])
+        self.assertContains(response, 'text-danger')
+
+    def test_owner_lookup(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('mailing:lookup_owners'), {'q': 'o'})
+        self.assertEqual(response.json()['results'], [{'id': self.owner.pk, 'text': 'owner@test.ru'}])
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse('mailing:lookup_owners')).status_code, 403)
+
+    def test_lookup_owner_filter(self):
+        self.client.force_login(self.admin)
+        url = reverse('mailing:lookup_mailings')
+        results = self.client.get(url, {'owner': self.owner.pk}).json()['results']
+        self.assertEqual([item['id'] for item in results], [self.mailing.pk])
+        for owner in ('abc', '-1', '1.5'):
+            response = self.client.get(url, {'owner': owner})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], [])
+
+    def test_mailing_lookup_is_scoped(self):
+        Mailing.objects.create(name='Рассылка другого', owner=User.objects.create(email='other@test.ru'))
+        self.client.force_login(self.owner)
+        results = self.client.get(reverse('mailing:lookup_mailings'), {'q': 'Рас'}).json()['results']
+        self.assertEqual([item['id'] for item in results], [self.mailing.pk])
+
+
+@override_settings(TIME_ZONE='Europe/Moscow')
+class LocalTimeMailingTest(TestCase):
+
+    def setUp(self):
+        suppression._state = (None, None, None, None)
+        self.owner = User.objects.create(email='owner@test.ru')
+        message = Message.objects.create(title='Тема', message='Текст', owner=self.owner)
+        self.start = datetime(2026, 10, 20, 9, tzinfo=ZoneInfo('Europe/Moscow'))
+        self.mailing = Mailing.objects.create(name='Рассылка', message=message, owner=self.owner,
+                                              start_date=self.start, send_in_local_time=True)
+
+    def add_clients(self, *timezones):
+        for i, timezone_name in enumerate(timezones):
+            self.mailing.clients.add(Client.objects.create(name='Клиент', email=f'client{i}@test.ru',
+                                                           timezone=timezone_name, owner=self.owner))
+
+    def run_at(self, moment):
+        with mock.patch.object(services, 'datetime', wraps=datetime) as patched:
+            patched.now.side_effect = lambda tz=None: moment
+            send_mailing()
+
+    def test_due_time(self):
+        self.assertEqual(local_due_time(self.start, 'Asia/Vladivostok'),
+                         datetime(2026, 10, 20, 9, tzinfo=ZoneInfo('Asia/Vladivostok')))
+        self.assertEqual(local_due_time(self.start, ''), self.start)
+        self.assertEqual(local_due_time(self.start, 'Нет/Такого'), self.start)
+
+    def test_buckets_per_timezone(self):
+        self.add_clients('', 'Asia/Vladivostok', 'Europe/London', 'Asia/Vladivostok')
+        self.assertEqual(plan_buckets(self.mailing), 3)
+        self.assertEqual(plan_buckets(self.mailing), 3)
+        self.assertEqual(MailingBucket.objects.count(), 3)
+
+    def test_occurrence_is_sent_in_parts(self):
+        self.add_clients('', 'Asia/Vladivostok', 'Europe/London', 'Asia/Vladivostok')
+        self.run_at(self.start - timedelta(hours=30))
+        self.assertFalse(MailingBucket.objects.exists())
+        self.run_at(self.start - timedelta(hours=20))
+        self.assertEqual(MailingBucket.objects.count(), 3)
+        self.assertFalse(mail.outbox)
+
+        # 9:00 во Владивостоке - 2:00 по Москве
+        self.run_at(self.start - timedelta(hours=6))
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ['client1@test.ru', 'client3@test.ru'])
+        self.run_at(self.start)
+        self.assertEqual(len(mail.outbox), 3)
+        self.mailing.refresh_from_db()
+        self.assertEqual(self.mailing.next_send_time, self.start)
+
+        # 9:00 в Лондоне - 11:00 по Москве, последняя часть сдвигает отправку на период
+        self.run_at(self.start + timedelta(hours=2))
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertFalse(MailingBucket.objects.exists())
+        self.mailing.refresh_from_db()
+        self.assertEqual((self.mailing.next_send_time, self.mailing.status),
+                         (self.start + timedelta(days=1), Mailing.STARTED))
+        self.assertEqual(self.mailing.total_attempts, 3)
+
+    def test_pause_during_last_part(self):
+        self.add_clients('', 'Asia/Vladivostok')
+        self.run_at(self.start - timedelta(hours=20))
+        self.run_at(self.start - timedelta(hours=6))
+        deliver = services.deliver_mailing
+
+        def deliver_and_pause(mailing, recipients):
+            # Рассылку приостановили, пока отправлялась последняя часть
+            pause_mailings(Mailing.objects.filter(pk=mailing.pk))
+            return deliver(mailing, recipients)
+
+        with mock.patch.object(services, 'deliver_mailing', side_effect=deliver_and_pause):
+            self.run_at(self.start)
+        self.mailing.refresh_from_db()
+        self.assertEqual((self.mailing.status, self.mailing.next_send_time),
+                         (Mailing.PAUSED, self.start + timedelta(days=1)))
+        # Каждая часть - отдельная попытка
+        self.assertEqual(self.mailing.total_attempts, 2)
+
+    def test_empty_audience_advances_occurrence(self):
+        with self.assertLogs('mailing.services', 'INFO'):
+            self.run_at(self.start - timedelta(hours=20))
+        self.mailing.refresh_from_db()
+        self.assertEqual(self.mailing.next_send_time, self.start + timedelta(days=1))
+        self.assertFalse(MailingBucket.objects.exists())
+
+
+class MailingBulkTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        self.other = User.objects.create(email='other@test.ru')
+        self.message = Message.objects.create(title='Тема', message='Текст', owner=self.owner)
+        self.own = Mailing.objects.create(name='Своя', message=self.message, owner=self.owner,
+                                          status=Mailing.STARTED)
+        self.foreign = Mailing.objects.create(name='Чужая', owner=self.other, status=Mailing.STARTED)
+
+    def post(self, user, **data):
+        self.client.force_login(user)
+        return self.client.post(reverse('mailing:bulk_mailings'), data)
+
+    def statuses(self):
+        return dict(Mailing.objects.values_list('name', 'status'))
+
+    def test_owner_scope(self):
+        self.post(self.owner, action='pause', scope='all')
+        self.post(self.owner, action='complete', ids=[self.foreign.pk])
+        self.assertEqual(self.statuses(), {'Своя': Mailing.PAUSED, 'Чужая': Mailing.STARTED})
+
+    def test_manager_changes_status_but_does_not_clone(self):
+        manager = User.objects.create(email='manager@test.ru')
+        manager.groups.add(Group.objects.get_or_create(name=MANAGER_GROUP)[0])
+        manager.user_permissions.add(Permission.objects.get(codename='deactivate_mailing'))
+        self.post(manager, action='pause', scope='all')
+        self.assertEqual(set(self.statuses().values()), {Mailing.PAUSED})
+        self.post(manager, action='clone', scope='all')
+        self.assertEqual(Mailing.objects.count(), 2)
+
+    def test_resume_keeps_unsent_mailings_created(self):
+        created = Mailing.objects.create(name='Новая', owner=self.owner)
+        record_attempt(self.own, Log.SUCCESS, 'ответ')
+        self.post(self.owner, action='pause', scope='all')
+        self.post(self.owner, action='resume', scope='all')
+        self.assertEqual(Mailing.objects.get(pk=created.pk).status, Mailing.CREATED)
+        self.assertEqual(Mailing.objects.get(pk=self.own.pk).status, Mailing.STARTED)
+
+    def test_reschedule_rejects_time_and_shift(self):
+        form = MailingBulkForm({'action': 'reschedule', 'scope': 'all', 'next_send_time': '2026-10-20T09:00',
+                                'shift_hours': 2})
+        self.assertFalse(form.is_valid())
+
+    def test_clone(self):
+        client = Client.objects.create(name='Клиент', email='client@test.ru', owner=self.owner)
+        self.own.clients.add(client)
+        self.own.segment = Segment.objects.create(name='Сегмент', owner=self.owner)
+        self.own.save(update_fields=['segment'])
+        record_attempt(self.own, Log.SUCCESS, 'ответ')
+
+        self.assertEqual(clone_mailings(Mailing.objects.filter(pk=self.own.pk)), (1, 1))
+        copy = Mailing.objects.get(name='Своя (копия)')
+        self.assertEqual((copy.status, copy.total_attempts, copy.last_status, copy.owner, copy.segment),
+                         (Mailing.CREATED, 0, None, self.owner, self.own.segment))
+        self.assertEqual(list(copy.clients.all()), [client])
+
+        clone_mailings(Mailing.objects.filter(pk=self.own.pk), owner=self.other)
+        foreign_copy = Mailing.objects.get(name='Своя (копия)', owner=self.other)
+        self.assertIsNone(foreign_copy.segment)
+
+
+class ClientPages(KeysetPaginationMixin, ListView):
+    model = Client
+    keyset_ordering = ('name', 'pk')
+    paginate_by = 2
+
+
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        owner = User.objects.create(email='owner@test.ru')
+        # Одинаковые имена: порядок внутри них задаёт pk
+        for i, name in enumerate(['Б', 'А', 'Б', 'В', 'Б', 'А', 'Б']):
+            Client.objects.create(name=name, email=f'client{i}@test.ru', owner=owner)
+        self.expected = list(Client.objects.order_by('name', 'pk').values_list('pk', flat=True))
+
+    def test_pages_follow_ordering_with_ties(self):
+        forward, backward = walk_keyset_pages(ClientPages)
+        self.assertEqual([pk for page in forward for pk in page], self.expected)
+        self.assertEqual(backward, forward)
+        self.assertEqual([len(page) for page in forward], [2, 2, 2, 1])
+
+    def test_cursor_round_trip(self):
+        view = ClientPages()
+        fields = view._keyset_fields(Client.objects.all())
+        cursor = view._encode_cursor('n', ['Б', 5])
+        self.assertNotIn('=', cursor)
+        self.assertEqual(view._decode_cursor(cursor, fields), ('n', ['Б', 5]))
+
+    def test_tampered_cursor(self):
+        view = ClientPages()
+        valid = view._encode_cursor('n', ['Б', 5])
+        for cursor in ('!!!', valid[:-3], view._encode_cursor('x', ['Б', 5]), view._encode_cursor('n', ['Б']),
+                       view._encode_cursor('n', ['Б', 'не число'])):
+            with self.subTest(cursor=cursor), self.assertRaises(Http404):
+                get_keyset_page(ClientPages, cursor)
+
+
+class ClientSearchPages(SearchMixin, KeysetPaginationMixin, ListView):
+    model = Client
+    search_trigram_fields = ('email',)
+    paginate_by = 2
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        # Слова латиницей: разбор и регистр кириллицы зависят от локали БД, а латиницу конфигурация
+        # russian стеммит английским словарём при любой локали.
+        # Совпадение в имени весит больше, чем в комментарии; у совпадений в комментарии ранг одинаковый
+        self.by_name = Client.objects.create(name='Shoes', email='shop@example.ru', owner=self.owner)
+        self.by_comment = [Client.objects.create(name=f'Клиент {i}', email=f'client{i}@test.ru', comment='Bought shoes',
+                                                 owner=self.owner) for i in range(5)]
+        self.other = Client.objects.create(name='Пётр', email='petr@mail.ru', comment='Books', owner=self.owner)
+
+    def search(self, query, queryset=None):
+        return list(search_queryset(queryset or Client.objects.all(), query, ('email',))
+                    .order_by('-rank', 'pk').values_list('pk', flat=True))
+
+    def test_pages_with_equal_rank(self):
+        forward, backward = walk_keyset_pages(ClientSearchPages, {'q': 'shoe'})
+        expected = [self.by_name.pk] + [client.pk for client in self.by_comment]
+        self.assertEqual([pk for page in forward for pk in page], expected)
+        self.assertEqual(backward, forward)
+        self.assertEqual([len(page) for page in forward], [2, 2, 2])
+
+    def test_triggers_keep_vector_current(self):
+        self.assertEqual(self.search('book'), [self.other.pk])
+        Client.objects.filter(pk=self.other.pk).update(comment='Magazines')
+        self.assertEqual(self.search('book'), [])
+        self.assertEqual(self.search('magazine'), [self.other.pk])
+        Client.objects.bulk_create([Client(name='Анна', email='anna@test.ru', comment='Magazine', owner=self.owner)])
+        self.assertEqual(len(self.search('magazine')), 2)
+        # Адрес ищется целиком и по частям
+        self.assertEqual(self.search('petr@mail.ru'), [self.other.pk])
+        self.assertEqual(self.search('example'), [self.by_name.pk])
+
+    def test_trigram_fallback(self):
+        self.assertEqual(self.search('xampl'), [self.by_name.pk])
+        self.assertEqual(self.search('XAMPL'), [self.by_name.pk])
+        # Короткий фрагмент по триграммам не ищется
+        self.assertEqual(self.search('xa'), [])
+        self.assertFalse(search_queryset(Client.objects.all(), '  ').exists())
+
+    def test_admin_search(self):
+        model_admin = admin.site._registry[Client]
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            RequestFactory().get('/', {'q': 'shoes'}), Client.objects.all(), 'shoes')
+        self.assertFalse(may_have_duplicates)
+        self.assertEqual(list(queryset.values_list('pk', flat=True)),
+                         [self.by_name.pk] + [client.pk for client in self.by_comment])
+        # Выбранная пользователем сортировка не заменяется релевантностью
+        queryset, _ = model_admin.get_search_results(
+            RequestFactory().get('/', {'q': 'shoes', ORDER_VAR: '1'}), Client.objects.order_by('-pk'), 'shoes')
+        self.assertEqual(queryset.first(), self.by_comment[-1])
+        queryset, _ = model_admin.get_search_results(RequestFactory().get('/'), Client.objects.all(), ' ')
+        self.assertEqual(queryset.count(), 7)
+
+
+class AsyncViewsTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        for i in range(25):
+            Client.objects.create(name=f'Клиент {i % 4}', email=f'client{i}@test.ru', owner=self.owner)
+        Client.objects.create(name='Чужой', email='other@test.ru', owner=User.objects.create(email='other@test.ru'))
+        self.expected = list(Client.objects.filter(owner=self.owner).order_by('name', 'pk').values_list('pk', flat=True))
+
+    def make_request(self, user, params=None):
+        async def auser():
+            return user
+
+        request = AsyncRequestFactory().get('/clients_list/', params or {})
+        request.session = SessionBase()
+        request.auser = auser
+        return request
+
+    async def test_list_pages(self):
+        view = AsyncClientListView.as_view()
+        pages, params = [], {}
+        while True:
+            response = await view(self.make_request(self.owner, params))
+            page = response.context_data['page_obj']
+            pages.append([client.pk for client in page])
+            if not page.has_next():
+                break
+            params = {'cursor': page.next_cursor}
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+
+        response = await view(self.make_request(self.owner, {'cursor': page.previous_cursor}))
+        self.assertEqual([client.pk for client in response.context_data['object_list']], pages[0])
+
+    async def test_anonymous_is_redirected(self):
+        response = await AsyncClientListView.as_view()(self.make_request(AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+
+
+class DatasetGeneratorTest(TestCase):
+
+    def generate(self, seed=3):
+        generator = DatasetGenerator(seed=seed, clients_per_user=5, messages_per_user=2, mailings_per_user=3,
+                                     clients_per_mailing=2, logs_per_mailing=2)
+        # Пачка меньше строк одного пользователя: каждый пользователь пишется своей пачкой
+        return generator.generate(2, batch_size=10)
+
+    def content(self, users):
+        clients = Client.objects.filter(owner__in=users).order_by('pk')
+        mailings = Mailing.objects.filter(owner__in=users).order_by('pk')
+        return (list(clients.values_list('name', 'comment', 'timezone')),
+                list(mailings.values_list('status', 'periodicity', 'start_date', 'total_attempts', 'success_count',
+                                          'last_status')),
+                list(Log.objects.filter(mailing__in=mailings).order_by('pk').values_list('time', 'status')))
+
+    def test_consistency(self):
+        totals = self.generate()
+        self.assertEqual(totals, {'users': 2, 'clients': 10, 'messages': 4, 'mailings': 6, 'links': 12,
+                                  'logs': Log.objects.count()})
+        counters = list(Mailing.objects.order_by('pk').values_list(*Mailing.COUNTER_FIELDS))
+        rebuild_mailing_stats()
+        self.assertEqual(list(Mailing.objects.order_by('pk').values_list(*Mailing.COUNTER_FIELDS)), counters)
+        for mailing in Mailing.objects.select_related('message'):
+            self.assertEqual(mailing.message.owner_id, mailing.owner_id)
+            self.assertEqual({client.owner_id for client in mailing.clients.all()}, {mailing.owner_id})
+        # Последовательности зарезервированы до вставки, новые строки с набором не пересекаются
+        Client.objects.create(name='Новый', email='new@test.ru')
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = list(User.objects.order_by('pk'))
+        self.generate()
+        second = list(User.objects.exclude(pk__in=[user.pk for user in first]))
+        self.generate(seed=4)
+        third = list(User.objects.exclude(pk__in=[user.pk for user in first + second]))
+        self.assertEqual(self.content(first), self.content(second))
+        self.assertNotEqual(self.content(first), self.content(third))
+
+    def test_copy_escaping(self):
+        owner = User.objects.create(email='owner@test.ru')
+        comment = 'табуляция\tперевод\nстроки\r\\N и обратная \\ черта'
+        with connection.cursor() as cursor:
+            client_id, empty_id = reserve_ids(cursor, Client, 2)
+            copy_rows(cursor, Client, CLIENT_COLUMNS, [(client_id, 'Имя', 'a@test.ru', comment, '', owner.pk),
+                                                        (empty_id, 'Пусто', 'b@test.ru', None, '', owner.pk)])
+        self.assertEqual(Client.objects.get(pk=client_id).comment, comment)
+        self.assertIsNone(Client.objects.get(pk=empty_id).comment)
+
+
+class SegmentTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(email='owner@test.ru')
+        self.anna = Client.objects.create(name='Анна', email='anna@shop.ru', comment='vip', owner=self.owner)
+        self.boris = Client.objects.create(name='Борис', email='boris@shop.ru', owner=self.owner)
+        self.vera = Client.objects.create(name='Вера', email='vera@mail.ru', comment='vip', owner=self.owner)
+        Client.objects.create(name='Чужой', email='other@shop.ru', owner=User.objects.create(email='other@test.ru'))
+
+    def members(self, queryset):
+        return set(queryset.values_list('pk', flat=True))
+
+    def test_resolve(self):
+        cases = [
+            ({}, {self.anna.pk, self.boris.pk, self.vera.pk}),
+            ({'email_contains': '@SHOP.ru'}, {self.anna.pk, self.boris.pk}),
+            ({'email_contains': '@shop.ru', 'comment_contains': 'VIP'}, {self.anna.pk}),
+            ({'search': 'vip'}, {self.vera.pk, self.anna.pk}),
+        ]
+        for conditions, expected in cases:
+            with self.subTest(conditions=conditions):
+                segment = Segment.objects.create(name='Сегмент', owner=self.owner, **conditions)
+                self.assertEqual(self.members(resolve_segment(segment)), expected)
+        self.assertFalse(resolve_segment(Segment.objects.create(name='Без владельца')).exists())
+
+    def test_incremental_refresh(self):
+        segment = Segment.objects.create(name='Магазин', owner=self.owner, email_contains='@shop.ru',
+                                         is_materialized=True)
+        self.assertEqual(refresh_segment(segment), (2, 0))
+        segment.refresh_from_db()
+        anna_row = SegmentMember.objects.get(segment=segment, client=self.anna).pk
+
+        new = Client.objects.create(name='Глеб', email='gleb@shop.ru', owner=self.owner)
+        Client.objects.filter(pk=self.boris.pk).update(email='boris@mail.ru')
+        # До пересчёта состав читается из снимка
+        self.assertEqual(self.members(segment_clients(segment)), {self.anna.pk, self.boris.pk})
+        self.assertEqual(refresh_segment(segment), (1, 1))
+        self.assertEqual(self.members(segment_clients(segment)), {self.anna.pk, new.pk})
+        # Неизменившиеся строки снимка не переписываются
+        self.assertEqual(SegmentMember.objects.get(segment=segment, client=self.anna).pk, anna_row)
+        self.assertEqual(refresh_segment(segment), (0, 0))
+
+    def test_stale_snapshot(self):
+        segment = Segment.objects.create(name='Магазин', owner=self.owner, email_contains='@shop.ru',
+                                         is_materialized=True)
+        refresh_segment(segment)
+        segment = Segment.objects.get(pk=segment.pk)
+
+        # Переименование условий не меняет, снимок остаётся действующим
+        segment.name = 'Покупатели'
+        segment.save(update_fields=['name'])
+        segment.refresh_from_db()
+        self.assertIsNotNone(segment.refreshed_at)
+
+        segment.comment_contains = 'vip'
+        segment.save()
+        segment.refresh_from_db()
+        self.assertIsNone(segment.refreshed_at)
+        # Устаревший снимок не используется: состав вычисляется запросом
+        self.assertEqual(self.members(segment_clients(segment)), {self.anna.pk})
+
+        refresh_segments()
+        segment.refresh_from_db()
+        self.assertIsNotNone(segment.refreshed_at)
+        self.assertEqual(set(segment.members.values_list('client', flat=True)), {self.anna.pk})
+
+        segment = Segment.objects.get(pk=segment.pk)
+        segment.is_materialized = False
+        segment.save()
+        refresh_segments()
+        self.assertFalse(segment.members.exists())
+
+
+class ContentFilterTest(TestCase):
+
+    def setUp(self):
+        # Автомат живёт в памяти процесса, а версия - в кэше; оба сбрасываются для каждого теста
+        cache.clear()
+        content_filter._compiled = (None, None)
+
+    def test_overlapping_words(self):
+        hits = ContentFilter(['кот', 'котик', 'тик', 'икота']).find_all('котик икота')
+        self.assertEqual(set(hits), {Hit('кот', 0, 3), Hit('котик', 0, 5), Hit('тик', 2, 5),
+                                     Hit('икота', 6, 11), Hit('кот', 7, 10)})
+
+    def test_homoglyphs_and_case(self):
+        text = 'Только сегодня CKИДKA!'
+        hits = ContentFilter(['скидка']).find_all(text)
+        self.assertEqual(hits, [Hit('скидка', 15, 21)])
+        self.assertEqual(text[hits[0].start:hits[0].end], 'CKИДKA')
+        self.assertEqual(ContentFilter(['ёлка']).find_all('ЕЛКА'), [Hit('ёлка', 0, 4)])
+
+    def test_words_added_at_runtime(self):
+        message = Message(title='Тема', message='Большая скидка')
+        self.assertEqual(check_message(message), {})
+        word = ForbiddenWord.objects.create(word='скидка')
+        self.assertEqual(check_message(message), {'message': [Hit('скидка', 8, 14)]})
+        word.is_active = False
+        word.save()
+        self.assertEqual(find_forbidden_words(message.message), [])
+
+
+class DuplicateClientsTest(TestCase):
+
+    def setUp(self):
+        # Дубликаты остались от данных до появления ограничений, в тесте ограничения снимаются
+        # (откатится вместе с транзакцией теста)
+        with connection.schema_editor() as editor:
+            for constraint in Client._meta.constraints:
+                editor.remove_constraint(Client, constraint)
+        self.owner = User.objects.create(email='owner@test.ru')
+        self.keep = Client.objects.create(name='Первый', email='client@test.ru', owner=self.owner)
+        self.dups = [Client.objects.create(name=f'Дубликат {i}', email=f'dup{i}@test.ru', owner=self.owner)
+                     for i in range(2)]
+        # Поле приводит адрес и при update(), поэтому исходные адреса записываются SQL-запросом
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE mailing_client SET email = %s WHERE id = %s', [' Client@Test.ru', self.dups[0].pk])
+            cursor.execute('UPDATE mailing_client SET email = %s WHERE id = %s', ['client@test.ru', self.dups[1].pk])
+        self.foreign = Client.objects.create(name='Чужой', email='client@test.ru',
+                                             owner=User.objects.create(email='other@test.ru'))
+
+    def test_merge(self):
+        first = Mailing.objects.create(name='Первая', owner=self.owner)
+        first.clients.add(self.dups[0])
+        second = Mailing.objects.create(name='Вторая', owner=self.owner)
+        second.clients.add(self.keep, self.dups[1])
+        segment = Segment.objects.create(name='Сегмент', owner=self.owner, is_materialized=True)
+        SegmentMember.objects.bulk_create([SegmentMember(segment=segment, client=client)
+                                           for client in (self.keep, *self.dups)])
+
+        self.assertEqual(normalize_client_emails(batch_size=1), 1)
+        self.assertEqual(merge_duplicate_clients(batch_size=1), (1, 2))
+        # Отложенные проверки внешних ключей выполняются сейчас, а не при фиксации
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        self.assertEqual(set(Client.objects.values_list('pk', flat=True)), {self.keep.pk, self.foreign.pk})
+        self.assertEqual(list(first.clients.all()), [self.keep])
+        self.assertEqual(list(second.clients.all()), [self.keep])
+        self.assertEqual(list(segment.members.values_list('client', flat=True)), [self.keep.pk])
+        self.assertEqual(merge_duplicate_clients(), (0, 0))
+
+    def test_form_rejects_duplicate(self):
+        Client.objects.filter(pk__in=[client.pk for client in self.dups]).delete()
+        data = {'name': 'Клиент', 'email': ' CLIENT@test.ru'}
+        form = ClientForm(data, owner=self.owner)
+        self.assertIn('email', form.errors)
+        self.assertTrue(ClientForm(data, owner=User.objects.create(email='new@test.ru')).is_valid())
+        self.assertTrue(ClientForm(data, instance=self.keep).is_valid())
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Минимальный SMTP-сервер для тестов: принимает письма и снимает экранирование точек
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 test')
+        while line := self.rfile.readline():
+            command = line.strip().upper()
+            if command.startswith(b'EHLO'):
+                self.reply('250-test')
+                self.reply('250 8BITMIME')
+            elif command.startswith(b'RCPT'):
+                self.reply('550 no such user' if b'BOUNCE' in command else '250 ok')
+            elif command == b'DATA':
+                self.reply('354 go ahead')
+                lines = []
+                while (data_line := self.rfile.readline()) != b'.\r\n':
+                    lines.append(data_line[1:] if data_line.startswith(b'.') else data_line)
+                self.server.received.append(b''.join(lines))
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class AttachmentSendTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp_server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+        cls.smtp_server.received = []
+        threading.Thread(target=cls.smtp_server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.smtp_server.shutdown()
+        cls.smtp_server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        suppression._state = (None, None, None, None)
+        self.smtp_server.received.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.owner = User.objects.create(email='owner@test.ru')
+        # Строки, начинающиеся с точки, и строка из одной точки должны пройти через SMTP без изменений
+        self.message = Message.objects.create(title='Тема', message='.Первая строка\n.\nпоследняя', owner=self.owner)
+        self.content = os.urandom(100 * 1024 + 17)
+        Attachment.objects.create(message=self.message, file=ContentFile(self.content, name='брошюра.pdf'))
+        Attachment.objects.create(message=self.message, file=ContentFile(b'', name='empty.txt'))
+
+    def assert_message(self, raw, recipient):
+        received = email.message_from_bytes(raw, policy=email.policy.default)
+        self.assertEqual(received['To'], recipient)
+        body = received.get_body(('plain',)).get_content().replace('\r\n', '\n')
+        self.assertTrue(body.startswith('.Первая строка\n.\nпоследняя\n'), body)
+        attachments = list(received.iter_attachments())
+        self.assertEqual([part.get_filename() for part in attachments], ['брошюра.pdf', 'empty.txt'])
+        self.assertEqual(attachments[0].get_content(), self.content)
+        self.assertEqual(attachments[1].get_content(), '')
+
+    def test_stream_over_smtp(self):
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+                           EMAIL_PORT=self.smtp_server.server_address[1], EMAIL_USE_TLS=False, EMAIL_USE_SSL=False):
+            response = send_to_recipients(self.message, [['first@test.ru', 'bounce@test.ru', 'second@test.ru']],
+                                          self.owner.pk)
+        self.assertEqual(response, 'Отправлено писем: 2, отвергнуто (5xx): 1')
+        self.assertEqual(len(self.smtp_server.received), 2)
+        self.assert_message(self.smtp_server.received[0], 'first@test.ru')
+        self.assert_message(self.smtp_server.received[1], 'second@test.ru')
+
+    def test_parallel_encoding(self):
+        attachments = list(Attachment.objects.filter(message=self.message).order_by('pk'))
+        expected = encode_part(attachments[0])
+        with open(expected, 'rb') as f:
+            content = f.read()
+        os.remove(expected)
+        # Потоки одного процесса (как задачи планировщика) кодируют одну часть одновременно
+        copies = [Attachment.objects.get(pk=attachments[0].pk) for _ in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(encode_part, copies))
+        self.assertEqual(set(paths), {expected})
+        with open(expected, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual([name for name in os.listdir(os.path.dirname(expected)) if name.endswith('.tmp')], [])
+
+    def test_locmem_uses_encoded_parts(self):
+        send_to_recipients(self.message, [['first@test.ru', 'second@test.ru']], self.owner.pk)
+        self.assertEqual(len(mail.outbox), 2)
+        # Части собираются один раз на отправку и общие для всех писем
+        self.assertIs(mail.outbox[0].attachments[0], mail.outbox[1].attachments[0])
+        self.assert_message(mail.outbox[1].message().as_bytes(), 'second@test.ru')
@@ -5,26 +5,44 @@ from mailing.apps import MailingConfig
 from mailing.views import (HomeView, ClientListView, ClientCreateView, ClientDeleteView, ClientUpdateView,
                            ClientDetailView, MessageListView, MessageCreateView, MessageUpdateView, MessageDeleteView,
                            MessageDetailView, MailingListView, MailingCreateView, MailingUpdateView, MailingDeleteView,
-                           MailingDetailView, LogListView)
+                           MailingDetailView, LogListView, ClientLookupView, MessageLookupView,
+                           MailingAddClientsView, MailingBulkView, AsyncHomeView, AsyncClientListView,
+                           AsyncMessageListView, AsyncMailingListView, AsyncLogListView, AsyncClientLookupView,
+                           AsyncMessageLookupView, SegmentListView, SegmentDetailView, SegmentCreateView,
+                           SegmentUpdateView, SegmentDeleteView, UnsubscribeView, MailingLookupView,
+                           AsyncMailingLookupView, OwnerLookupView, AsyncOwnerLookupView)
+from config.async_views import select_view
 
 app_name = MailingConfig.name
 
 urlpatterns = [
-    path('', HomeView.as_view(), name='index'),
+    path('', select_view(HomeView, AsyncHomeView).as_view(), name='index'),
     path('create/', ClientCreateView.as_view(), name='create'),
-    path('clients_list/', ClientListView.as_view(), name='clients_list'),
+    path('clients_list/', select_view(ClientListView, AsyncClientListView).as_view(), name='clients_list'),
     path('delete/<int:pk>/', ClientDeleteView.as_view(), name='delete'),
     path('edit/<int:pk>/', ClientUpdateView.as_view(), name='edit'),
     path('view/<int:pk>/', cache_page(60)(ClientDetailView.as_view()), name='view'),
-    path('messages_list/', MessageListView.as_view(), name='messages_list'),
+    path('messages_list/', select_view(MessageListView, AsyncMessageListView).as_view(), name='messages_list'),
     path('message_create/', MessageCreateView.as_view(), name='create_message'),
     path('message_view/<int:pk>/', cache_page(60)(MessageDetailView.as_view()), name='view_message'),
     path('message_edit/<int:pk>/', MessageUpdateView.as_view(), name='edit_message'),
     path('message_delete/<int:pk>/', MessageDeleteView.as_view(), name='delete_message'),
-    path('mailings_list/', MailingListView.as_view(), name='mailings_list'),
+    path('mailings_list/', select_view(MailingListView, AsyncMailingListView).as_view(), name='mailings_list'),
     path('mailing_create/', MailingCreateView.as_view(), name='create_mailing'),
     path('mailing_view/<int:pk>/', MailingDetailView.as_view(), name='view_mailing'),
     path('mailing_edit/<int:pk>/', MailingUpdateView.as_view(), name='edit_mailing'),
     path('mailing_delete/<int:pk>/', MailingDeleteView.as_view(), name='delete_mailing'),
-    path('logs_list/', LogListView.as_view(), name='logs_list'),
+    path('segments_list/', SegmentListView.as_view(), name='segments_list'),
+    path('segment_create/', SegmentCreateView.as_view(), name='create_segment'),
+    path('segment_view/<int:pk>/', SegmentDetailView.as_view(), name='view_segment'),
+    path('segment_edit/<int:pk>/', SegmentUpdateView.as_view(), name='edit_segment'),
+    path('segment_delete/<int:pk>/', SegmentDeleteView.as_view(), name='delete_segment'),
+    path('logs_list/', select_view(LogListView, AsyncLogListView).as_view(), name='logs_list'),
+    path('lookup/clients/', select_view(ClientLookupView, AsyncClientLookupView).as_view(), name='lookup_clients'),
+    path('lookup/messages/', select_view(MessageLookupView, AsyncMessageLookupView).as_view(), name='lookup_messages'),
+    path('lookup/mailings/', select_view(MailingLookupView, AsyncMailingLookupView).as_view(), name='lookup_mailings'),
+    path('lookup/owners/', select_view(OwnerLookupView, AsyncOwnerLookupView).as_view(), name='lookup_owners'),
+    path('mailing_add_clients/<int:pk>/', MailingAddClientsView.as_view(), name='add_clients'),
+    path('mailing_bulk/', MailingBulkView.as_view(), name='bulk_mailings'),
+    path('unsubscribe/<str:token>/', UnsubscribeView.as_view(), name='unsubscribe'),
 ]
\ No newline at end of file
@@ -1,17 +1,36 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.shortcuts import get_object_or_404
+from django.db.models import Exists, OuterRef
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
 from django.urls import reverse_lazy, reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
-from django.views.generic import TemplateView
-
-from blog.services import get_articles_from_cache
-from mailing.forms import ClientForm, MessageForm, MailingForm, ManagerMailingForm
-from mailing.models import Mailing, Client
+from django.views.generic import TemplateView, View
+from django.views.generic.detail import SingleObjectMixin
+
+from blog.services import get_articles_from_cache, aget_articles_from_cache
+from config.async_views import AsyncListMixin
+from config.db.routers import ReadReplicaMixin
+from config.pagination import KeysetPaginationMixin
+from config.search import SearchMixin
+from mailing.access import AsyncAccessMixin, OwnerScopedMixin, get_access_policy
+from mailing.forms import (ClientForm, MessageForm, MailingForm, ManagerMailingForm, LogFilterForm,
+                           MailingBulkForm, SegmentForm, update_fields)
+from mailing.models import Mailing, Client, Segment, Suppression
 from mailing.models import Message, Log
+from mailing.services import (filter_logs, get_log_stats, LOG_STATS_DEFAULT_PERIOD, search_clients,
+                              add_clients_to_mailing, pause_mailings, resume_mailings, complete_mailings,
+                              reschedule_mailings, clone_mailings, segment_clients)
+from mailing.suppression import read_unsubscribe_token, suppress
+from users.models import User
 
 
-class HomeView(TemplateView):
+class HomeView(ReadReplicaMixin, TemplateView):
     """
     Контроллер главной страницы сайта
     """
@@ -29,31 +48,47 @@ class HomeView(TemplateView):
         return context_data
 
 
-class ClientListView(LoginRequiredMixin, ListView):
+class AsyncHomeView(HomeView):
     """
-    Контроллер отвечающий за отображение списка клиентов
+    Асинхронная версия главной страницы
+    """
+
+    async def get(self, request, *args, **kwargs):
+        context_data = super(HomeView, self).get_context_data(**kwargs)
+        mailings = Mailing.objects.all()
+        context_data['all_mailings'] = await mailings.acount()
+        context_data['active_mailings'] = await mailings.filter(status=Mailing.STARTED).acount()
+        context_data['active_clients'] = await Client.objects.values('email').distinct().acount()
+
+        articles = await aget_articles_from_cache()
+        context_data['random_blogs'] = [blog async for blog in articles.order_by('?')[:3]]
+        return self.render_to_response(context_data)
+
+
+class ClientListView(ReadReplicaMixin, LoginRequiredMixin, OwnerScopedMixin, SearchMixin, KeysetPaginationMixin, ListView):
+    """
+    Контроллер отвечающий за отображение и поиск клиентов
     """
     model = Client
+    keyset_ordering = ('name', 'pk')
+    managers_see_all = True
+    search_trigram_fields = ('email',)
 
-    def get_queryset(self, queryset=None):
-        queryset = super().get_queryset()
-        user = self.request.user
-        if not user.is_superuser and not user.groups.filter(name='manager'):
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
+
+class AsyncClientListView(AsyncAccessMixin, AsyncListMixin, ClientListView):
+    """
+    Асинхронная версия списка клиентов
+    """
 
 
-class ClientDetailView(LoginRequiredMixin, DetailView):
+class ClientDetailView(LoginRequiredMixin, OwnerScopedMixin, DetailView):
     """
     Контроллер отвечающий за отображение клиента
     """
     model = Client
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
+    def get_queryset(self):
+        return super().get_queryset().select_related('owner')
 
 
 class ClientCreateView(LoginRequiredMixin, CreateView):
@@ -64,15 +99,17 @@ class ClientCreateView(LoginRequiredMixin, CreateView):
     form_class = ClientForm
     success_url = reverse_lazy('mailing:clients_list')
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['owner'] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
-        client = form.save()
-        user = self.request.user
-        client.owner = user
-        client.save()
+        form.instance.owner = self.request.user
         return super().form_valid(form)
 
 
-class ClientUpdateView(LoginRequiredMixin, UpdateView):
+class ClientUpdateView(LoginRequiredMixin, OwnerScopedMixin, UpdateView):
     """
     Контроллер отвечающий за редактирование клиента
     """
@@ -82,53 +119,35 @@ class ClientUpdateView(LoginRequiredMixin, UpdateView):
     def get_success_url(self):
         return reverse('mailing:view', args=[self.kwargs.get('pk')])
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
-
 
-class ClientDeleteView(LoginRequiredMixin, DeleteView):
+class ClientDeleteView(LoginRequiredMixin, OwnerScopedMixin, DeleteView):
     """
     Контроллер отвечающий за удаление клиента
     """
     model = Client
     success_url = reverse_lazy('mailing:clients_list')
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
 
-
-class MessageListView(LoginRequiredMixin, ListView):
+class MessageListView(ReadReplicaMixin, LoginRequiredMixin, OwnerScopedMixin, SearchMixin, KeysetPaginationMixin, ListView):
     """
-    Контроллер отвечающий за отображение списка сообщений
+    Контроллер отвечающий за отображение и поиск сообщений
     """
     model = Message
+    managers_see_all = True
 
-    def get_queryset(self, queryset=None):
-        queryset = super().get_queryset()
-        user = self.request.user
-        if not user.is_superuser and not user.groups.filter(name='manager'):
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
+
+class AsyncMessageListView(AsyncAccessMixin, AsyncListMixin, MessageListView):
+    """
+    Асинхронная версия списка сообщений
+    """
 
 
-class MessageDetailView(LoginRequiredMixin, DetailView):
+class MessageDetailView(LoginRequiredMixin, OwnerScopedMixin, DetailView):
     """
     Контроллер отвечающий за отображение сообщения
     """
     model = Message
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
-
 
 class MessageCreateView(LoginRequiredMixin, CreateView):
     """
@@ -139,14 +158,11 @@ class MessageCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy('mailing:messages_list')
 
     def form_valid(self, form):
-        message = form.save()
-        user = self.request.user
-        message.owner = user
-        message.save()
+        form.instance.owner = self.request.user
         return super().form_valid(form)
 
 
-class MessageUpdateView(LoginRequiredMixin, UpdateView):
+class MessageUpdateView(LoginRequiredMixin, OwnerScopedMixin, UpdateView):
     """
     Контроллер отвечающий за редактирование сообщение
     """
@@ -156,54 +172,52 @@ class MessageUpdateView(LoginRequiredMixin, UpdateView):
     def get_success_url(self):
         return reverse('mailing:view_message', args=[self.kwargs.get('pk')])
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
 
-
-class MessageDeleteView(LoginRequiredMixin, DeleteView):
+class MessageDeleteView(LoginRequiredMixin, OwnerScopedMixin, DeleteView):
     """
     Контроллер отвечающий за удаление сообщения
     """
     model = Message
     success_url = reverse_lazy('mailing:messages_list')
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
-
 
-class MailingListView(LoginRequiredMixin, ListView):
+class MailingListView(ReadReplicaMixin, LoginRequiredMixin, OwnerScopedMixin, KeysetPaginationMixin, ListView):
     """
     Контроллер отвечающий за отображение списка рассылок
     """
     model = Mailing
+    keyset_ordering = ('name', 'pk')
+    managers_see_all = True
 
-    def get_queryset(self, queryset=None):
-        queryset = super().get_queryset()
-        user = self.request.user
-        if not user.is_superuser and not user.groups.filter(name='manager'):
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['bulk_form'] = MailingBulkForm()
+        return context_data
 
 
-class MailingDetailView(LoginRequiredMixin, DetailView):
+class AsyncMailingListView(AsyncAccessMixin, AsyncListMixin, MailingListView):
+    """
+    Асинхронная версия списка рассылок
+    """
+
+
+class MailingDetailView(LoginRequiredMixin, OwnerScopedMixin, DetailView):
     """
     Контроллер отвечающий за отображение рассылки
     """
     model = Mailing
+    managers_see_all = True
+    clients_preview_size = 50
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        user = self.request.user
-        if not user.is_superuser and not user.groups.filter(name='manager') and user != self.object.owner:
-            raise PermissionDenied
-        else:
-            return self.object
+    def get_queryset(self):
+        return super().get_queryset().select_related('owner', 'message', 'segment')
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        clients = self.object.clients.only('email').order_by('pk')
+        context_data['clients_preview'] = clients[:self.clients_preview_size]
+        context_data['clients_count'] = clients.count()
+        return context_data
 
 
 class MailingCreateView(LoginRequiredMixin, CreateView):
@@ -214,11 +228,13 @@ class MailingCreateView(LoginRequiredMixin, CreateView):
     form_class = MailingForm
     success_url = reverse_lazy('mailing:mailings_list')
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['owner'] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
-        mailing = form.save()
-        user = self.request.user
-        mailing.owner = user
-        mailing.save()
+        form.instance.owner = self.request.user
         return super().form_valid(form)
 
 
@@ -229,24 +245,15 @@ class MailingUpdateView(PermissionRequiredMixin, UpdateView):
     model = Mailing
     permission_required = 'mailing.change_mailing'  # разрешение на изменение рассылки
     template_name = 'mailing/mailing_form.html'  # ваш шаблон редактирования рассылки
-    fields = ['name', 'description', 'status', 'periodicity', 'start_date', 'end_date', 'next_send_time', 'clients',
-              'message', 'owner']
-
-    def dispatch(self, request, *args, **kwargs):
-        # Получаем объект рассылки, который пытаемся редактировать
-        self.object = self.get_object()
-
-        # Проверяем разрешение пользователя на редактирование этой рассылки
-        if not self.has_permission():
-            # Если разрешения нет, вызываем исключение PermissionDenied
-            return self.handle_no_permission()
-
-        return super().dispatch(request, *args, **kwargs)
+    success_url = reverse_lazy('mailing:mailings_list')
 
-    def get_object(self, queryset=None):
-        # Получаем объект рассылки, используя переданный в URL идентификатор
-        id = self.kwargs.get('pk')
-        return get_object_or_404(Mailing, pk=id)
+    def get_queryset(self):
+        # Менеджеры с правом деактивации видят все рассылки, остальные - только свои
+        queryset = super().get_queryset()
+        policy = get_access_policy(self.request)
+        if policy.has_perm('mailing.deactivate_mailing'):
+            return queryset
+        return policy.scope(queryset)
 
     def get_permission_denied_message(self):
         # Сообщение об ошибке при отсутствии разрешения
@@ -256,31 +263,335 @@ class MailingUpdateView(PermissionRequiredMixin, UpdateView):
         """
         Функция, определяющая поля для редактирования в зависимости от прав пользователя
         """
-        user = self.request.user
-        if user == self.object.owner or user.is_superuser:
+        policy = get_access_policy(self.request)
+        if policy.is_owner(self.object) or policy.is_superuser:
             return MailingForm
-        elif user.has_perm('mailing.deactivate_mailing'):
+        elif policy.has_perm('mailing.deactivate_mailing'):
             return ManagerMailingForm
         else:
             raise PermissionDenied
 
+    def form_valid(self, form):
+        # Сохраняются только поля формы: счётчики попыток тем временем мог изменить диспетчер
+        self.object = form.save(commit=False)
+        self.object.save(update_fields=update_fields(form))
+        form.save_m2m()
+        return redirect(self.get_success_url())
 
-class MailingDeleteView(LoginRequiredMixin, DeleteView):
+
+class MailingDeleteView(LoginRequiredMixin, OwnerScopedMixin, DeleteView):
     """
     Контроллер отвечающий за удаление расылки
     """
     model = Mailing
     success_url = reverse_lazy('mailing:mailings_list')
 
-    def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        if self.request.user == self.object.owner or self.request.user.is_superuser:
-            return self.object
-        raise PermissionDenied
 
+class MailingBulkView(LoginRequiredMixin, View):
+    """
+    Контроллер массовых операций над рассылками: отмеченными или всеми доступными.
+    Каждая операция выполняется одним SQL-запросом, результат сообщается одним сообщением
+    """
+    http_method_names = ['post']
+    # Операции, которые менеджер с правом деактивации может выполнять над чужими рассылками
+    status_actions = {
+        'pause': (pause_mailings, 'Приостановлено рассылок'),
+        'resume': (resume_mailings, 'Возобновлено рассылок'),
+        'complete': (complete_mailings, 'Завершено рассылок'),
+    }
+
+    def get_queryset(self, action):
+        policy = get_access_policy(self.request)
+        managers_see_all = action in self.status_actions and policy.has_perm('mailing.deactivate_mailing')
+        return policy.scope(Mailing.objects.all(), managers_see_all=managers_see_all)
+
+    def post(self, request, *args, **kwargs):
+        form = MailingBulkForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, ' '.join(error for errors in form.errors.values() for error in errors))
+            return redirect(reverse('mailing:mailings_list'))
+
+        action = form.cleaned_data['action']
+        mailings = self.get_queryset(action)
+        if form.cleaned_data['scope'] != MailingBulkForm.SCOPE_ALL:
+            mailings = mailings.filter(pk__in=form.cleaned_data['ids'])
+
+        if action in self.status_actions:
+            operation, label = self.status_actions[action]
+            messages.success(request, f'{label}: {operation(mailings)}')
+        elif action == 'reschedule':
+            changed = reschedule_mailings(mailings, next_send_time=form.cleaned_data['next_send_time'],
+                                          shift=form.cleaned_data['shift'])
+            messages.success(request, f'Перенесено рассылок: {changed}')
+        elif action == 'clone':
+            cloned, links = clone_mailings(mailings)
+            messages.success(request, f'Скопировано рассылок: {cloned}, клиентов в копиях: {links}')
+        return redirect(reverse('mailing:mailings_list'))
+
+
+class SegmentListView(LoginRequiredMixin, OwnerScopedMixin, KeysetPaginationMixin, ListView):
+    """
+    Контроллер отвечающий за отображение списка сегментов
+    """
+    model = Segment
+    keyset_ordering = ('name', 'pk')
+
+
+class SegmentDetailView(LoginRequiredMixin, OwnerScopedMixin, DetailView):
+    """
+    Контроллер отвечающий за отображение сегмента и его текущего состава
+    """
+    model = Segment
+    clients_preview_size = 50
 
-class LogListView(LoginRequiredMixin, ListView):
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        clients = segment_clients(self.object).only('name', 'email').order_by('pk')
+        context_data['clients_preview'] = clients[:self.clients_preview_size]
+        context_data['clients_count'] = clients.count()
+        return context_data
+
+
+class SegmentCreateView(LoginRequiredMixin, CreateView):
+    """
+    Контроллер отвечающий за создание сегмента
+    """
+    model = Segment
+    form_class = SegmentForm
+
+    def form_valid(self, form):
+        form.instance.owner = self.request.user
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return reverse('mailing:view_segment', args=[self.object.pk])
+
+
+class SegmentUpdateView(LoginRequiredMixin, OwnerScopedMixin, UpdateView):
+    """
+    Контроллер отвечающий за редактирование сегмента
+    """
+    model = Segment
+    form_class = SegmentForm
+
+    def get_success_url(self):
+        return reverse('mailing:view_segment', args=[self.object.pk])
+
+
+class SegmentDeleteView(LoginRequiredMixin, OwnerScopedMixin, DeleteView):
+    """
+    Контроллер отвечающий за удаление сегмента
+    """
+    model = Segment
+    success_url = reverse_lazy('mailing:segments_list')
+
+
+class LogListView(ReadReplicaMixin, LoginRequiredMixin, OwnerScopedMixin, KeysetPaginationMixin, ListView):
     """
     Контроллер отвечающий за отображение списка попыток рассылок
     """
     model = Log
+    keyset_ordering = ('-time', '-pk')
+    owner_field = 'mailing__owner'
+    managers_see_all = True
+
+    def get_queryset(self, queryset=None):
+        queryset = super().get_queryset().select_related('mailing')
+        policy = get_access_policy(self.request)
+        self.filter_form = LogFilterForm(self.request.GET or None, user=policy.user,
+                                         can_view_all=policy.can_view_all)
+        self.filters = {}
+        if self.filter_form.is_valid():
+            self.filters = {key: value for key, value in self.filter_form.cleaned_data.items() if key != 'group_by'}
+        elif self.filter_form.is_bound:
+            # С неверным фильтром журнал не показывается целиком, форма выводит ошибки
+            return queryset.none()
+        return filter_logs(queryset, **self.filters)
+
+    def get_stats(self, group_by):
+        queryset = self.object_list
+        # Без явного периода статистика считается за последнюю неделю, а не по всей таблице
+        if not any(self.filters.get(key) for key in ('period', 'date_from', 'date_to')):
+            queryset = queryset.filter(time__gte=timezone.now() - LOG_STATS_DEFAULT_PERIOD)
+        return get_log_stats(queryset, group_by)
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['filter_form'] = self.filter_form
+        group_by = self.request.GET.get('group_by')
+        if group_by:
+            context_data['group_by'] = group_by
+            if 'log_stats' not in context_data:
+                context_data['log_stats'] = self.get_stats(group_by)
+        return context_data
+
+
+class AsyncLogListView(AsyncAccessMixin, AsyncListMixin, LogListView):
+    """
+    Асинхронная версия журнала попыток рассылок
+    """
+
+    async def aget_queryset(self):
+        # Проверка формы фильтра выбирает рассылки из БД
+        return await sync_to_async(self.get_queryset)()
+
+    async def aget_context_kwargs(self):
+        group_by = self.request.GET.get('group_by')
+        if not group_by:
+            return {}
+        return {'log_stats': await sync_to_async(self.get_stats)(group_by)}
+
+
+class LookupView(ReadReplicaMixin, LoginRequiredMixin, OwnerScopedMixin, KeysetPaginationMixin, ListView):
+    """
+    Базовый контроллер JSON-поиска объектов для виджетов автодополнения: объекты ищутся по началу
+    значения поля prefix_field, для подписи загружаются только поля only_fields
+    """
+    only_fields = ('id',)
+    prefix_field = None
+
+    def filter_queryset(self, queryset, query):
+        queryset = queryset.only(*self.only_fields)
+        query = query.strip()
+        if query and self.prefix_field:
+            queryset = queryset.filter(**{f'{self.prefix_field}__istartswith': query})
+        return queryset
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        owner = self.request.GET.get('owner', '')
+        if owner and get_access_policy(self.request).is_superuser:
+            # Некорректный фильтр, как и в журнале, даёт пустой результат
+            queryset = queryset.filter(owner=int(owner)) if owner.isdigit() else queryset.none()
+        return self.filter_queryset(queryset, self.request.GET.get('q', ''))
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        return JsonResponse({
+            'results': [{'id': obj.pk, 'text': str(obj)} for obj in page],
+            'next': page.next_cursor,
+        })
+
+
+class ClientLookupView(LookupView):
+    """
+    Контроллер поиска клиентов для выбора получателей рассылки
+    """
+    model = Client
+    keyset_ordering = ('name', 'pk')
+    only_fields = ('id', 'name')
+
+    def filter_queryset(self, queryset, query):
+        # Клиент ищется и по имени, и по адресу почты
+        return search_clients(queryset.only(*self.only_fields), query)
+
+
+class MessageLookupView(LookupView):
+    """
+    Контроллер поиска сообщений для выбора в рассылке
+    """
+    model = Message
+    only_fields = ('id', 'title')
+    prefix_field = 'title'
+
+
+class MailingLookupView(LookupView):
+    """
+    Контроллер поиска рассылок для фильтра журнала
+    """
+    model = Mailing
+    keyset_ordering = ('name', 'pk')
+    managers_see_all = True
+    only_fields = ('id', 'name', 'status')
+    prefix_field = 'name'
+
+
+class OwnerLookupView(LookupView):
+    """
+    Контроллер поиска владельцев рассылок для фильтра журнала. Доступен тем, кто видит все рассылки
+    """
+    model = User
+    keyset_ordering = ('email', 'pk')
+    only_fields = ('id', 'email')
+    prefix_field = 'email'
+
+    def get_queryset(self):
+        if not get_access_policy(self.request).can_view_all:
+            raise PermissionDenied
+        queryset = User.objects.filter(Exists(Mailing.objects.filter(owner=OuterRef('pk'))))
+        return self.filter_queryset(queryset, self.request.GET.get('q', ''))
+
+
+class AsyncClientLookupView(AsyncAccessMixin, AsyncListMixin, ClientLookupView):
+    """
+    Асинхронная версия поиска клиентов
+    """
+
+
+class AsyncMessageLookupView(AsyncAccessMixin, AsyncListMixin, MessageLookupView):
+    """
+    Асинхронная версия поиска сообщений
+    """
+
+
+class AsyncMailingLookupView(AsyncAccessMixin, AsyncListMixin, MailingLookupView):
+    """
+    Асинхронная версия поиска рассылок
+    """
+
+
+class AsyncOwnerLookupView(AsyncAccessMixin, AsyncListMixin, OwnerLookupView):
+    """
+    Асинхронная версия поиска владельцев рассылок
+    """
+
+
+class MailingAddClientsView(LoginRequiredMixin, OwnerScopedMixin, SingleObjectMixin, View):
+    """
+    Контроллер добавления в рассылку всех клиентов владельца, подходящих под фильтр
+    """
+    model = Mailing
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        mailing = self.get_object()
+        if mailing.owner_id is None:
+            # Фильтр owner=None выбрал бы всех клиентов без владельца
+            messages.error(request, 'У рассылки нет владельца, клиенты по фильтру не добавляются')
+            return redirect(reverse('mailing:view_mailing', args=[mailing.pk]))
+        clients = search_clients(Client.objects.filter(owner=mailing.owner_id), request.POST.get('q', ''))
+        added = add_clients_to_mailing(mailing, clients)
+        messages.success(request, f'Добавлено клиентов: {added}')
+        return redirect(reverse('mailing:view_mailing', args=[mailing.pk]))
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UnsubscribeView(TemplateView):
+    """
+    Отписка по ссылке из письма рассылки. Вход не нужен: адрес и владелец рассылки подписаны в ссылке.
+    GET только показывает подтверждение (ссылки открывают и почтовые сканеры), отписывает POST -
+    с кнопки на странице или от почтового клиента по заголовку List-Unsubscribe-Post
+    """
+    template_name = 'mailing/unsubscribe.html'
+
+    def dispatch(self, request, *args, **kwargs):
+        subscription = read_unsubscribe_token(kwargs['token'])
+        if subscription is None:
+            raise Http404
+        self.email, self.owner_id = subscription
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['email'] = self.email
+        return context_data
+
+    def post(self, request, *args, **kwargs):
+        owner = None
+        if self.owner_id is not None:
+            owner = User.objects.filter(pk=self.owner_id).first()
+        # Владельца из ссылки уже удалили: привязать отписку не к кому, а запись без владельца
+        # исключила бы адрес из рассылок всех владельцев, поэтому ничего не записывается
+        if owner is not None or self.owner_id is None:
+            suppress(self.email, Suppression.UNSUBSCRIBE, owner=owner, details='ссылка из письма')
+        return self.render_to_response(self.get_context_data(unsubscribed=True))
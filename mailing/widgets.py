@@ -0,0 +1,46 @@
+from django import forms
+from django.core.exceptions import ValidationError
+
+
+class AutocompleteMixin:
+    """
+    Виджет выбора с подгрузкой вариантов по AJAX: в HTML попадают только уже выбранные объекты,
+    остальные ищутся через JSON-эндпоинт постранично
+    """
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, url, attrs=None):
+        self.url = url
+        super().__init__(attrs)
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = str(self.url)
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in ('', None)]
+        queryset = getattr(self.choices, 'queryset', None)
+        if queryset is None or not selected:
+            self.choices = []
+        else:
+            field = self.choices.field
+            try:
+                objects = list(queryset.filter(pk__in=selected))
+            except (ValueError, ValidationError):
+                objects = []
+            self.choices = [(field.prepare_value(obj), field.label_from_instance(obj)) for obj in objects]
+        return super().optgroups(name, value, attrs)
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
@@ -0,0 +1,74 @@
+// Поиск вариантов для полей выбора с атрибутом data-autocomplete-url.
+// В <select> лежат только выбранные объекты, остальные подгружаются постранично из JSON-эндпоинта.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+        var wrapper = document.createElement('div');
+        wrapper.className = 'autocomplete mb-2';
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control';
+        input.placeholder = 'Начните вводить для поиска';
+        var list = document.createElement('div');
+        list.className = 'list-group';
+        var more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'btn btn-link btn-sm';
+        more.textContent = 'Показать ещё';
+        more.hidden = true;
+        wrapper.append(input, list, more);
+        select.parentNode.insertBefore(wrapper, select);
+
+        var nextCursor = null;
+        var timer = null;
+
+        function buildUrl(cursor) {
+            var url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+            url.searchParams.set('q', input.value);
+            if (select.dataset.owner) {
+                url.searchParams.set('owner', select.dataset.owner);
+            }
+            if (cursor) {
+                url.searchParams.set('cursor', cursor);
+            }
+            return url;
+        }
+
+        function choose(item) {
+            var option = select.querySelector('option[value="' + item.id + '"]');
+            if (!option) {
+                option = new Option(item.text, item.id);
+                if (!select.multiple) {
+                    select.innerHTML = '';
+                }
+                select.add(option);
+            }
+            option.selected = true;
+        }
+
+        function load(cursor) {
+            fetch(buildUrl(cursor), {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (!cursor) {
+                        list.innerHTML = '';
+                    }
+                    data.results.forEach(function (item) {
+                        var entry = document.createElement('button');
+                        entry.type = 'button';
+                        entry.className = 'list-group-item list-group-item-action';
+                        entry.textContent = item.text;
+                        entry.addEventListener('click', function () { choose(item); });
+                        list.appendChild(entry);
+                    });
+                    nextCursor = data.next;
+                    more.hidden = !nextCursor;
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(null); }, 250);
+        });
+        more.addEventListener('click', function () { load(nextCursor); });
+    });
+});
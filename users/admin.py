@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
 from django.utils.html import mark_safe
-from .models import User
+
+from config.thumbnails import thumbnail_url
+from .models import OutgoingEmail, User
 from .forms import UserRegisterForm, UserProfileForm
 
 
@@ -30,7 +33,7 @@ class UserAdmin(BaseUserAdmin):
         if obj.avatar:
             return mark_safe(f'''
                   <div style="position: relative; padding-top: 80px;">
-                      <img src="{obj.avatar.url}" style="
+                      <img src="{thumbnail_url(obj.avatar, 'small')}" style="
                           width: 100px;
                           height: 100px;
                           border-radius: 10%;
@@ -47,3 +50,17 @@ class UserAdmin(BaseUserAdmin):
 
 
 admin.site.register(User, UserAdmin)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient',)
+    readonly_fields = ('recipient', 'subject', 'body', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ('retry',)
+
+    @admin.action(description='Отправить повторно')
+    def retry(self, request, queryset):
+        queryset.exclude(status=OutgoingEmail.SENT).update(status=OutgoingEmail.PENDING, attempts=0,
+                                                            next_attempt_at=timezone.now())
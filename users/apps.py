@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from users import services  # noqa: F401 - подключение обработчиков сигналов
+        from config import thumbnails
+        from users.models import User
+        thumbnails.register(User, 'avatar', sizes=('small', 'medium'))
@@ -2,7 +2,7 @@ from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from users.models import User
 from django.forms import ModelForm, BooleanField
 from django import forms
-from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.forms import AuthenticationForm, SetPasswordForm
 
 
 class StyleFormMixin(ModelForm):
@@ -36,3 +36,35 @@ class UserProfileForm(UserChangeForm, StyleFormMixin):
 class CustomAuthenticationForm(AuthenticationForm):
     username = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     password = forms.CharField(widget=forms.PasswordInput(attrs={'class': 'form-control'}))
+
+
+class UserSetPasswordForm(SetPasswordForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+
+
+def _to_bool(value):
+    return value == 'True'
+
+
+class UserFilterForm(forms.Form):
+    """
+    Форма фильтрации списка пользователей
+    """
+    BOOL_CHOICES = [('', 'Все'), ('True', 'Да'), ('False', 'Нет')]
+
+    is_active = forms.TypedChoiceField(choices=BOOL_CHOICES, coerce=_to_bool, empty_value=None, required=False,
+                                       label='Активен')
+    is_verified = forms.TypedChoiceField(choices=BOOL_CHOICES, coerce=_to_bool, empty_value=None, required=False,
+                                         label='Подтверждён')
+    country = forms.CharField(max_length=50, required=False, label='Страна')
+    date_from = forms.DateField(required=False, label='Зарегистрирован с',
+                                widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, label='по', widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-select' if isinstance(field, forms.ChoiceField) else 'form-control'
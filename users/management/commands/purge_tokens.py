@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from users.services import purge_expired_tokens, purge_user_sessions
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие токены подтверждения почты и сброса пароля и записи о завершённых сессиях'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Сколько токенов удалять одним запросом')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено токенов: {deleted}'))
+        deleted = purge_user_sessions()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей о сессиях: {deleted}'))
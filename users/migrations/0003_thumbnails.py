@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='миниатюры аватара'),
+        ),
+    ]
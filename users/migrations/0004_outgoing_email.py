@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254, verbose_name='получатель')),
+                ('subject', models.CharField(max_length=255, verbose_name='тема')),
+                ('body', models.TextField(blank=True, verbose_name='текст')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не отправлено')], default='pending', max_length=10, verbose_name='статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='попыток')),
+                ('next_attempt_at', models.DateTimeField(verbose_name='следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создано')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='отправлено')),
+            ],
+            options={
+                'verbose_name': 'Исходящее письмо',
+                'verbose_name_plural': 'Исходящие письма',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:41
+
+import hashlib
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def move_tokens(apps, schema_editor):
+    """
+    Ссылки из уже отправленных писем подтверждения продолжают работать ещё три дня
+    """
+    User = apps.get_model('users', 'User')
+    UserToken = apps.get_model('users', 'UserToken')
+    expires_at = timezone.now() + timedelta(days=3)
+    users = User.objects.filter(token__isnull=False, is_verified=False).exclude(token='')
+    UserToken.objects.bulk_create([
+        UserToken(user_id=user_id, purpose='verify', expires_at=expires_at,
+                  token_hash=hashlib.sha256(token.encode()).hexdigest())
+        for user_id, token in users.values_list('id', 'token').iterator()
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('verify', 'Подтверждение почты'), ('reset', 'Сброс пароля')], max_length=10, verbose_name='назначение')),
+                ('token_hash', models.CharField(max_length=64, unique=True, verbose_name='хэш токена')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создан')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='действует до')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'Токен пользователя',
+                'verbose_name_plural': 'Токены пользователей',
+                'indexes': [models.Index(fields=['user', 'purpose'], name='user_token_user_purpose_idx')],
+            },
+        ),
+        migrations.RunPython(move_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='token',
+        ),
+    ]
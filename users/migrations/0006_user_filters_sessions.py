@@ -0,0 +1,49 @@
+# Generated by Django 5.0.14 on 2026-10-19 15:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0005_user_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True, verbose_name='ключ сессии')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создана')),
+            ],
+            options={
+                'verbose_name': 'Сессия пользователя',
+                'verbose_name_plural': 'Сессии пользователей',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'email'], name='user_active_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_verified', 'email'], name='user_verified_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['country', 'email'], name='user_country_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='user_date_joined_idx'),
+        ),
+        migrations.AddField(
+            model_name='usersession',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to=settings.AUTH_USER_MODEL, verbose_name='пользователь'),
+        ),
+    ]
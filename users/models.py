@@ -9,9 +9,9 @@ class User(AbstractUser):
     email = models.EmailField(unique=True, verbose_name='почта')
     phone = models.CharField(max_length=35, verbose_name='телефон', **NULLABLE)
     avatar = models.ImageField(upload_to='users/', verbose_name='аватар', **NULLABLE)
+    avatar_thumbnails = models.JSONField(verbose_name='миниатюры аватара', default=dict, blank=True, editable=False)
     country = models.CharField(max_length=50, verbose_name='страна', **NULLABLE)
     is_verified = models.BooleanField(default=False, verbose_name='Подтверждён')
-    token = models.CharField(max_length=10, verbose_name='Токен', **NULLABLE)
     nickname = models.CharField(max_length=50, verbose_name='никнейм', unique=True, **NULLABLE)
 
     USERNAME_FIELD = 'email'
@@ -24,6 +24,95 @@ class User(AbstractUser):
             ('deactivate_user', 'Can deactivate user'),
             ('view_all_users', 'Can view all users'),
         ]
+        # Фильтры списка пользователей; список сортируется по почте
+        indexes = [
+            models.Index(fields=['is_active', 'email'], name='user_active_email_idx'),
+            models.Index(fields=['is_verified', 'email'], name='user_verified_email_idx'),
+            models.Index(fields=['country', 'email'], name='user_country_email_idx'),
+            models.Index(fields=['date_joined'], name='user_date_joined_idx'),
+        ]
 
     def __str__(self):
         return self.email
+
+
+class UserSession(models.Model):
+    """
+    Сессии, в которых выполнен вход: по ним завершаются все сессии пользователя сразу
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions', verbose_name='пользователь')
+    session_key = models.CharField(max_length=40, unique=True, verbose_name='ключ сессии')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='создана')
+
+    class Meta:
+        verbose_name = 'Сессия пользователя'
+        verbose_name_plural = 'Сессии пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.session_key}'
+
+
+class UserToken(models.Model):
+    """
+    Одноразовый токен из ссылки в письме: подтверждение почты или сброс пароля.
+    В БД хранится только SHA-256 токена, поиск идёт по уникальному индексу
+    """
+    VERIFY = 'verify'
+    RESET = 'reset'
+    PURPOSE_CHOICES = [
+        (VERIFY, 'Подтверждение почты'),
+        (RESET, 'Сброс пароля'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens', verbose_name='пользователь')
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES, verbose_name='назначение')
+    token_hash = models.CharField(max_length=64, unique=True, verbose_name='хэш токена')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='создан')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='действует до')
+
+    class Meta:
+        verbose_name = 'Токен пользователя'
+        verbose_name_plural = 'Токены пользователей'
+        indexes = [
+            models.Index(fields=['user', 'purpose'], name='user_token_user_purpose_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.purpose}'
+
+
+class OutgoingEmail(models.Model):
+    """
+    Исходящее служебное письмо (подтверждение почты, новый пароль).
+
+    Записывается в той же транзакции, что и изменения пользователя, и отправляется фоновым
+    обработчиком после фиксации; при ошибке SMTP отправка повторяется с нарастающей паузой
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает отправки'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено'),
+    ]
+
+    recipient = models.EmailField(verbose_name='получатель')
+    subject = models.CharField(max_length=255, verbose_name='тема')
+    body = models.TextField(verbose_name='текст', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name='статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='попыток')
+    next_attempt_at = models.DateTimeField(verbose_name='следующая попытка')
+    last_error = models.TextField(verbose_name='последняя ошибка', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='создано')
+    sent_at = models.DateTimeField(verbose_name='отправлено', **NULLABLE)
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoing_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
@@ -0,0 +1,278 @@
+import hashlib
+import logging
+import secrets
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import OutgoingEmail, UserSession, UserToken
+
+logger = logging.getLogger(__name__)
+
+# На это время письмо закрепляется за обработчиком; если он упадёт, письмо снова станет доступно
+CLAIM_TIMEOUT = timedelta(minutes=5)
+# Пауза перед повтором удваивается с каждой попыткой, но не превышает этого значения
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def enqueue_email(recipient, subject, body):
+    """
+    Ставит письмо в очередь. Вызывается в той же транзакции, что и изменения, о которых письмо сообщает:
+    если транзакция откатится, письмо не уйдёт. Отправка начинается после фиксации в фоновом потоке
+    """
+    email = OutgoingEmail.objects.create(recipient=recipient, subject=subject, body=body,
+                                         next_attempt_at=timezone.now())
+    if settings.EMAIL_OUTBOX_ASYNC:
+        transaction.on_commit(lambda: _get_executor().submit(_send_in_background, email.pk))
+    else:
+        transaction.on_commit(lambda: send_emails(OutgoingEmail.objects.filter(pk=email.pk)))
+    return email
+
+
+def retry_delay(attempts):
+    return min(timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)), MAX_RETRY_DELAY)
+
+
+def claim_due_emails(queryset=None, limit=None):
+    """
+    Закрепляет за текущим обработчиком письма, которым пора уходить. Строки, уже выбранные
+    другим обработчиком, пропускаются (SKIP LOCKED), поэтому одно письмо дважды не отправится
+    """
+    if queryset is None:
+        queryset = OutgoingEmail.objects.all()
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(queryset.filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now)
+                      .order_by('next_attempt_at').select_for_update(skip_locked=True)[:limit])
+        if emails:
+            OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                next_attempt_at=now + CLAIM_TIMEOUT, attempts=F('attempts') + 1)
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def send_emails(queryset=None, limit=None):
+    """
+    Отправляет подошедшие письма через одно SMTP-соединение. Возвращает (отправлено, с ошибкой)
+    """
+    emails = claim_due_emails(queryset, limit)
+    if not emails:
+        return 0, 0
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as e:
+        for email in emails:
+            _mark_failed(email, e)
+        return 0, len(emails)
+    try:
+        for email in emails:
+            try:
+                EmailMessage(email.subject, email.body, settings.EMAIL_HOST_USER, [email.recipient],
+                             connection=connection).send()
+            except (smtplib.SMTPException, OSError) as e:
+                _mark_failed(email, e)
+                failed += 1
+            else:
+                # Письма содержат токены и пароли, поэтому после отправки текст не храним
+                OutgoingEmail.objects.filter(pk=email.pk).update(status=OutgoingEmail.SENT, sent_at=timezone.now(),
+                                                                 body='', last_error='')
+                sent += 1
+    finally:
+        try:
+            connection.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+    return sent, failed
+
+
+def _mark_failed(email, error):
+    logger.warning(f'Email {email.pk} to {email.recipient} failed (attempt {email.attempts}): {error}')
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        OutgoingEmail.objects.filter(pk=email.pk).update(status=OutgoingEmail.FAILED, last_error=str(error))
+    else:
+        OutgoingEmail.objects.filter(pk=email.pk).update(
+            next_attempt_at=timezone.now() + retry_delay(email.attempts), last_error=str(error))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.EMAIL_OUTBOX_WORKERS, thread_name_prefix='outbox')
+        return _executor
+
+
+def _send_in_background(pk):
+    close_old_connections()
+    try:
+        send_emails(OutgoingEmail.objects.filter(pk=pk))
+    except Exception:
+        logger.exception(f'Email {pk} sending error')
+    finally:
+        close_old_connections()
+
+
+def process_outbox():
+    """
+    Задача планировщика: отправляет письма, ожидающие повтора или не отправленные из-за перезапуска
+    """
+    sent, failed = send_emails(limit=settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if sent or failed:
+        logger.info(f'Outbox: {sent} sent, {failed} failed')
+
+
+TOKEN_MISS_KEY = 'user_token:miss:{}:{}'
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_token(user, purpose):
+    """
+    Создаёт одноразовый токен и возвращает его. Прежние токены пользователя с тем же назначением
+    перестают действовать, в БД попадает только хэш
+    """
+    token = secrets.token_urlsafe(32)
+    UserToken.objects.filter(user=user, purpose=purpose).delete()
+    UserToken.objects.create(user=user, purpose=purpose, token_hash=hash_token(token),
+                             expires_at=timezone.now() + timedelta(seconds=settings.USER_TOKEN_TTL[purpose]))
+    return token
+
+
+def find_token(token, purpose):
+    """
+    Находит действующий токен по уникальному индексу хэша. Неизвестные токены запоминаются в кэше,
+    чтобы перебор ссылок сканерами не доходил до БД
+    """
+    token_hash = hash_token(token)
+    miss_key = TOKEN_MISS_KEY.format(purpose, token_hash)
+    if cache.get(miss_key):
+        return None
+    user_token = (UserToken.objects.select_related('user')
+                  .filter(token_hash=token_hash, purpose=purpose, expires_at__gt=timezone.now()).first())
+    if user_token is None:
+        cache.set(miss_key, 1, settings.USER_TOKEN_MISS_CACHE_TIMEOUT)
+    return user_token
+
+
+def consume_token(token, purpose):
+    """
+    Погашает токен и возвращает его пользователя или None. Токен удаляется условным DELETE,
+    поэтому одновременные переходы по одной ссылке не сработают дважды
+    """
+    user_token = find_token(token, purpose)
+    if user_token is None:
+        return None
+    deleted, _ = UserToken.objects.filter(pk=user_token.pk).delete()
+    if not deleted:
+        return None
+    cache.set(TOKEN_MISS_KEY.format(purpose, user_token.token_hash), 1, settings.USER_TOKEN_MISS_CACHE_TIMEOUT)
+    return user_token.user
+
+
+def purge_expired_tokens(batch_size=10000):
+    """
+    Удаляет истёкшие токены пачками, чтобы не держать долгую блокировку. Возвращает число удалённых
+    """
+    total = 0
+    now = timezone.now()
+    while True:
+        pks = list(UserToken.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        deleted, _ = UserToken.objects.filter(pk__in=pks).delete()
+        total += deleted
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_users(queryset, is_active=None, is_verified=None, country=None, date_from=None, date_to=None):
+    """
+    Фильтрация списка пользователей. Условия совпадают с индексами (is_active, email),
+    (is_verified, email), (country, email) и (date_joined): даты превращаются в границы суток
+    в текущем часовом поясе, а не сравниваются с date_joined::date, которое индекс не использует
+    """
+    if is_active is not None:
+        queryset = queryset.filter(is_active=is_active)
+    if is_verified is not None:
+        queryset = queryset.filter(is_verified=is_verified)
+    if country:
+        queryset = queryset.filter(country=country)
+    if date_from:
+        queryset = queryset.filter(date_joined__gte=_start_of_day(date_from))
+    if date_to:
+        queryset = queryset.filter(date_joined__lt=_start_of_day(date_to + timedelta(days=1)))
+    return queryset
+
+
+def set_users_active(queryset, is_active):
+    """
+    Активирует или деактивирует пользователей из queryset одним UPDATE и возвращает число изменённых.
+    Суперпользователи не затрагиваются, сессии деактивированных завершаются
+    """
+    queryset = queryset.filter(is_superuser=False)
+    with transaction.atomic():
+        if not is_active:
+            end_sessions(queryset)
+        return queryset.exclude(is_active=is_active).update(is_active=is_active)
+
+
+def end_sessions(users):
+    """
+    Завершает все сессии пользователей из queryset. Для сессий в БД - одним DELETE с подзапросом
+    """
+    user_sessions = UserSession.objects.filter(user__in=users.values('pk'))
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+        from django.contrib.sessions.models import Session
+        Session.objects.filter(session_key__in=user_sessions.values('session_key')).delete()
+    else:
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        for session_key in user_sessions.values_list('session_key', flat=True).iterator():
+            store(session_key).delete()
+    user_sessions.delete()
+
+
+def purge_user_sessions():
+    """
+    Удаляет записи о сессиях, которые уже истекли и удалены (clearsessions). Только для сессий в БД
+    """
+    if settings.SESSION_ENGINE != 'django.contrib.sessions.backends.db':
+        return 0
+    from django.contrib.sessions.models import Session
+    deleted, _ = UserSession.objects.exclude(
+        session_key__in=Session.objects.filter(expire_date__gt=timezone.now()).values('session_key')).delete()
+    return deleted
+
+
+@receiver(user_logged_in)
+def remember_session(sender, request, user, **kwargs):
+    session_key = request.session.session_key
+    if session_key:
+        UserSession.objects.update_or_create(session_key=session_key, defaults={'user': user})
+
+
+@receiver(user_logged_out)
+def forget_session(sender, request, user, **kwargs):
+    session_key = request.session.session_key
+    if session_key:
+        UserSession.objects.filter(session_key=session_key).delete()
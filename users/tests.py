@@ -1,3 +1,241 @@
-from django.test import TestCase
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.testing import QueryBudgetMixin
+from users.models import OutgoingEmail, User, UserToken
+from users.services import (claim_due_emails, consume_token, enqueue_email, find_token, hash_token, issue_token,
+                            process_outbox, send_emails)
+
+
+class UsersQueryBudgetTest(QueryBudgetMixin, TestCase):
+    namespace = 'users'
+    # Выход и массовое изменение активности выполняются только POST-запросом,
+    # переключение активности проверяется отдельно
+    skip_urls = ('logout', 'toggle_activity', 'bulk_activity')
+    query_budgets = {
+        'login': 0,
+        'register': 0,
+        'profile': 4,
+        'verify_success': 3,
+        'reset_password': 0,
+        'reset_password_confirm': 1,
+        'users_list': 5,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(email='manager@test.ru')
+        self.user.user_permissions.add(Permission.objects.get(codename='view_all_users'))
+
+    def create_data(self, size):
+        start = User.objects.count()
+        for i in range(start, start + size):
+            User.objects.create(email=f'user{i}@test.ru', country='Россия')
+
+    def get_url_args(self, url_name):
+        # Токены одноразовые, поэтому для каждого замера выдаётся новый
+        if url_name == 'verify_success':
+            return [issue_token(self.user, UserToken.VERIFY)]
+        if url_name == 'reset_password_confirm':
+            return [issue_token(self.user, UserToken.RESET)]
+        return []
+
+    def get_request_user(self, url_name):
+        if url_name in ('login', 'register', 'verify_success', 'reset_password', 'reset_password_confirm'):
+            return None
+        return self.user
+
+
+class BulkActivityTest(TestCase):
+
+    def setUp(self):
+        self.manager = User.objects.create(email='manager@test.ru')
+        self.manager.user_permissions.add(Permission.objects.get(codename='deactivate_user'))
+        self.client.force_login(self.manager)
+        self.russian = [User.objects.create(email=f'ru{i}@test.ru', country='Россия') for i in range(3)]
+        self.other = User.objects.create(email='other@test.ru', country='Франция')
+
+    def post(self, **data):
+        return self.client.post(reverse('users:bulk_activity'), {'action': 'deactivate', **data})
+
+    def active_emails(self):
+        return set(User.objects.filter(is_active=True).values_list('email', flat=True))
+
+    def test_selected(self):
+        self.post(ids=[self.russian[0].pk, self.manager.pk, 'x'])
+        self.assertEqual(self.active_emails(), {'manager@test.ru', 'ru1@test.ru', 'ru2@test.ru', 'other@test.ru'})
+
+    def test_all_by_filter(self):
+        self.manager.country = 'Россия'
+        self.manager.save(update_fields=['country'])
+        response = self.post(scope='all', filter='country=Россия')
+        self.assertRedirects(response, f'{reverse("users:users_list")}?country=Россия', fetch_redirect_response=False)
+        self.assertEqual(self.active_emails(), {'manager@test.ru', 'other@test.ru'})
+
+    def test_invalid_filter_changes_nothing(self):
+        self.post(scope='all', filter='date_from=вчера')
+        self.assertEqual(User.objects.filter(is_active=False).count(), 0)
+
+    def test_date_filter_bounds(self):
+        joined = timezone.make_aware(datetime(2026, 3, 10, 23, 30))
+        User.objects.filter(pk=self.other.pk).update(date_joined=joined)
+        self.post(scope='all', filter='date_from=2026-03-10&date_to=2026-03-10')
+        self.assertEqual(User.objects.filter(is_active=False).get(), self.other)
+
+
+class UserTokenTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='user@test.ru')
+
+    def test_single_use(self):
+        token = issue_token(self.user, UserToken.VERIFY)
+        self.assertEqual(consume_token(token, UserToken.VERIFY), self.user)
+        self.assertIsNone(consume_token(token, UserToken.VERIFY))
+        self.assertFalse(UserToken.objects.exists())
+
+    def test_new_token_replaces_old(self):
+        old = issue_token(self.user, UserToken.RESET)
+        new = issue_token(self.user, UserToken.RESET)
+        self.assertIsNone(find_token(old, UserToken.RESET))
+        self.assertEqual(find_token(new, UserToken.RESET).user, self.user)
+
+    def test_expired(self):
+        token = issue_token(self.user, UserToken.RESET)
+        UserToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(consume_token(token, UserToken.RESET))
+
+    def test_miss_is_cached(self):
+        self.assertIsNone(find_token('unknown', UserToken.RESET))
+        UserToken.objects.create(user=self.user, purpose=UserToken.RESET, token_hash=hash_token('unknown'),
+                                 expires_at=timezone.now() + timedelta(hours=1))
+        with self.assertNumQueries(0):
+            self.assertIsNone(find_token('unknown', UserToken.RESET))
+
+    def test_miss_is_per_purpose(self):
+        token = issue_token(self.user, UserToken.RESET)
+        self.assertIsNone(find_token(token, UserToken.VERIFY))
+        self.assertEqual(find_token(token, UserToken.RESET).user, self.user)
+
+    def test_reset_confirm(self):
+        token = issue_token(self.user, UserToken.RESET)
+        url = reverse('users:reset_password_confirm', args=[token])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {'new_password1': 'Gv7!pRq2xLm', 'new_password2': 'Gv7!pRq2xLm'})
+        self.assertRedirects(response, reverse('users:login'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Gv7!pRq2xLm'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(EMAIL_OUTBOX_ASYNC=False, EMAIL_OUTBOX_RETRY_DELAY=30, EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class OutboxTest(TestCase):
+
+    def enqueue(self, recipient='user@test.ru'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return enqueue_email(recipient, 'Тема', 'Токен')
+
+    def refuse(self):
+        return mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                          side_effect=smtplib.SMTPServerDisconnected('Соединение разорвано'))
+
+    def make_due(self, email):
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+
+    def test_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            email = enqueue_email('user@test.ru', 'Тема', 'Токен')
+            self.assertEqual(len(mail.outbox), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual([message.to for message in mail.outbox], [['user@test.ru']])
+        email.refresh_from_db()
+        # Текст с токеном после отправки не хранится
+        self.assertEqual((email.status, email.attempts, email.body), (OutgoingEmail.SENT, 1, ''))
+
+    def test_rolled_back_email_is_not_sent(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError), transaction.atomic():
+                enqueue_email('user@test.ru', 'Тема', 'Токен')
+                raise ValueError
+        self.assertEqual(callbacks, [])
+        self.assertFalse(OutgoingEmail.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_retry_with_backoff(self):
+        with self.refuse(), self.assertLogs('users.services', 'WARNING'):
+            email = self.enqueue()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.PENDING, 1))
+        self.assertIn('Соединение разорвано', email.last_error)
+        self.assertAlmostEqual((email.next_attempt_at - timezone.now()).total_seconds(), 30, delta=5)
+
+        # Пауза ещё не прошла: письмо не выбирается
+        self.assertEqual(send_emails(), (0, 0))
+        self.make_due(email)
+        with self.refuse(), self.assertLogs('users.services', 'WARNING'):
+            self.assertEqual(send_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertAlmostEqual((email.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5)
+
+        self.make_due(email)
+        process_outbox()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), (OutgoingEmail.SENT, 3, ''))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_max_attempts(self):
+        with self.refuse(), self.assertLogs('users.services', 'WARNING'):
+            email = self.enqueue()
+            for _ in range(2):
+                self.make_due(email)
+                send_emails()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.FAILED, 3))
+        self.make_due(email)
+        self.assertEqual(send_emails(), (0, 0))
+
+    def test_connection_error_fails_whole_batch(self):
+        emails = [OutgoingEmail.objects.create(recipient=f'user{i}@test.ru', subject='Тема', body='Текст',
+                                               next_attempt_at=timezone.now()) for i in range(2)]
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('refused')), \
+                self.assertLogs('users.services', 'WARNING'):
+            self.assertEqual(send_emails(), (0, 2))
+        self.assertEqual(list(OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails])
+                              .values_list('attempts', flat=True)), [1, 1])
+
+
+class OutboxClaimTest(TransactionTestCase):
+
+    def test_locked_rows_are_skipped(self):
+        first, second = [OutgoingEmail.objects.create(recipient=f'user{i}@test.ru', subject='Тема', body='Текст',
+                                                      next_attempt_at=timezone.now() - timedelta(minutes=i))
+                         for i in range(2)]
+        claimed = []
+
+        def claim():
+            try:
+                claimed.append([email.pk for email in claim_due_emails()])
+            finally:
+                connections.close_all()
+
+        # Пока другой обработчик держит строку, она пропускается, а не ждёт освобождения
+        with transaction.atomic():
+            list(OutgoingEmail.objects.select_for_update().filter(pk=second.pk))
+            worker = threading.Thread(target=claim)
+            worker.start()
+            worker.join(10)
+        self.assertEqual(claimed, [[first.pk]])
+        # Закреплённое письмо не выбирается повторно до истечения срока закрепления
+        self.assertEqual([email.pk for email in claim_due_emails()], [second.pk])
+        self.assertEqual(claim_due_emails(), [])
@@ -2,7 +2,9 @@ from django.contrib.auth.views import LogoutView
 from django.urls import path
 
 from users.apps import UsersConfig
-from users.views import RegisterView, ProfileView, verify_view, res_password, UserListView, toggle_activity
+from config.async_views import select_view
+from users.views import (RegisterView, ProfileView, verify_view, res_password, reset_password_confirm, UserListView,
+                         toggle_activity, bulk_activity, AsyncUserListView)
 from .views import CustomLoginView
 
 app_name = UsersConfig.name
@@ -14,6 +16,8 @@ urlpatterns = [
     path('profile/', ProfileView.as_view(), name='profile'),
     path('confirm/<token>/', verify_view, name='verify_success'),
     path('password/reset/', res_password, name='reset_password'),
-    path('users_list/', UserListView.as_view(), name='users_list'),
-    path('toggle_activity/<int:pk>/', toggle_activity, name='toggle_activity')
+    path('password/reset/<token>/', reset_password_confirm, name='reset_password_confirm'),
+    path('users_list/', select_view(UserListView, AsyncUserListView).as_view(), name='users_list'),
+    path('toggle_activity/<int:pk>/', toggle_activity, name='toggle_activity'),
+    path('bulk_activity/', bulk_activity, name='bulk_activity'),
 ]
@@ -1,12 +1,21 @@
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, QueryDict
+from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, UpdateView, ListView
 from django.contrib import messages
-from .forms import UserRegisterForm, UserProfileForm, CustomAuthenticationForm
-from .models import User
-from .utils import generate_token, generate_password
+from django.db import transaction
+
+from config.async_views import AsyncListMixin
+from config.db.routers import ReadReplicaMixin
+from config.pagination import KeysetPaginationMixin
+from mailing.access import AsyncAccessMixin
+from .forms import UserRegisterForm, UserProfileForm, CustomAuthenticationForm, UserSetPasswordForm, UserFilterForm
+from .models import User, UserToken
+from .services import (consume_token, enqueue_email, find_token, issue_token, filter_users,
+                       set_users_active)
 from django.contrib.auth.views import LoginView
 
 
@@ -17,25 +26,28 @@ class RegisterView(CreateView):
     template_name = 'users/register.html'
     success_url = reverse_lazy('users:login')
 
+    @transaction.atomic
     def form_valid(self, form):
-        token = generate_token()
-        form.instance.token = token
         user = form.save()
-        user.email_user(
+        token = issue_token(user, UserToken.VERIFY)
+        # Письмо уйдёт после фиксации транзакции, ответ не ждёт SMTP-сервер
+        enqueue_email(
+            user.email,
             subject='Верификация почты',
-            message=f'Поздравляем с регистрацией на iStore \n'
-                    f'Для подтверждения регистрации перейдите по ссылке: \n'
-                    f'http://127.0.0.1:8000/users/confirm/{user.token} \n'
-                    f'Если вы не причастны к регистрации игнорируйте это письмо.'
+            body=f'Поздравляем с регистрацией на iStore \n'
+                 f'Для подтверждения регистрации перейдите по ссылке: \n'
+                 f'{self.request.build_absolute_uri(reverse("users:verify_success", args=[token]))} \n'
+                 f'Если вы не причастны к регистрации игнорируйте это письмо.'
         )
         return super().form_valid(form)
 
 
 # Функция для верификации пользователя по токену
 def verify_view(request, token):
-    user = get_object_or_404(User, token=token)
-    user.is_verified = True
-    user.save()
+    user = consume_token(token, UserToken.VERIFY)
+    if user is None:
+        raise Http404('Ссылка недействительна или устарела')
+    User.objects.filter(pk=user.pk).update(is_verified=True)
     return render(request, 'users/verify.html')
 
 
@@ -45,19 +57,35 @@ def res_password(request):
         email = request.POST.get('email')
         user = User.objects.filter(email=email).first()
         if user:
-            new_password = generate_password()
-            user.email_user(
-                subject='Смена пароля',
-                message=f'Ваш новый пароль {new_password}'
-            )
-            user.set_password(new_password)
-            user.save()
+            with transaction.atomic():
+                token = issue_token(user, UserToken.RESET)
+                link = request.build_absolute_uri(reverse('users:reset_password_confirm', args=[token]))
+                enqueue_email(user.email, subject='Смена пароля',
+                              body=f'Для смены пароля перейдите по ссылке: \n{link} \n'
+                                   f'Если вы не запрашивали смену пароля, игнорируйте это письмо.')
+            messages.success(request, 'Ссылка для смены пароля отправлена на почту.')
         else:
             messages.error(request, 'Пользователь не найден.')
         return redirect(reverse('users:reset_password'))
     return render(request, 'users/reset_password.html')
 
 
+# Функция для установки нового пароля по ссылке из письма
+def reset_password_confirm(request, token):
+    user_token = find_token(token, UserToken.RESET)
+    if user_token is None:
+        raise Http404('Ссылка недействительна или устарела')
+    form = UserSetPasswordForm(user_token.user, request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        with transaction.atomic():
+            if consume_token(token, UserToken.RESET) is None:
+                raise Http404('Ссылка недействительна или устарела')
+            form.save()
+        messages.success(request, 'Пароль изменён.')
+        return redirect(reverse('users:login'))
+    return render(request, 'users/reset_password_confirm.html', {'form': form})
+
+
 # Класс для обновления профиля пользователя
 class ProfileView(UpdateView):
     model = User
@@ -74,17 +102,55 @@ class CustomLoginView(LoginView):
     template_name = 'users/login.html'
 
 
-class UserListView(PermissionRequiredMixin, ListView):
+class UserListView(ReadReplicaMixin, PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     model = User
+    keyset_ordering = ('email',)
     permission_required = 'users.view_all_users'
 
+    def get_queryset(self):
+        self.filter_form = UserFilterForm(self.request.GET or None)
+        filters = self.filter_form.cleaned_data if self.filter_form.is_valid() else {}
+        return filter_users(super().get_queryset(), **filters)
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['filter_form'] = self.filter_form
+        context_data['filter_query'] = self.request.GET.urlencode()
+        return context_data
+
+
+# Асинхронная версия списка пользователей
+class AsyncUserListView(AsyncAccessMixin, AsyncListMixin, UserListView):
+    pass
+
 
 @permission_required('users.deactivate_user')
 def toggle_activity(request, pk):
-    user = User.objects.get(pk=pk)
-    if user.is_active:
-        user.is_active = False
-    else:
-        user.is_active = True
-    user.save()
+    user = get_object_or_404(User.objects.only('is_active'), pk=pk)
+    set_users_active(User.objects.filter(pk=pk), not user.is_active)
     return redirect(reverse('users:users_list'))
+
+
+# Функция для массовой активации и деактивации: выбранные пользователи или все, подходящие под фильтр
+@require_POST
+@permission_required('users.deactivate_user')
+def bulk_activity(request):
+    is_active = request.POST.get('action') == 'activate'
+    filter_query = request.POST.get('filter', '')
+    url = reverse('users:users_list')
+    url = f'{url}?{filter_query}' if filter_query else url
+    # Себя изменить нельзя: деактивация завершила бы и собственную сессию
+    users = User.objects.exclude(pk=request.user.pk)
+    if request.POST.get('scope') == 'all':
+        filter_form = UserFilterForm(QueryDict(filter_query))
+        if not filter_form.is_valid():
+            # С неверным фильтром «все» означало бы всех пользователей
+            messages.error(request, 'Фильтр указан неверно, активность пользователей не изменена')
+            return redirect(url)
+        users = filter_users(users, **filter_form.cleaned_data)
+    else:
+        ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+        users = users.filter(pk__in=ids)
+    changed = set_users_active(users, is_active)
+    messages.success(request, f'{"Активировано" if is_active else "Деактивировано"} пользователей: {changed}')
+    return redirect(url)